@@ -72,7 +72,7 @@ admin_token_env = os.getenv("ADMIN_TOKEN", "")
 base_api_url = os.getenv("WEB_API_URL", "http://localhost:3030")
 DEFAULT_URL = f"{base_api_url.rstrip('/')}/admin" if not base_api_url.endswith("/admin") else base_api_url
 
-def send_admin_request(action, chat_id=None, token=None, url=DEFAULT_URL):
+def send_admin_request(action, chat_id=None, token=None, url=DEFAULT_URL, extra=None):
     """
     Invia la richiesta POST all'endpoint /admin
     """
@@ -85,6 +85,8 @@ def send_admin_request(action, chat_id=None, token=None, url=DEFAULT_URL):
     payload = {"action": action}
     if chat_id:
         payload["chat_id"] = chat_id
+    if extra:
+        payload.update(extra)
         
     data = json.dumps(payload).encode('utf-8')
     headers = {'Content-Type': 'application/json'}
@@ -93,6 +95,14 @@ def send_admin_request(action, chat_id=None, token=None, url=DEFAULT_URL):
     
     try:
         with urllib.request.urlopen(req) as response:
+            if response.headers.get_content_type() == "application/x-ndjson":
+                # export-chats: una riga JSON per chat, letta in streaming
+                count = 0
+                for line in response:
+                    print(line.decode('utf-8').rstrip())
+                    count += 1
+                print(f"\n[+] Successo! {count} chat esportate")
+                return True
             result = json.loads(response.read().decode('utf-8'))
             print("\n[+] Successo!")
             print(json.dumps(result, indent=2, ensure_ascii=False))
@@ -169,9 +179,11 @@ def interactive_mode(token, url):
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Script per testare le rotte /admin di NAO Smart AI Server")
-    parser.add_argument("action", nargs="?", choices=["list-chats", "delete-chats", "history"], 
+    parser.add_argument("action", nargs="?", choices=["list-chats", "export-chats", "delete-chats", "history", "stats"], 
                         help="Azione da eseguire. Se omesso, avvia la modalità interattiva")
     parser.add_argument("--chat-id", help="ID della chat (richiesto da riga di comando per l'azione 'history')")
+    parser.add_argument("--limit", type=int, help="Chat per pagina per l'azione 'list-chats'")
+    parser.add_argument("--cursor", help="Cursore (next_cursor) della pagina da leggere con 'list-chats'")
     parser.add_argument("--token", default=admin_token_env, help="Token admin (di default letto da .env)")
     parser.add_argument("--url", default=DEFAULT_URL, help=f"URL endpoint admin (default: {DEFAULT_URL})")
     
@@ -181,7 +193,8 @@ if __name__ == "__main__":
         # Modalità a riga di comando singola (CLI)
         if args.action == "history" and not args.chat_id:
             parser.error("L'azione 'history' richiede l'argomento aggiuntivo --chat-id")
-        send_admin_request(args.action, chat_id=args.chat_id, token=args.token, url=args.url)
+        extra = {k: v for k, v in (("limit", args.limit), ("cursor", args.cursor)) if v is not None}
+        send_admin_request(args.action, chat_id=args.chat_id, token=args.token, url=args.url, extra=extra)
     else:
         # Modalità interattiva (menu GUI testuale)
         try:
@@ -0,0 +1,176 @@
+"""
+File:	/tests/bench/bench_history_memory.py
+-----
+Benchmark memoria della cronologia: lista di dizionari vs ChatHistory compatta
+su un carico sintetico di sessioni
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:09:50 am
+-----
+Last Modified: 	October 19th 2026 4:55:25 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import tracemalloc
+
+# Aggiunge la root del progetto al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from web_api.utils.chat_history import ChatHistory
+from web_api.utils.chat_search import ChatSearchIndex
+
+USER_MESSAGES = [
+    "Ciao NAO, come stai oggi?",
+    "Raccontami una barzelletta sugli animali",
+    "Mi sento un po' stanco, cosa mi consigli?",
+    "Facciamo un gioco insieme?",
+    "Che cosa hai mangiato a pranzo?",
+    "Parlami del mare e dei pesci",
+]
+
+SENTENCES = [
+    "Ciao! Che bello vederti, oggi sono proprio di buon umore e pronto a chiacchierare con te.",
+    "Sai che le tartarughe marine possono vivere più di cento anni? Sono animali davvero straordinari.",
+    "Ti consiglio di fare una piccola pausa, bere un bicchiere d'acqua e respirare profondamente.",
+    "Certo, giochiamo! Pensa a un animale e io proverò a indovinarlo con qualche domanda.",
+    "Io sono un robot e non mangio, ma mi piace molto sentire parlare della cucina italiana.",
+    "Il mare è pieno di vita: delfini, polpi, stelle marine e pesci di mille colori diversi.",
+]
+
+MOVEMENTS = [
+    "NAO/Talking/Speaking/BodyTalk_(10)",
+    "NAO/Emotions/Positive/Happy_1",
+    "NAO/Gestures/Hey_1",
+    "NAO/Gestures/Explain_3",
+]
+
+
+def raw_model_response(rng):
+    """Risposta come arriva dal modello: JSON indentato in un blocco markdown"""
+    data = {
+        "action": "NO_ACTION",
+        "chunks": [
+            {"text": rng.choice(SENTENCES), "movements": rng.sample(MOVEMENTS, rng.randint(1, 2))}
+            for _ in range(rng.randint(2, 4))
+        ],
+    }
+    return data, "```json\n" + json.dumps(data, indent=2, ensure_ascii=False) + "\n```"
+
+
+def build_sessions(kind, sessions, turns, seed, compress_min_bytes=0):
+    """Costruisce le cronologie di tutte le sessioni nel formato indicato"""
+    rng = random.Random(seed)
+    store = {}
+    for index in range(sessions):
+        if kind == "dict":
+            history = []
+        else:
+            history = ChatHistory(compress_min_bytes=compress_min_bytes)
+        for _ in range(turns):
+            user_text = rng.choice(USER_MESSAGES)
+            data, raw_text = raw_model_response(rng)
+            if kind == "dict":
+                history.append({"role": "user", "content": user_text})
+                history.append({"role": "assistant", "content": raw_text})
+            else:
+                history.append("user", user_text)
+                history.append("assistant", data)
+        store[f"chat-{index}"] = history
+    return store
+
+
+def build_search_index(store):
+    """Indice di ricerca dei messaggi, come lo aggiorna LLMChatAPI (testo pronunciato per l'assistente)"""
+    index = ChatSearchIndex()
+    for chat_id, history in store.items():
+        for position, message in enumerate(history):
+            content = message["content"]
+            if message["role"] == "assistant":
+                data = json.loads(content.strip("`").removeprefix("json")) if content.startswith("`") else json.loads(content)
+                content = " ".join(chunk["text"] for chunk in data["chunks"])
+            index.add_message(chat_id, position, message["role"], content)
+    return index
+
+
+def measure(kind, sessions, turns, seed, compress_min_bytes=0):
+    """Memoria allocata da cronologie e indice di ricerca e tempo per ricostruire i messaggi del turno"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store = build_sessions(kind, sessions, turns, seed, compress_min_bytes)
+    history_allocated = tracemalloc.get_traced_memory()[0] - before
+    index = build_search_index(store)
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    # Messaggi inviati al modello a ogni turno: ultimi 20 della cronologia
+    start = time.perf_counter()
+    for history in store.values():
+        if kind == "dict":
+            list(history[-20:])
+        else:
+            history.provider_messages(20)
+    rebuild_us = (time.perf_counter() - start) / len(store) * 1e6
+
+    return {
+        "format": kind if kind == "dict" else f"compact(compress>={compress_min_bytes})" if compress_min_bytes else "compact",
+        "total_mb": round(allocated / 1024 / 1024, 2),
+        "history_kb": round(history_allocated / sessions / 1024, 2),
+        "index_kb": round((allocated - history_allocated) / sessions / 1024, 2),
+        "per_session_kb": round(allocated / sessions / 1024, 2),
+        "rebuild_us_per_turn": round(rebuild_us, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark memoria della cronologia delle chat")
+    parser.add_argument("--sessions", type=int, default=1000, help="Sessioni sintetiche")
+    parser.add_argument("--turns", type=int, default=10, help="Scambi (domanda + risposta) per sessione")
+    parser.add_argument("--compress", default="256,512,1024", help="Soglie di compressione da provare")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    results = [
+        measure("dict", args.sessions, args.turns, args.seed),
+        measure("compact", args.sessions, args.turns, args.seed),
+    ]
+    for threshold in [int(t) for t in args.compress.split(",") if t.strip()]:
+        results.append(measure("compact", args.sessions, args.turns, args.seed, threshold))
+
+    baseline = results[0]["per_session_kb"]
+    for result in results:
+        result["reduction"] = f"{(1 - result['per_session_kb'] / baseline) * 100:.0f}%"
+
+    # KB/sessione comprende cronologia e indice di ricerca (azione admin search)
+    print(f"{args.sessions} sessioni da {args.turns} scambi")
+    print(f"{'formato':<26}{'totale MB':>11}{'cronologia KB':>15}{'indice KB':>11}{'KB/sessione':>13}"
+          f"{'riduzione':>11}{'ricostruzione us':>18}")
+    for r in results:
+        print(f"{r['format']:<26}{r['total_mb']:>11}{r['history_kb']:>15}{r['index_kb']:>11}{r['per_session_kb']:>13}"
+              f"{r['reduction']:>11}{r['rebuild_us_per_turn']:>18}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""
+File:	/tests/bench/bench_stt.py
+-----
+Benchmark STT offline: real-time factor, latenza per fase, RSS di picco e WER
+su un corpus di clip italiane, per ogni combinazione di percorso, Smart Trim e blocco
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:04:25 am
+-----
+Last Modified: 	October 19th 2026 4:20:04 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import io
+import re
+import json
+import time
+import wave
+import shutil
+import argparse
+import itertools
+import subprocess
+import unicodedata
+
+WEB_API_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "web_api"))
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stt_corpus")
+
+# Percorsi di decodifica misurati:
+#   wav        -> STT.transcribe (file WAV mono 16bit letto con wave)
+#   ogg        -> STT.transcribe_ogg con clip OGG (decodifica pydub/ffmpeg)
+#   wav-ffmpeg -> STT.transcribe_ogg con clip WAV (decodifica pydub/ffmpeg)
+#   ogg-stream -> STT.transcribe_stream con clip OGG (body grezzo: ffmpeg su pipe, senza buffer)
+#   wav-stream -> STT.transcribe_stream con clip WAV (body grezzo: frame dallo stream a Vosk)
+DECODE_PATHS = ("wav", "ogg", "wav-ffmpeg", "ogg-stream", "wav-stream")
+DEFAULT_BLOCK_SIZES = (2000, 4000, 8000)
+
+WORD_RE = re.compile(r"[^\w\s]")
+
+
+class ClipFile:
+    """Sostituto minimo di werkzeug FileStorage (read/save) per chiamare STT senza Flask"""
+
+    def __init__(self, path):
+        self.filename = os.path.basename(path)
+        self.path = path
+
+    def read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def save(self, destination):
+        shutil.copyfile(self.path, destination)
+
+
+def normalize_words(text):
+    """Parole normalizzate per il WER: minuscole, senza punteggiatura, apostrofi come separatori"""
+    text = unicodedata.normalize("NFC", text.lower()).replace("'", " ").replace("’", " ")
+    return WORD_RE.sub(" ", text).split()
+
+
+def word_errors(reference, hypothesis):
+    """
+    Distanza di edit a livello di parola (sostituzioni + inserimenti + cancellazioni)
+    Returns:
+        tuple: (errori, parole di riferimento)
+    """
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(
+                previous[j] + 1,                             # cancellazione
+                current[j - 1] + 1,                          # inserimento
+                previous[j - 1] + (ref_word != hyp_word),    # sostituzione
+            ))
+        previous = current
+    return previous[-1], len(ref)
+
+
+def load_manifest(corpus_dir=CORPUS_DIR):
+    with open(os.path.join(corpus_dir, "manifest.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def wav_duration(path):
+    with wave.open(path, "rb") as wf:
+        return wf.getnframes() / float(wf.getframerate())
+
+
+def generate_corpus(corpus_dir, voice="it", speed=150):
+    """Sintetizza le clip del manifest con espeak-ng, con il silenzio iniziale indicato, in WAV e OGG"""
+    espeak = shutil.which("espeak-ng") or shutil.which("espeak")
+    if not espeak:
+        raise RuntimeError("espeak-ng non trovato: installalo (es. apt install espeak-ng) o usa registrazioni reali")
+    try:
+        from pydub import AudioSegment
+    except ImportError:
+        raise RuntimeError("pydub non installato: pip install pydub (richiede ffmpeg)")
+
+    manifest = load_manifest(corpus_dir)
+    for clip in manifest["clips"]:
+        wav_path = os.path.join(corpus_dir, clip["wav"])
+        os.makedirs(os.path.dirname(wav_path), exist_ok=True)
+        proc = subprocess.run([espeak, "-v", voice, "-s", str(speed), "--stdout", clip["text"]],
+                              capture_output=True, check=True)
+        speech = AudioSegment.from_file(io.BytesIO(proc.stdout), format="wav")
+        silence = AudioSegment.silent(duration=int(clip.get("leading_silence_s", 0) * 1000))
+        sound = (silence + speech).set_frame_rate(16000).set_channels(1).set_sample_width(2)
+        sound.export(wav_path, format="wav")
+        if clip.get("ogg"):
+            sound.export(os.path.join(corpus_dir, clip["ogg"]), format="ogg", codec="libvorbis")
+        print(f"Generata clip {clip['id']} ({len(sound) / 1000:.1f}s)")
+
+
+def peak_rss_mb():
+    """RSS di picco del processo (MB), None dove resource non è disponibile (Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux riporta KB, macOS byte
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))]
+
+
+def run_config(config, corpus_dir, repeats):
+    """
+    Esegue una combinazione (percorso, trim, blocco) su tutte le clip.
+    Gira in un processo dedicato, così l'RSS di picco è quello della sola combinazione
+    """
+    sys.path.insert(0, WEB_API_DIR)
+    from utils.stt import STT
+
+    load_start = time.perf_counter()
+    stt = STT()
+    load_s = time.perf_counter() - load_start
+    if not stt.is_available:
+        raise RuntimeError(stt.error_message or "Modello Vosk non disponibile")
+    stt.block_size = config["block_size"]
+    stt.timing_enabled = True
+    stt.warm_up()
+    rss_after_load = peak_rss_mb()
+
+    audio_key = "ogg" if config["path"].startswith("ogg") else "wav"
+    samples = []
+    for clip in load_manifest(corpus_dir)["clips"]:
+        audio_path = os.path.join(corpus_dir, clip.get(audio_key) or "")
+        if not clip.get(audio_key) or not os.path.exists(audio_path):
+            continue
+        duration = wav_duration(os.path.join(corpus_dir, clip["wav"]))
+        metadata = None
+        if config["trim"]:
+            # Come il client del robot: inizio registrazione e istante in cui è stata rilevata la voce
+            recording_start = time.time()
+            metadata = {"recording_start": recording_start,
+                        "speech_detected": recording_start + clip.get("leading_silence_s", 0)}
+
+        for _ in range(repeats):
+            start = time.perf_counter()
+            if config["path"] == "wav":
+                success, result = stt.transcribe(ClipFile(audio_path))
+            elif config["path"].endswith("-stream"):
+                with open(audio_path, "rb") as body:
+                    success, result = stt.transcribe_stream(body, metadata)
+            else:
+                success, result = stt.transcribe_ogg(ClipFile(audio_path), metadata)
+            total_ms = (time.perf_counter() - start) * 1000
+            errors, ref_words = word_errors(clip["text"], result.get("text", "") if success else "")
+            timing = result.get("timing", {})
+            samples.append({
+                "clip": clip["id"],
+                "audio_s": duration,
+                "total_ms": total_ms,
+                "audio_prep_ms": timing.get("audio_prep_ms"),
+                "stt_ms": timing.get("stt_ms", total_ms if config["path"] == "wav" else None),
+                "errors": errors,
+                "ref_words": ref_words,
+                "success": success,
+            })
+
+    return {"load_s": round(load_s, 2), "rss_after_load_mb": rss_after_load,
+            "peak_rss_mb": peak_rss_mb(), "samples": samples}
+
+
+def summarize(config, raw):
+    """RTF, percentili per fase, WER e memoria di una combinazione"""
+    samples = raw["samples"]
+    audio_s = sum(s["audio_s"] for s in samples)
+    ref_words = sum(s["ref_words"] for s in samples)
+    stages = {}
+    for stage in ("audio_prep_ms", "stt_ms", "total_ms"):
+        values = [s[stage] for s in samples if s[stage] is not None]
+        if values:
+            stages[stage] = {
+                "p50": round(percentile(values, 50), 1),
+                "p95": round(percentile(values, 95), 1),
+                "max": round(max(values), 1),
+            }
+    return {
+        **config,
+        "clips": len(samples),
+        "failures": sum(1 for s in samples if not s["success"]),
+        "audio_s": round(audio_s, 2),
+        "rtf": round(sum(s["total_ms"] for s in samples) / 1000 / audio_s, 4) if audio_s else None,
+        "wer": round(sum(s["errors"] for s in samples) / ref_words, 4) if ref_words else None,
+        "stages": stages,
+        "load_s": raw["load_s"],
+        "rss_after_load_mb": raw["rss_after_load_mb"],
+        "peak_rss_mb": raw["peak_rss_mb"],
+    }
+
+
+def config_key(config):
+    return f"{config['path']}|trim={'on' if config['trim'] else 'off'}|block={config['block_size']}"
+
+
+def build_configs(paths, trims, block_sizes):
+    configs = []
+    for path, trim, block_size in itertools.product(paths, trims, block_sizes):
+        # Smart Trim esiste solo nei percorsi di transcribe_ogg e transcribe_stream
+        if trim and path == "wav":
+            continue
+        configs.append({"path": path, "trim": trim, "block_size": block_size})
+    return configs
+
+
+def run_in_subprocess(config, corpus_dir, repeats):
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", json.dumps(config),
+         "--corpus", corpus_dir, "--repeats", str(repeats)],
+        capture_output=True, text=True,
+    )
+    for line in proc.stdout.splitlines():
+        if line.startswith("BENCH_RESULT "):
+            return json.loads(line[len("BENCH_RESULT "):])
+    tail = "\n".join(proc.stderr.splitlines()[-10:])
+    raise RuntimeError(f"{config_key(config)} fallita (exit {proc.returncode}):\n{tail}")
+
+
+def compare(results, baseline, tolerance=0.10, wer_tolerance=0.02):
+    """
+    Confronta i risultati con una baseline salvata con --save
+    Returns:
+        list: Regressioni trovate (RTF, p95 totale, WER, RSS di picco)
+    """
+    previous = {config_key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get(config_key(result))
+        if not before:
+            continue
+        key = config_key(result)
+        if before["rtf"] and result["rtf"] > before["rtf"] * (1 + tolerance):
+            regressions.append(f"{key}: RTF {before['rtf']} -> {result['rtf']}")
+        p95_before = before["stages"].get("total_ms", {}).get("p95")
+        p95_after = result["stages"].get("total_ms", {}).get("p95")
+        if p95_before and p95_after and p95_after > p95_before * (1 + tolerance):
+            regressions.append(f"{key}: p95 {p95_before} ms -> {p95_after} ms")
+        if before["wer"] is not None and result["wer"] > before["wer"] + wer_tolerance:
+            regressions.append(f"{key}: WER {before['wer']} -> {result['wer']}")
+        if before["peak_rss_mb"] and result["peak_rss_mb"] and \
+                result["peak_rss_mb"] > before["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{key}: RSS {before['peak_rss_mb']} MB -> {result['peak_rss_mb']} MB")
+    return regressions
+
+
+def format_results(results):
+    lines = [f"{'combinazione':<34}{'clip':>5}{'RTF':>8}{'WER':>8}{'prep p95':>10}"
+             f"{'stt p95':>10}{'tot p95':>10}{'RSS MB':>9}"]
+    for r in results:
+        stages = r["stages"]
+        lines.append(
+            f"{config_key(r):<34}{r['clips']:>5}{r['rtf'] if r['rtf'] is not None else '-':>8}"
+            f"{r['wer'] if r['wer'] is not None else '-':>8}"
+            f"{stages.get('audio_prep_ms', {}).get('p95', '-'):>10}"
+            f"{stages.get('stt_ms', {}).get('p95', '-'):>10}"
+            f"{stages.get('total_ms', {}).get('p95', '-'):>10}"
+            f"{r['peak_rss_mb'] if r['peak_rss_mb'] is not None else '-':>9}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark STT offline (RTF, latenze, RSS, WER)")
+    parser.add_argument("--corpus", default=CORPUS_DIR, help="Cartella con manifest.json e le clip")
+    parser.add_argument("--generate", action="store_true", help="Genera le clip del manifest con espeak-ng")
+    parser.add_argument("--voice", default="it", help="Voce espeak-ng per --generate")
+    parser.add_argument("--paths", default=",".join(DECODE_PATHS), help="Percorsi di decodifica da misurare")
+    parser.add_argument("--trim", default="off,on", help="Smart Trim: off, on o off,on")
+    parser.add_argument("--block-sizes", default=",".join(map(str, DEFAULT_BLOCK_SIZES)),
+                        help="Frame per blocco passati a Vosk")
+    parser.add_argument("--repeats", type=int, default=1, help="Ripetizioni di ogni clip")
+    parser.add_argument("--save", help="Salva i risultati come baseline JSON")
+    parser.add_argument("--compare", help="Confronta con una baseline salvata con --save")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Peggioramento relativo ammesso")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        config = json.loads(args.worker)
+        raw = run_config(config, args.corpus, args.repeats)
+        print("BENCH_RESULT " + json.dumps(summarize(config, raw)))
+        return
+
+    if args.generate:
+        try:
+            generate_corpus(args.corpus, voice=args.voice)
+        except (RuntimeError, subprocess.CalledProcessError) as e:
+            print(f"Generazione corpus fallita: {e}")
+            sys.exit(1)
+
+    configs = build_configs(
+        [p.strip() for p in args.paths.split(",") if p.strip()],
+        [t.strip() == "on" for t in args.trim.split(",") if t.strip()],
+        [int(b) for b in args.block_sizes.split(",") if b.strip()],
+    )
+    results = []
+    for config in configs:
+        try:
+            results.append(run_in_subprocess(config, args.corpus, args.repeats))
+        except RuntimeError as e:
+            print(e)
+            sys.exit(1)
+        print(f"Completata {config_key(config)}", file=sys.stderr)
+
+    print(format_results(results))
+    if not any(r["clips"] for r in results):
+        print("\nNessuna clip audio trovata: generale con --generate o aggiungi registrazioni reali al manifest")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"results": results}, f, indent=4, ensure_ascii=False)
+        print(f"\nRisultati salvati in {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nREGRESSIONI rispetto alla baseline:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("\nNessuna regressione rispetto alla baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+File:	/tests/bench/load_generator.py
+-----
+Generatore di carico: N robot simulati con tempi di attesa realistici su /chat e /chat/voice
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:02:48 am
+-----
+Last Modified: 	October 19th 2026 4:17:37 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import json
+import time
+import uuid
+import random
+import socket
+import argparse
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_llm_server import StubConfig, StubLLMServer, load_movements
+from report import build_report, compare, format_report, load_report, save_report
+
+WEB_API_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "web_api"))
+
+# Frasi pronunciate dagli utenti simulati
+USER_MESSAGES = [
+    "Ciao NAO, come stai?",
+    "Raccontami una barzelletta",
+    "Che tempo fa oggi?",
+    "Mi sento un po' stanco",
+    "Facciamo un gioco insieme?",
+    "Parlami degli animali della fattoria",
+    "Mi ricordi di prendere la medicina?",
+    "Che cosa hai fatto oggi?",
+    "Cantami una canzone",
+    "Grazie, sei molto gentile",
+]
+
+# Velocità di lettura del robot (parole al secondo) per stimare quanto dura la risposta parlata
+ROBOT_WORDS_PER_SECOND = 2.5
+
+
+def encode_multipart(fields, files):
+    """Codifica multipart/form-data (solo libreria standard)"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8")
+        )
+    for name, (filename, content, content_type) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + content + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def post(url, body, content_type, timeout):
+    """POST con misura della latenza lato client; restituisce (status, json, ms)"""
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": content_type}, method="POST")
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            status, raw = response.status, response.read()
+    except urllib.error.HTTPError as e:
+        status, raw = e.code, e.read()
+    except (urllib.error.URLError, OSError) as e:
+        return 0, {"error": str(e), "stage": "connection"}, (time.perf_counter() - start) * 1000
+    elapsed = (time.perf_counter() - start) * 1000
+    try:
+        payload = json.loads(raw)
+    except ValueError:
+        payload = {}
+    return status, payload, elapsed
+
+
+def spoken_seconds(payload):
+    """Durata stimata della risposta pronunciata dal robot"""
+    chunks = (payload.get("response") or {}).get("chunks", [])
+    words = sum(len(chunk.get("text", "").split()) for chunk in chunks)
+    return words / ROBOT_WORDS_PER_SECOND
+
+
+class Robot(threading.Thread):
+    """Robot simulato: una conversazione di N turni, a voce o testo, con pause realistiche"""
+
+    def __init__(self, index, args, audio_clips, samples, lock):
+        super().__init__(name=f"robot-{index}", daemon=True)
+        self.index = index
+        self.args = args
+        self.audio_clips = audio_clips
+        self.samples = samples
+        self.lock = lock
+        self.rng = random.Random(None if args.seed is None else args.seed + index)
+
+    def think(self, payload):
+        # Il robot pronuncia la risposta, poi l'utente pensa e risponde
+        pause = spoken_seconds(payload) + self.rng.uniform(self.args.think_min, self.args.think_max)
+        time.sleep(pause * self.args.think_scale)
+
+    def run(self):
+        args = self.args
+        # Avvio scaglionato dei robot (ramp-up)
+        time.sleep(self.rng.uniform(0, args.ramp_up))
+        chat_id = None
+        payload = {}
+
+        for turn in range(args.turns):
+            if turn > 0:
+                self.think(payload)
+
+            use_voice = bool(self.audio_clips) and self.rng.random() < args.voice_ratio
+            if use_voice:
+                filename, content = self.rng.choice(self.audio_clips)
+                # robot_id: il server ripartisce i posti tra i robot (statistiche admin "admission")
+                fields = {"robot_id": self.name, **({"chat_id": chat_id} if chat_id else {})}
+                content_type = "audio/ogg" if filename.endswith(".ogg") else "audio/wav"
+                body, ctype = encode_multipart(fields, {"audio": (filename, content, content_type)})
+                route = "/chat/voice"
+            else:
+                data = {"action": "talk", "message": self.rng.choice(USER_MESSAGES), "robot_id": self.name}
+                if chat_id:
+                    data["chat_id"] = chat_id
+                body, ctype = json.dumps(data).encode("utf-8"), "application/json"
+                route = "/chat"
+
+            status, payload, elapsed = post(args.url + route, body, ctype, args.timeout)
+            # Le risposte "un attimo" del controllo di ammissione non sono turni riusciti
+            shed = payload.get("shed", False)
+            ok = status == 200 and payload.get("success", False) and not shed
+            with self.lock:
+                self.samples.append({
+                    "route": route,
+                    "status": status,
+                    "ok": ok,
+                    "client_ms": elapsed,
+                    "timing": payload.get("timing", {}),
+                    "error_stage": None if ok else (f"shed_{payload.get('budget')}" if shed else payload.get("stage")),
+                })
+            if ok:
+                chat_id = payload.get("chat_id", chat_id)
+
+        if chat_id:
+            post(args.url + "/chat", json.dumps({"action": "end", "chat_id": chat_id}).encode("utf-8"),
+                 "application/json", args.timeout)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url, timeout):
+    """Attende che /ready risponda 200"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url + "/ready", timeout=2) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def start_stack(args):
+    """Avvia il server LLM finto e il server web_api configurato per usarlo"""
+    stub = StubLLMServer(StubConfig(
+        latency_ms=args.stub_latency_ms,
+        jitter_ms=args.stub_jitter_ms,
+        token_rate=args.stub_token_rate,
+        malformed_rate=args.stub_malformed_rate,
+        movements=load_movements(),
+        seed=args.seed,
+    )).start()
+
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "LLM_MODEL": "openai/gpt-stub",
+        "LLM_FALLBACK_MODELS": "",
+        "LLM_API_BASE": stub.url,
+        "OPENAI_API_KEY": "stub-key",
+        "LLM_STRUCTURED_OUTPUT": "off",
+        "LLM_HTTP_PING_INTERVAL": "0",
+        "WARMUP_LLM_CALL": "false",
+        "TIMING_ENABLED": "true",
+        "READY_REQUIRED": "llm,stt" if args.voice_ratio > 0 else "llm",
+    })
+    if args.workers > 0:
+        command = ["gunicorn", "-w", str(args.workers), "-k", "gthread", "--threads", str(args.threads),
+                   "-b", f"127.0.0.1:{port}", "main:app"]
+    else:
+        command = [sys.executable, "-c",
+                   f"from main import app; app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    server = subprocess.Popen(command, cwd=WEB_API_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    if not wait_ready(url, args.ready_timeout) or server.poll() is not None:
+        server.terminate()
+        stub.stop()
+        raise RuntimeError("Il server web_api non è diventato pronto (usa --verbose per vedere l'errore)")
+    return stub, server, url
+
+
+def load_audio_clips(paths):
+    clips = []
+    for path in paths or []:
+        with open(path, "rb") as f:
+            clips.append((os.path.basename(path), f.read()))
+    return clips
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark di carico: N robot simulati su /chat e /chat/voice")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="URL del server (ignorato con --spawn)")
+    parser.add_argument("--spawn", action="store_true",
+                        help="Avvia in locale il server LLM finto e il server web_api (offline)")
+    parser.add_argument("--robots", type=int, default=10, help="Robot simulati in parallelo")
+    parser.add_argument("--turns", type=int, default=5, help="Turni di conversazione per robot")
+    parser.add_argument("--think-min", type=float, default=2.0, help="Pausa minima dell'utente (secondi)")
+    parser.add_argument("--think-max", type=float, default=6.0, help="Pausa massima dell'utente (secondi)")
+    parser.add_argument("--think-scale", type=float, default=1.0,
+                        help="Fattore sulle pause (es. 0.1 per un test rapido, 0 per carico massimo)")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="Secondi in cui avviare tutti i robot")
+    parser.add_argument("--voice-ratio", type=float, default=0.0, help="Frazione di turni su /chat/voice")
+    parser.add_argument("--audio", action="append", help="Clip audio (WAV/OGG) per /chat/voice, ripetibile")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Timeout di ogni richiesta (secondi)")
+    parser.add_argument("--seed", type=int, help="Seme per rendere ripetibile il test")
+    parser.add_argument("--save", help="Salva il report JSON (es. come baseline)")
+    parser.add_argument("--compare", help="Confronta con un report baseline salvato")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Peggioramento ammesso nel confronto")
+    # Server finto e server web_api avviati con --spawn
+    parser.add_argument("--stub-latency-ms", type=float, default=300.0)
+    parser.add_argument("--stub-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--stub-token-rate", type=float, default=0.0)
+    parser.add_argument("--stub-malformed-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=0, help="Worker gunicorn (0 = server Flask multithread)")
+    parser.add_argument("--threads", type=int, default=8, help="Thread per worker gunicorn")
+    parser.add_argument("--ready-timeout", type=float, default=120.0)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    audio_clips = load_audio_clips(args.audio)
+    if args.voice_ratio > 0 and not audio_clips:
+        parser.error("--voice-ratio richiede almeno un file --audio")
+
+    stub = server = None
+    if args.spawn:
+        stub, server, args.url = start_stack(args)
+    args.url = args.url.rstrip("/")
+
+    samples, lock = [], threading.Lock()
+    robots = [Robot(i, args, audio_clips, samples, lock) for i in range(args.robots)]
+    start = time.perf_counter()
+    try:
+        for robot in robots:
+            robot.start()
+        for robot in robots:
+            robot.join()
+    finally:
+        wall_seconds = time.perf_counter() - start
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+        if stub is not None:
+            stub.stop()
+
+    config = {k: v for k, v in vars(args).items() if k not in ("audio", "save", "compare", "verbose")}
+    report = build_report(samples, wall_seconds, config)
+    print(format_report(report))
+
+    if args.save:
+        save_report(report, args.save)
+        print(f"\nReport salvato in {args.save}")
+
+    if args.compare:
+        regressions = compare(report, load_report(args.compare), args.tolerance)
+        if regressions:
+            print("\nREGRESSIONI rispetto alla baseline:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("\nNessuna regressione rispetto alla baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+File:	/tests/bench/report.py
+-----
+Report del benchmark di carico: throughput e percentili p50/p95/p99 per fase
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:02:48 am
+-----
+Last Modified: 	October 19th 2026 4:02:48 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import json
+from collections import Counter
+
+# Aggiunge la root del progetto al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from web_api.utils.model_router import percentile
+
+# Fasi riportate dal server con TIMING_ENABLED=true
+SERVER_STAGES = ["audio_prep_ms", "stt_ms", "llm_ms", "total_ms"]
+
+
+def describe(values):
+    """Conteggio, media e percentili p50/p95/p99 (ms) di una lista di latenze"""
+    if not values:
+        return None
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 1),
+        "p50": round(percentile(values, 50), 1),
+        "p95": round(percentile(values, 95), 1),
+        "p99": round(percentile(values, 99), 1),
+        "max": round(max(values), 1),
+    }
+
+
+def build_report(samples, wall_seconds, config=None):
+    """
+    Aggrega i campioni raccolti dal generatore di carico
+    Args:
+        samples: Lista di dizionari {route, status, ok, client_ms, timing, error_stage}
+        wall_seconds: Durata complessiva del test (secondi)
+        config: Parametri del test da riportare (opzionale)
+    Returns:
+        dict: Throughput, errori e percentili per rotta e per fase
+    """
+    routes = {}
+    for route in sorted({s["route"] for s in samples}):
+        route_samples = [s for s in samples if s["route"] == route]
+        ok_samples = [s for s in route_samples if s["ok"]]
+        stages = {"client_ms": describe([s["client_ms"] for s in ok_samples])}
+        for stage in SERVER_STAGES:
+            values = [s["timing"][stage] for s in ok_samples if stage in s.get("timing", {})]
+            if values:
+                stages[stage] = describe(values)
+        routes[route] = {
+            "requests": len(route_samples),
+            "errors": len(route_samples) - len(ok_samples),
+            "error_stages": dict(Counter(s.get("error_stage") or "http" for s in route_samples if not s["ok"])),
+            "stages": stages,
+        }
+
+    ok_count = sum(1 for s in samples if s["ok"])
+    return {
+        "config": config or {},
+        "wall_seconds": round(wall_seconds, 2),
+        "requests": len(samples),
+        "errors": len(samples) - ok_count,
+        "error_rate": round((len(samples) - ok_count) / len(samples), 4) if samples else 0.0,
+        "throughput_rps": round(ok_count / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        "status_codes": {str(k): v for k, v in sorted(Counter(s["status"] for s in samples).items())},
+        "routes": routes,
+    }
+
+
+def compare(report, baseline, tolerance=0.10):
+    """
+    Confronta il report con una baseline salvata
+    Args:
+        tolerance: Peggioramento relativo ammesso (0.10 = 10%)
+    Returns:
+        list: Descrizione delle regressioni trovate (vuota se nessuna)
+    """
+    regressions = []
+    if report["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+        regressions.append(
+            f"throughput {report['throughput_rps']} req/s < baseline {baseline['throughput_rps']} req/s"
+        )
+    if report["error_rate"] > baseline["error_rate"] + tolerance / 10:
+        regressions.append(f"error_rate {report['error_rate']} > baseline {baseline['error_rate']}")
+
+    for route, data in report["routes"].items():
+        base_route = baseline.get("routes", {}).get(route)
+        if not base_route:
+            continue
+        for stage, stats in data["stages"].items():
+            base_stats = base_route["stages"].get(stage)
+            if not stats or not base_stats:
+                continue
+            for pct in ("p95", "p99"):
+                if stats[pct] > base_stats[pct] * (1 + tolerance):
+                    regressions.append(
+                        f"{route} {stage} {pct}: {stats[pct]} ms > baseline {base_stats[pct]} ms"
+                    )
+    return regressions
+
+
+def format_report(report):
+    """Report leggibile (tabella per rotta e fase)"""
+    lines = [
+        f"Durata: {report['wall_seconds']}s  Richieste: {report['requests']}  "
+        f"Errori: {report['errors']} ({report['error_rate'] * 100:.1f}%)  "
+        f"Throughput: {report['throughput_rps']} req/s",
+        f"Status: {report['status_codes']}",
+    ]
+    for route, data in report["routes"].items():
+        lines.append("")
+        lines.append(f"{route}  richieste={data['requests']}  errori={data['errors']} {data['error_stages'] or ''}")
+        lines.append(f"  {'fase':<14}{'n':>6}{'media':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+        for stage, stats in data["stages"].items():
+            if stats:
+                lines.append(
+                    f"  {stage:<14}{stats['count']:>6}{stats['mean']:>10}{stats['p50']:>10}"
+                    f"{stats['p95']:>10}{stats['p99']:>10}{stats['max']:>10}"
+                )
+    return "\n".join(lines)
+
+
+def load_report(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_report(report, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,254 @@
+"""
+File:	/tests/bench/stub_llm_server.py
+-----
+Server LLM finto compatibile OpenAI (chat.completions) per i benchmark offline:
+latenza, velocità di generazione dei token e percentuale di JSON malformato configurabili
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:02:48 am
+-----
+Last Modified: 	October 19th 2026 4:02:48 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Frasi usate per comporre le risposte del robot
+SENTENCES = [
+    "Ciao! Che bello parlare con te.",
+    "Oggi è proprio una bella giornata, non trovi?",
+    "Mi piace molto ascoltare le tue storie.",
+    "Vuoi che ti racconti qualcosa di curioso sugli animali?",
+    "Ricordati di bere un bicchiere d'acqua.",
+    "Sono un robot, ma le tue parole mi fanno sorridere.",
+    "Facciamo insieme un piccolo esercizio per le braccia?",
+    "Dimmi pure, sono qui per te.",
+]
+
+DEFAULT_MOVEMENTS_FILES = [
+    os.path.join(os.path.dirname(__file__), "..", "..", "web_api", "utils", "movements.json"),
+    os.path.join(os.path.dirname(__file__), "..", "..", "web_api", "utils", "movements.example.json"),
+]
+
+
+def load_movements(path=None):
+    """Legge movements_library dal file indicato o da quello del server (o dall'esempio)"""
+    for candidate in [path] if path else DEFAULT_MOVEMENTS_FILES:
+        if candidate and os.path.exists(candidate):
+            with open(candidate, "r", encoding="utf-8") as f:
+                return json.load(f).get("movements_library", [])
+    return []
+
+
+def estimate_tokens(text):
+    """Stima grossolana dei token (circa 4 caratteri per token)"""
+    return max(1, len(text) // 4)
+
+
+def malform(text, rng):
+    """Rovina il JSON nei modi visti con i modelli reali (troncamento, apici singoli, testo extra)"""
+    kind = rng.choice(["truncated", "single_quotes", "trailing_text", "not_json"])
+    if kind == "truncated":
+        return text[: max(1, int(len(text) * rng.uniform(0.5, 0.9)))]
+    if kind == "single_quotes":
+        return text.replace('"', "'")
+    if kind == "trailing_text":
+        return "Ecco la risposta:\n" + text + "\nSpero ti piaccia!"
+    return rng.choice(SENTENCES)
+
+
+class StubConfig:
+    """Parametri del server finto"""
+
+    def __init__(self, latency_ms=300.0, jitter_ms=100.0, token_rate=0.0, malformed_rate=0.0,
+                 movements=None, seed=None):
+        """
+        Args:
+            latency_ms: Latenza media prima del primo token (millisecondi)
+            jitter_ms: Variazione casuale della latenza (+/- millisecondi)
+            token_rate: Token generati al secondo (0 = risposta istantanea dopo la latenza)
+            malformed_rate: Frazione (0-1) di risposte con JSON malformato
+            movements: Movimenti da inserire nelle risposte
+            seed: Seme del generatore casuale (risposte riproducibili)
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.token_rate = token_rate
+        self.malformed_rate = malformed_rate
+        self.movements = movements if movements is not None else load_movements()
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "malformed": 0, "completion_tokens": 0}
+
+    def make_content(self):
+        """Contenuto della risposta (JSON come da schema del robot, a volte malformato) e flag malformato"""
+        with self.lock:
+            rng = self.rng
+            chunks = []
+            for _ in range(rng.randint(1, 3)):
+                movements = [rng.choice(self.movements)] if self.movements else []
+                chunks.append({"text": rng.choice(SENTENCES), "movements": movements})
+            text = json.dumps({"action": "NO_ACTION", "chunks": chunks}, ensure_ascii=False)
+            malformed = rng.random() < self.malformed_rate
+            if malformed:
+                text = malform(text, rng)
+            delay = max(0.0, self.latency_ms + rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+        return text, malformed, delay
+
+
+def make_handler(config):
+    """Crea l'handler HTTP legato alla configurazione"""
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                request = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                return self._send_json(400, {"error": {"message": "JSON non valido"}})
+
+            if not self.path.rstrip("/").endswith("chat/completions"):
+                return self._send_json(404, {"error": {"message": f"Rotta non gestita: {self.path}"}})
+
+            content, malformed, delay = config.make_content()
+            max_tokens = request.get("max_tokens")
+            completion_tokens = estimate_tokens(content)
+            if max_tokens:
+                completion_tokens = min(completion_tokens, max_tokens)
+            prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in request.get("messages", []))
+
+            # Latenza del primo token + tempo di generazione
+            if config.token_rate > 0:
+                delay += completion_tokens / config.token_rate
+            time.sleep(delay)
+
+            with config.lock:
+                config.stats["requests"] += 1
+                config.stats["malformed"] += int(malformed)
+                config.stats["completion_tokens"] += completion_tokens
+
+            self._send_json(200, {
+                "id": f"chatcmpl-stub-{config.stats['requests']}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content},
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            })
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("models"):
+                return self._send_json(200, {"object": "list", "data": [{"id": "gpt-stub", "object": "model"}]})
+            if self.path.rstrip("/") == "/stats":
+                with config.lock:
+                    return self._send_json(200, dict(config.stats))
+            self._send_json(404, {"error": {"message": f"Rotta non gestita: {self.path}"}})
+
+        def do_HEAD(self):
+            # Usata dal ping del pool HTTP del server
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    return StubHandler
+
+
+class StubLLMServer:
+    """Server finto avviato in un thread (usato da load_generator.py e dai test)"""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or StubConfig()
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(self.config))
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """URL base compatibile OpenAI (da usare come LLM_API_BASE)"""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="stub-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server LLM finto compatibile OpenAI per i benchmark offline")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Latenza media del primo token")
+    parser.add_argument("--jitter-ms", type=float, default=100.0, help="Variazione casuale della latenza")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="Token al secondo (0 = istantaneo)")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Frazione di risposte con JSON malformato")
+    parser.add_argument("--movements", help="File JSON con movements_library (default: quello del server)")
+    parser.add_argument("--seed", type=int, help="Seme per risposte riproducibili")
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        token_rate=args.token_rate,
+        malformed_rate=args.malformed_rate,
+        movements=load_movements(args.movements),
+        seed=args.seed,
+    )
+    server = StubLLMServer(config, host=args.host, port=args.port)
+    print(f"Server LLM finto in ascolto: LLM_API_BASE={server.url}  (LLM_MODEL=openai/gpt-stub)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
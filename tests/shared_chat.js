@@ -296,6 +296,9 @@ const SharedChatLogic = {
             } else {
                 contentHtml = this.escapeHtml(originalContent);
             }
+        } else if (originalContent && typeof originalContent === 'object') {
+            // Assistant content already decoded by the server (history and export-chats)
+            parsedContentObj = originalContent;
         }
 
         // Chunks logic mapped
@@ -0,0 +1,113 @@
+"""
+File:	/tests/utils/bench_cleantext.py
+-----
+Microbenchmark clean_text: versione originale vs versione a passata singola
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 3:46:13 am
+-----
+Last Modified: 	October 19th 2026 3:46:13 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import re
+import json
+import timeit
+
+# Aggiunge la root del progetto al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from web_api.utils.cleantext import clean_text
+
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cleantext_golden.json")
+
+# Frasi tipiche dei chunk generati dall'LLM
+REALISTIC_CHUNKS = [
+    "Ciao! Sono NAO, un robot umanoide. È un piacere conoscerti, come posso esserti utile oggi?",
+    "Certo!! Ti racconto una storia (molto bella) sul *mare* e sui pesci... 🐟 Sei pronto?",
+    "Perché il cielo è blu? La luce del sole viene diffusa dall'atmosfera: il blu più degli altri colori.",
+    "Bravissimo! 🎉 Hai risposto correttamente a tutte le domande :) Vuoi fare un altro gioco?",
+    "Respira piano, così... Inspira con il naso ed espira con la bocca. Va meglio adesso?",
+]
+
+
+def legacy_clean_text(text):
+    """Versione originale di clean_text (14 passate re.sub), usata come riferimento"""
+    # Rimuove emoji e caratteri speciali
+    # Questo pattern copre la maggior parte degli emoji Unicode e altri simboli speciali
+    text = re.sub(
+        r"[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F700-\U0001F77F\U0001F780-\U0001F7FF\U0001F800-\U0001F8FF\U0001F900-\U0001F9FF\U0001FA00-\U0001FA6F\U0001FA70-\U0001FAFF\U00002702-\U000027B0\U000024C2-\U0001F251]+",
+        "",
+        text,
+    )
+
+    # Rimuove emoticon testuali comuni
+    text = re.sub(r"[:;=]-?[)(/\\|dpDP]", "", text)  # e.g., :) :( ;) :D :P
+
+    # Rimuove spazi multipli e va a capo
+    text = re.sub(r"\s+", " ", text)
+
+    # Normalizza la punteggiatura
+    text = re.sub(r"(!+)", "!", text)  # Normalizza esclamazioni multiple
+    text = re.sub(r"(\?+)", "?", text)  # Normalizza punti interrogativi multipli
+    text = re.sub(r"(\.+)", ".", text)  # Normalizza punti multipli
+    text = re.sub(r"(-+)", "-", text)  # Normalizza trattini multipli
+    text = re.sub(r"(\*+)", "", text)  # Rimuove gli asterischi
+    text = re.sub(r"[\[\]\(\)\{\}]", "", text)  # Rimuove le parentesi
+    text = re.sub(r"[/\\]", "", text)  # Rimuove slash e backslash
+    text = re.sub(r'"', '', text)      # Rimuove le doppie virgolette
+
+    # Rimuove spazi prima della punteggiatura
+    text = re.sub(r"\s+([.,!?;:])", r"\1", text)
+
+    # Rimuove spazi extra
+    text = text.strip()
+
+    # Converte in ascii e restituisce
+    return text
+
+
+def run_benchmark(name, corpus, repeat=5, number=20):
+    # Verifica preliminare: stesso output byte per byte
+    for text in corpus:
+        assert clean_text(text) == legacy_clean_text(text), f"Output diverso per {text!r}"
+
+    def run(fn):
+        for text in corpus:
+            fn(text)
+
+    legacy = min(timeit.repeat(lambda: run(legacy_clean_text), repeat=repeat, number=number))
+    current = min(timeit.repeat(lambda: run(clean_text), repeat=repeat, number=number))
+
+    calls = len(corpus) * number
+    print(f"{name}: {len(corpus)} testi, {calls} chiamate per misura (migliore di {repeat})")
+    print(f"  Originale:      {legacy * 1e6 / calls:8.2f} us/chiamata")
+    print(f"  Nuova versione: {current * 1e6 / calls:8.2f} us/chiamata")
+    print(f"  Speed-up:       {legacy / current:8.2f}x")
+
+
+if __name__ == "__main__":
+    with open(GOLDEN_FILE, 'r', encoding='utf-8') as f:
+        golden_corpus = [case["input"] for case in json.load(f)]
+
+    run_benchmark("Chunk realistici", REALISTIC_CHUNKS * 100)
+    run_benchmark("Corpus golden", golden_corpus)
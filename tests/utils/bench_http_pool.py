@@ -0,0 +1,184 @@
+"""
+File:	/tests/utils/bench_http_pool.py
+-----
+Benchmark connessioni al provider LLM: nuova connessione per turno vs pool keep-alive
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 3:59:57 am
+-----
+Last Modified: 	October 19th 2026 3:59:57 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import ssl
+import json
+import time
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Aggiunge la root del progetto al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import httpx
+
+from web_api.utils.http_pool import HttpPool
+
+# Risposta minima in formato OpenAI chat.completions
+STUB_RESPONSE = json.dumps({
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "model": "stub",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {
+        "role": "assistant",
+        "content": '{"action": "NO_ACTION", "chunks": [{"text": "Ciao!", "movements": []}]}',
+    }}],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+}).encode("utf-8")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Provider finto: risponde dopo una latenza fissa, con keep-alive HTTP/1.1"""
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(STUB_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(STUB_RESPONSE)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def make_certificate(directory):
+    """Certificato autofirmato per localhost (None se openssl non è disponibile)"""
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    try:
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", key, "-out", cert,
+             "-days", "1", "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost"],
+            check=True, capture_output=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return cert, key
+
+
+def start_stub(latency, cert, key):
+    StubHandler.latency = latency
+    server = ThreadingHTTPServer(("localhost", 0), StubHandler)
+    scheme = "http"
+    if cert:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://localhost:{server.server_address[1]}"
+
+
+def run_turns(url, turns, client_factory, shared):
+    """Esegue N turni e restituisce le latenze in ms"""
+    payload = {"model": "stub", "messages": [{"role": "user", "content": "Ciao NAO"}]}
+    latencies = []
+    client = client_factory() if shared else None
+    for _ in range(turns):
+        start = time.perf_counter()
+        if shared:
+            client.post(url + "/v1/chat/completions", json=payload).raise_for_status()
+        else:
+            with client_factory() as one_shot:
+                one_shot.post(url + "/v1/chat/completions", json=payload).raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+    if client is not None:
+        client.close()
+    return latencies
+
+
+def describe(latencies):
+    ordered = sorted(latencies)
+    return {
+        "mean_ms": round(statistics.mean(ordered), 2),
+        "p50_ms": round(ordered[len(ordered) // 2], 2),
+        "p95_ms": round(ordered[int(len(ordered) * 0.95) - 1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pool di connessioni verso il provider LLM")
+    parser.add_argument("--turns", type=int, default=200, help="Turni per modalità")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latenza del provider finto (secondi)")
+    parser.add_argument("--no-tls", action="store_true", help="Provider finto in HTTP (senza handshake TLS)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cert, key = (None, None) if args.no_tls else make_certificate(tmp)
+        server, url = start_stub(args.latency, cert, key)
+        verify = ssl.create_default_context(cafile=cert) if cert else True
+
+        # Senza pool: una nuova connessione (TCP + TLS) a ogni turno
+        cold = run_turns(url, args.turns, lambda: httpx.Client(verify=verify), shared=False)
+
+        # Con pool: il client configurato come HttpPool, connessione riusata tra i turni
+        pool = HttpPool(http2=False)
+
+        def pooled_client():
+            return httpx.Client(
+                verify=verify,
+                limits=httpx.Limits(
+                    max_connections=pool.max_connections,
+                    max_keepalive_connections=pool.max_keepalive_connections,
+                    keepalive_expiry=pool.keepalive_expiry,
+                ),
+            )
+
+        warm = run_turns(url, args.turns, pooled_client, shared=True)
+        server.shutdown()
+
+    report = {
+        "transport": "https" if cert else "http",
+        "turns": args.turns,
+        "provider_latency_ms": args.latency * 1000,
+        "new_connection_per_turn": describe(cold),
+        "keep_alive_pool": describe(warm),
+    }
+    report["saving_per_turn_ms"] = round(
+        report["new_connection_per_turn"]["p50_ms"] - report["keep_alive_pool"]["p50_ms"], 2
+    )
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+File:	/tests/utils/bench_startup.py
+-----
+Benchmark avvio del server: tempi di import (python -X importtime) e warm-up
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 3:55:09 am
+-----
+Last Modified: 	October 19th 2026 3:55:09 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import re
+import json
+import argparse
+import statistics
+import subprocess
+
+WEB_API_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'web_api'))
+
+# Moduli pesanti di cui riportare sempre il tempo di import cumulativo
+HEAVY_MODULES = ("litellm", "google.genai", "vosk", "pydub", "flask", "dotenv")
+
+# Script eseguito in un processo separato: importa main (create_app) e attende il warm-up
+PROBE = """
+import json, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+warmup = main.app.extensions.get("warmup")
+status = {}
+if warmup is not None:
+    for name in warmup.get_status():
+        warmup.wait(name)
+    status = warmup.get_status()
+t2 = time.perf_counter()
+print("BENCH_RESULT " + json.dumps({"app_ready_s": t1 - t0, "warm_s": t2 - t0, "warmup": status}))
+"""
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def parse_importtime(stderr):
+    """
+    Legge l'output di -X importtime
+    Returns:
+        dict: modulo -> (self_us, cumulative_us, livello di annidamento)
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules[name] = (int(self_us), int(cumulative_us), len(indent) // 2)
+    return modules
+
+
+def run_once():
+    """Avvia un interprete che importa main con -X importtime"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=WEB_API_DIR, capture_output=True, text=True,
+    )
+    result = None
+    for line in proc.stdout.splitlines():
+        if line.startswith("BENCH_RESULT "):
+            result = json.loads(line[len("BENCH_RESULT "):])
+    if proc.returncode != 0 or result is None:
+        tail = "\n".join(proc.stderr.splitlines()[-15:])
+        raise RuntimeError(f"Avvio fallito (exit {proc.returncode}):\n{tail}")
+    result["imports"] = parse_importtime(proc.stderr)
+    return result
+
+
+def summarize(runs, top):
+    """Mediana dei tempi e moduli più lenti dell'ultima esecuzione"""
+    imports = runs[-1]["imports"]
+    top_level = [(name, cum) for name, (_, cum, level) in imports.items() if level == 0]
+    return {
+        "runs": len(runs),
+        "app_ready_s": round(statistics.median(r["app_ready_s"] for r in runs), 3),
+        "warm_s": round(statistics.median(r["warm_s"] for r in runs), 3),
+        "warmup": runs[-1]["warmup"],
+        "heavy_modules_ms": {
+            name: round(imports[name][1] / 1000, 1) if name in imports else None
+            for name in HEAVY_MODULES
+        },
+        "top_imports_ms": [
+            [name, round(cum / 1000, 1)]
+            for name, cum in sorted(top_level, key=lambda item: item[1], reverse=True)[:top]
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark avvio del server (import e warm-up)")
+    parser.add_argument("--runs", type=int, default=3, help="Numero di avvii (si usa la mediana)")
+    parser.add_argument("--top", type=int, default=15, help="Moduli più lenti da mostrare")
+    parser.add_argument("--save", help="Salva il risultato come baseline JSON")
+    parser.add_argument("--compare", help="Confronta con una baseline JSON salvata con --save")
+    args = parser.parse_args()
+
+    try:
+        runs = [run_once() for _ in range(args.runs)]
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+
+    summary = summarize(runs, args.top)
+    print(json.dumps(summary, indent=4, ensure_ascii=False))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=4, ensure_ascii=False)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        for key in ("app_ready_s", "warm_s"):
+            before, after = baseline[key], summary[key]
+            change = (after - before) / before * 100 if before else 0.0
+            print(f"{key}: {before:.3f}s -> {after:.3f}s ({change:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,7 @@ Extract errors from logs
 @copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
 Created Date: 	March 17th 2026 10:43:49 am
 -----
-Last Modified: 	March 17th 2026 10:44:13 am
+Last Modified: 	October 19th 2026 3:49:13 am
 Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
 -----
 @license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
@@ -29,17 +29,20 @@ Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
 
 import os
 import re
+import gzip
 import json
 
 def extract_errors_from_logs(logs_dir, output_file):
     error_blocks = []
     
     for filename in os.listdir(logs_dir):
-        if not filename.endswith('.txt'):
+        if not filename.endswith(('.txt', '.txt.gz')):
             continue
             
         filepath = os.path.join(logs_dir, filename)
-        with open(filepath, 'r', encoding='utf-8') as f:
+        # I log ruotati sono compressi con gzip
+        opener = gzip.open if filename.endswith('.gz') else open
+        with opener(filepath, 'rt', encoding='utf-8') as f:
             lines = f.readlines()
             
         i = 0
@@ -0,0 +1,228 @@
+"""
+File:	/tests/utils/query_events.py
+-----
+Filtri e statistiche sugli eventi JSONL delle chat (chat_events_YYYYMMDD.jsonl)
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: 	October 19th 2026 3:50:53 am
+-----
+Last Modified: 	October 19th 2026 3:50:53 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import argparse
+from collections import Counter, defaultdict
+
+EVENTS_FILE_RE = re.compile(r"^chat_events_(\d{8})(?:_(\d+))?\.jsonl(\.gz)?$")
+
+# Campi numerici su cui vengono calcolati i percentili con --stats
+LATENCY_FIELDS = ("llm_ms", "total_ms", "stt_ms")
+TOKEN_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens")
+
+
+def _normalize_day(value):
+    """Accetta YYYYMMDD o YYYY-MM-DD"""
+    return value.replace("-", "") if value else None
+
+
+def list_event_files(logs_dir, date_from=None, date_to=None):
+    """
+    Restituisce i file degli eventi in ordine cronologico, filtrati per data
+    usando solo il nome del file (i giorni esclusi non vengono aperti)
+    """
+    date_from, date_to = _normalize_day(date_from), _normalize_day(date_to)
+    files = []
+    for filename in os.listdir(logs_dir):
+        match = EVENTS_FILE_RE.match(filename)
+        if not match:
+            continue
+        day = match.group(1)
+        if (date_from and day < date_from) or (date_to and day > date_to):
+            continue
+        # Le parti numerate (_1, _2, ...) precedono il file principale del giorno
+        part = int(match.group(2)) if match.group(2) else sys.maxsize
+        files.append((day, part, os.path.join(logs_dir, filename)))
+    return [path for _, _, path in sorted(files)]
+
+
+def iter_events(paths, filters=None, contains=None):
+    """
+    Legge gli eventi riga per riga (anche da file .gz) senza caricare i file in memoria.
+    Args:
+        paths: File degli eventi
+        filters: Dizionario campo -> valore atteso (confronto come stringa)
+        contains: Testo che la riga deve contenere (filtro veloce prima del parsing JSON)
+    """
+    filters = filters or {}
+    # Filtro veloce sul testo grezzo: scarta le righe senza i valori cercati prima di json.loads
+    needles = [json.dumps(str(v), ensure_ascii=False) for v in filters.values() if not isinstance(v, bool)]
+    if contains:
+        needles.append(contains)
+
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if needles and not all(needle in line for needle in needles):
+                    continue
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if all(_matches(event.get(field), expected) for field, expected in filters.items()):
+                    yield event
+
+
+def _matches(value, expected):
+    if isinstance(expected, bool):
+        return value is expected
+    return value is not None and str(value) == str(expected)
+
+
+def percentile(values, pct):
+    """Percentile pct (0-100) di una lista di valori, None se vuota"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def aggregate(events, group_by=None):
+    """
+    Calcola le statistiche degli eventi in un solo passaggio.
+    Returns:
+        dict: Gruppo -> conteggi per tipo, esiti JSON, fallback, percentili di latenza e token
+    """
+    groups = defaultdict(lambda: {
+        "events": Counter(),
+        "json_outcomes": Counter(),
+        "fallback": 0,
+        "fallback_model": 0,
+        "errors": 0,
+        "latencies": defaultdict(list),
+        "tokens": Counter(),
+        "chats": set(),
+    })
+
+    for event in events:
+        group = groups[str(event.get(group_by)) if group_by else "all"]
+        group["events"][event.get("event")] += 1
+        if event.get("chat_id") is not None:
+            group["chats"].add(event["chat_id"])
+        if event.get("json_outcome"):
+            group["json_outcomes"][event["json_outcome"]] += 1
+        if event.get("fallback"):
+            group["fallback"] += 1
+        if event.get("fallback_model"):
+            group["fallback_model"] += 1
+        if event.get("event") == "error":
+            group["errors"] += 1
+        for field in LATENCY_FIELDS:
+            if isinstance(event.get(field), (int, float)):
+                group["latencies"][field].append(event[field])
+        for field in TOKEN_FIELDS:
+            if isinstance(event.get(field), (int, float)):
+                group["tokens"][field] += event[field]
+
+    report = {}
+    for name, group in sorted(groups.items()):
+        turns = group["events"].get("turn", 0)
+        report[name] = {
+            "events": dict(group["events"]),
+            "chats": len(group["chats"]),
+            "json_outcomes": dict(group["json_outcomes"]),
+            "fallback": group["fallback"],
+            "fallback_rate": round(group["fallback"] / turns, 4) if turns else None,
+            "fallback_model": group["fallback_model"],
+            "errors": group["errors"],
+            "latency_ms": {
+                field: {
+                    "count": len(values),
+                    "p50": percentile(values, 50),
+                    "p95": percentile(values, 95),
+                    "p99": percentile(values, 99),
+                    "max": max(values),
+                }
+                for field, values in group["latencies"].items()
+            },
+            "tokens": dict(group["tokens"]),
+        }
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Filtri e statistiche sugli eventi JSONL delle chat")
+    parser.add_argument("--logs-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                           "..", "..", "web_api", "logs"))
+    parser.add_argument("--from", dest="date_from", help="Primo giorno (YYYYMMDD o YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="Ultimo giorno (YYYYMMDD o YYYY-MM-DD)")
+    parser.add_argument("--event", help="Tipo di evento (message, turn, stt, error)")
+    parser.add_argument("--chat-id")
+    parser.add_argument("--role")
+    parser.add_argument("--personality")
+    parser.add_argument("--model")
+    parser.add_argument("--outcome", help="Esito del parsing JSON (parsed, local_repair, reask, fallback)")
+    parser.add_argument("--fallback", action="store_true", help="Solo i turni con risposta di fallback")
+    parser.add_argument("--contains", help="Testo contenuto nella riga")
+    parser.add_argument("--min-ms", type=float, help="Latenza totale minima (total_ms o stt_ms)")
+    parser.add_argument("--limit", type=int, help="Numero massimo di eventi stampati")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--count", action="store_true", help="Stampa solo il numero di eventi")
+    mode.add_argument("--stats", action="store_true", help="Stampa le statistiche aggregate")
+    parser.add_argument("--group-by", help="Campo di raggruppamento per --stats (es. model, personality)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    filters = {}
+    for field, value in (("event", args.event), ("chat_id", args.chat_id), ("role", args.role),
+                         ("personality", args.personality), ("model", args.model),
+                         ("json_outcome", args.outcome)):
+        if value is not None:
+            filters[field] = value
+    if args.fallback:
+        filters["fallback"] = True
+
+    paths = list_event_files(args.logs_dir, args.date_from, args.date_to)
+    events = iter_events(paths, filters, args.contains)
+    if args.min_ms is not None:
+        events = (e for e in events if (e.get("total_ms") or e.get("stt_ms") or 0) >= args.min_ms)
+
+    if args.stats:
+        print(json.dumps(aggregate(events, args.group_by), indent=4, ensure_ascii=False))
+    elif args.count:
+        print(sum(1 for _ in events))
+    else:
+        for index, event in enumerate(events):
+            if args.limit is not None and index >= args.limit:
+                break
+            print(json.dumps(event, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+File:	/tests/utils/test_admission.py
+-----
+Test controllo di ammissione
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:15:26 am
+-----
+Last Modified: 	October 19th 2026 4:40:54 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import threading
+import time
+
+# Aggiunge la root del progetto al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+# admission importa i moduli come utils.* (come l'app avviata da web_api)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'web_api')))
+
+from web_api.utils.admission import AdmissionController, AdmissionRejected
+
+
+def hold(controller, release, started):
+    """Occupa un posto del budget finché release non viene impostato"""
+    with controller.admit():
+        started.set()
+        release.wait(5)
+
+
+def start_holder(controller):
+    release, started = threading.Event(), threading.Event()
+    thread = threading.Thread(target=hold, args=(controller, release, started))
+    thread.start()
+    assert started.wait(5)
+    return release, thread
+
+
+def test_admits_under_limit():
+    controller = AdmissionController("llm", max_concurrent=2)
+    with controller.admit() as waited:
+        assert waited == 0.0
+        assert controller.get_stats()["in_flight"] == 1
+    stats = controller.get_stats()
+    assert stats["admitted"] == 1 and stats["completed"] == 1 and stats["in_flight"] == 0
+
+    print("Test 1 completato con successo: richiesta ammessa sotto il limite.")
+
+
+def test_queued_request_runs_when_slot_frees():
+    controller = AdmissionController("llm", max_concurrent=1, max_wait=5, initial_service_time=0.1)
+    release, holder = start_holder(controller)
+
+    result = {}
+
+    def waiter():
+        with controller.admit() as waited:
+            result["waited"] = waited
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    time.sleep(0.1)
+    assert controller.get_stats()["waiting"] == 1
+    release.set()
+    thread.join(5)
+    holder.join(5)
+
+    assert result["waited"] > 0
+    stats = controller.get_stats()
+    assert stats["queued"] == 1 and stats["admitted"] == 2 and stats["queue_wait_p95_ms"] > 0
+
+    print("Test 2 completato con successo: richiesta in coda eseguita appena si libera un posto.")
+
+
+def test_shed_on_predicted_wait_and_full_queue():
+    # Durata media 10s con un solo posto: l'attesa prevista supera subito max_wait
+    controller = AdmissionController("llm", max_concurrent=1, max_wait=2, initial_service_time=10)
+    release, holder = start_holder(controller)
+    try:
+        with controller.admit():
+            assert False, "La richiesta doveva essere rifiutata"
+    except AdmissionRejected as e:
+        assert e.budget == "llm" and e.reason == "predicted_wait" and e.retry_after == 10
+    release.set()
+    holder.join(5)
+
+    controller = AdmissionController("stt", max_concurrent=1, max_queue=0)
+    release, holder = start_holder(controller)
+    try:
+        with controller.admit():
+            assert False, "La richiesta doveva essere rifiutata"
+    except AdmissionRejected as e:
+        assert e.reason == "queue_full"
+    release.set()
+    holder.join(5)
+
+    assert controller.get_stats()["shed"] == {"queue_full": 1, "predicted_wait": 0, "timeout": 0}
+
+    print("Test 3 completato con successo: rifiuto immediato per attesa prevista e coda piena.")
+
+
+def test_shed_on_queue_deadline():
+    # Attesa prevista accettabile, ma il posto non si libera entro max_wait
+    controller = AdmissionController("llm", max_concurrent=1, max_wait=0.2, initial_service_time=0.05)
+    release, holder = start_holder(controller)
+    start = time.monotonic()
+    try:
+        with controller.admit():
+            assert False, "La richiesta doveva scadere in coda"
+    except AdmissionRejected as e:
+        assert e.reason == "timeout"
+    assert time.monotonic() - start < 1
+    assert controller.get_stats()["waiting"] == 0
+    release.set()
+    holder.join(5)
+
+    # Scaduta la richiesta in coda, il budget torna disponibile
+    with controller.admit():
+        pass
+
+    print("Test 4 completato con successo: richiesta scaduta in coda rifiutata.")
+
+
+def test_service_time_average_and_unlimited():
+    controller = AdmissionController("llm", max_concurrent=0, initial_service_time=1.0, smoothing=0.5)
+    for _ in range(3):
+        with controller.admit():
+            pass
+    # Senza limite nessuna attesa; la durata media converge verso le durate reali
+    assert controller.predicted_wait() == 0.0
+    assert controller.get_stats()["avg_service_ms"] < 200
+
+    print("Test 5 completato con successo: media delle durate e budget senza limite.")
+
+
+def queue_order(controller, requests):
+    """Accoda requests (robot_id) su un budget da un posto occupato e restituisce l'ordine di esecuzione"""
+    release, holder = start_holder(controller)
+    order, lock, threads = [], threading.Lock(), []
+
+    def worker(robot_id):
+        with controller.admit(robot_id):
+            with lock:
+                order.append(robot_id)
+
+    for robot_id in requests:
+        thread = threading.Thread(target=worker, args=(robot_id,))
+        thread.start()
+        threads.append(thread)
+        # Arrivo ordinato: ogni richiesta è in coda prima della successiva
+        while controller.get_stats()["waiting"] < len(threads):
+            time.sleep(0.005)
+    release.set()
+    for thread in threads + [holder]:
+        thread.join(5)
+    return order
+
+
+def test_fair_share_between_robots():
+    controller = AdmissionController("llm", max_concurrent=1, max_wait=5, initial_service_time=0.01)
+    # Il robot demo accoda 4 richieste prima che arrivi quella del robot di terapia
+    order = queue_order(controller, ["demo", "demo", "demo", "demo", "terapia"])
+
+    # La richiesta di terapia non attende tutte quelle del robot demo
+    assert order.index("terapia") <= 1
+    stats = controller.get_stats()["robots"]
+    assert stats["demo"]["admitted"] == 4 and stats["terapia"]["admitted"] == 1
+    assert stats["terapia"]["queue_wait_p95_ms"] is not None
+
+    print("Test 6 completato con successo: un robot molto attivo non monopolizza la coda.")
+
+
+def test_priority_classes_and_queue_eviction():
+    controller = AdmissionController(
+        "llm", max_concurrent=1, max_wait=5, initial_service_time=0.01,
+        robot_classes={"terapia": "high", "demo": "low"},
+    )
+    # Peso 4 contro 1: le richieste di terapia passano avanti a quelle demo già in coda
+    order = queue_order(controller, ["demo", "demo", "terapia", "terapia"])
+    assert order[:2] == ["terapia", "terapia"]
+    assert controller.get_stats()["robots"]["terapia"]["class"] == "high"
+
+    # Con la coda piena viene espulsa la richiesta con il tag maggiore (robot a bassa priorità)
+    controller = AdmissionController(
+        "llm", max_concurrent=1, max_queue=1, max_wait=5, initial_service_time=0.01,
+        robot_classes={"terapia": "high", "demo": "low"},
+    )
+    release, holder = start_holder(controller)
+    outcomes = {}
+
+    def worker(robot_id):
+        try:
+            with controller.admit(robot_id):
+                outcomes[robot_id] = "admitted"
+        except AdmissionRejected as e:
+            outcomes[robot_id] = e.reason
+
+    demo = threading.Thread(target=worker, args=("demo",))
+    demo.start()
+    while controller.get_stats()["waiting"] < 1:
+        time.sleep(0.005)
+    terapia = threading.Thread(target=worker, args=("terapia",))
+    terapia.start()
+    demo.join(5)
+    release.set()
+    for thread in (terapia, holder):
+        thread.join(5)
+
+    assert outcomes == {"demo": "queue_full", "terapia": "admitted"}
+    assert controller.get_stats()["robots"]["demo"]["shed"] == 1
+
+    print("Test 7 completato con successo: classi di priorità ed espulsione dalla coda piena.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test controllo di ammissione...")
+    test_admits_under_limit()
+    test_queued_request_runs_when_slot_frees()
+    test_shed_on_predicted_wait_and_full_queue()
+    test_shed_on_queue_deadline()
+    test_service_time_average_and_unlimited()
+    test_fair_share_between_robots()
+    test_priority_classes_and_queue_eviction()
+    print("Tutti i test completati con successo!")
@@ -0,0 +1,133 @@
+"""
+File:	/tests/utils/test_bench_load.py
+-----
+Test server LLM finto e report del benchmark di carico
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:02:48 am
+-----
+Last Modified: 	October 19th 2026 4:02:48 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import json
+import urllib.request
+
+# Aggiunge la root del progetto e tests/bench al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'bench')))
+
+from stub_llm_server import StubConfig, StubLLMServer
+from report import build_report, compare
+
+
+def _completion(server, max_tokens=None):
+    payload = {"model": "gpt-stub", "messages": [{"role": "user", "content": "Ciao NAO"}]}
+    if max_tokens:
+        payload["max_tokens"] = max_tokens
+    request = urllib.request.Request(
+        server.url + "/chat/completions",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return json.load(response)
+
+
+def test_stub_returns_robot_json():
+    config = StubConfig(latency_ms=0, jitter_ms=0, movements=["NAO/Emotions/Positive/Happy_1"], seed=1)
+    server = StubLLMServer(config).start()
+    try:
+        response = _completion(server)
+    finally:
+        server.stop()
+
+    content = json.loads(response["choices"][0]["message"]["content"])
+    assert content["action"] == "NO_ACTION"
+    assert content["chunks"] and content["chunks"][0]["movements"] == ["NAO/Emotions/Positive/Happy_1"]
+    assert response["usage"]["total_tokens"] > 0
+    assert config.stats["requests"] == 1
+
+    print("Test 1 completato con successo: risposta compatibile OpenAI con il JSON del robot.")
+
+
+def test_stub_malformed_rate():
+    config = StubConfig(latency_ms=0, jitter_ms=0, malformed_rate=1.0, seed=2)
+    server = StubLLMServer(config).start()
+    try:
+        contents = [_completion(server)["choices"][0]["message"]["content"] for _ in range(5)]
+    finally:
+        server.stop()
+
+    for content in contents:
+        try:
+            json.loads(content)
+            assert False, "Con malformed_rate=1 nessuna risposta deve essere JSON valido"
+        except ValueError:
+            pass
+    assert config.stats["malformed"] == 5
+
+    print("Test 2 completato con successo: percentuale di JSON malformato rispettata.")
+
+
+def _sample(route, client_ms, ok=True, timing=None, stage=None):
+    return {"route": route, "status": 200 if ok else 503, "ok": ok, "client_ms": client_ms,
+            "timing": timing or {}, "error_stage": stage}
+
+
+def test_report_percentiles_per_stage():
+    samples = [_sample("/chat", ms, timing={"llm_ms": ms - 5, "total_ms": ms - 2}) for ms in range(10, 110)]
+    samples.append(_sample("/chat/voice", 900, ok=False, stage="warmup"))
+
+    report = build_report(samples, wall_seconds=10.0)
+
+    assert report["requests"] == 101
+    assert report["errors"] == 1
+    assert report["throughput_rps"] == 10.0
+    chat = report["routes"]["/chat"]["stages"]
+    assert chat["client_ms"]["p50"] == 60
+    assert chat["llm_ms"]["p99"] == 103
+    assert report["routes"]["/chat/voice"]["error_stages"] == {"warmup": 1}
+
+    print("Test 3 completato con successo: percentili per rotta e per fase.")
+
+
+def test_compare_detects_regressions():
+    baseline = build_report([_sample("/chat", ms) for ms in range(100, 200)], wall_seconds=10.0)
+    same = build_report([_sample("/chat", ms) for ms in range(100, 200)], wall_seconds=10.0)
+    slower = build_report([_sample("/chat", ms * 2) for ms in range(100, 200)], wall_seconds=20.0)
+
+    assert compare(same, baseline) == []
+    regressions = compare(slower, baseline)
+    assert any("throughput" in r for r in regressions)
+    assert any("client_ms p95" in r for r in regressions)
+
+    print("Test 4 completato con successo: regressioni rispetto alla baseline.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test benchmark di carico...")
+    test_stub_returns_robot_json()
+    test_stub_malformed_rate()
+    test_report_percentiles_per_stage()
+    test_compare_detects_regressions()
+    print("Tutti i test completati con successo!")
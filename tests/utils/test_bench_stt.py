@@ -0,0 +1,99 @@
+"""
+File:	/tests/utils/test_bench_stt.py
+-----
+Test metriche del benchmark STT (WER, combinazioni, confronto con baseline)
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:04:25 am
+-----
+Last Modified: 	October 19th 2026 4:04:25 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+
+# Aggiunge tests/bench al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'bench')))
+
+from bench_stt import word_errors, normalize_words, build_configs, summarize, compare, load_manifest
+
+
+def test_word_errors():
+    assert word_errors("ciao nao come stai", "ciao nao come stai") == (0, 4)
+    # Una sostituzione e una cancellazione
+    assert word_errors("ciao nao come stai", "ciao mao come") == (2, 4)
+    # Maiuscole, punteggiatura e apostrofi non contano
+    assert word_errors("Bevi un bicchiere d'acqua!", "bevi un bicchiere d acqua") == (0, 5)
+    assert normalize_words("Perché è così?") == ["perché", "è", "così"]
+
+    print("Test 1 completato con successo: WER a livello di parola.")
+
+
+def test_build_configs():
+    configs = build_configs(["wav", "ogg"], [False, True], [2000, 4000])
+
+    # Lo Smart Trim non esiste nel percorso WAV standard
+    assert len(configs) == 2 + 4
+    assert not any(c["path"] == "wav" and c["trim"] for c in configs)
+
+    print("Test 2 completato con successo: combinazioni di percorso, trim e blocco.")
+
+
+def _raw(total_ms, errors, peak_rss=900.0):
+    samples = [{"clip": f"c{i}", "audio_s": 2.0, "total_ms": total_ms, "audio_prep_ms": 20,
+                "stt_ms": total_ms - 20, "errors": errors, "ref_words": 5, "success": True} for i in range(10)]
+    return {"load_s": 3.0, "rss_after_load_mb": 800.0, "peak_rss_mb": peak_rss, "samples": samples}
+
+
+def test_summarize_and_compare():
+    config = {"path": "ogg", "trim": True, "block_size": 4000}
+    baseline = summarize(config, _raw(400, 0))
+
+    assert baseline["rtf"] == 0.2
+    assert baseline["wer"] == 0.0
+    assert baseline["stages"]["stt_ms"]["p95"] == 380
+
+    assert compare([summarize(config, _raw(410, 0))], {"results": [baseline]}) == []
+    regressions = compare([summarize(config, _raw(800, 1, peak_rss=1200.0))], {"results": [baseline]})
+    assert any("RTF" in r for r in regressions)
+    assert any("WER" in r for r in regressions)
+    assert any("RSS" in r for r in regressions)
+
+    print("Test 3 completato con successo: RTF, WER e regressioni rispetto alla baseline.")
+
+
+def test_manifest_is_valid():
+    manifest = load_manifest()
+    ids = [clip["id"] for clip in manifest["clips"]]
+
+    assert len(ids) == len(set(ids))
+    assert all(clip["text"] and clip["wav"] for clip in manifest["clips"])
+
+    print("Test 4 completato con successo: manifest del corpus valido.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test benchmark STT...")
+    test_word_errors()
+    test_build_configs()
+    test_summarize_and_compare()
+    test_manifest_is_valid()
+    print("Tutti i test completati con successo!")
@@ -0,0 +1,393 @@
+"""
+File:	/tests/utils/test_chat_app.py
+-----
+Test delle rotte Flask con LiteLLM finto
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:35:07 am
+-----
+Last Modified: 	October 19th 2026 4:55:25 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+
+import sys
+import os
+import json
+import gzip
+import tempfile
+import threading
+import time
+import importlib.util
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+WEB_API_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'web_api'))
+# L'app richiede Flask e ai_prompts/technical_prompt.py (vedi README, configurazione)
+APP_AVAILABLE = (
+    importlib.util.find_spec("flask") is not None
+    and importlib.util.find_spec("flask_cors") is not None
+    and os.path.exists(os.path.join(WEB_API_DIR, "ai_prompts", "technical_prompt.py"))
+)
+
+ADMIN_TOKEN = "token-test"
+
+BASE_ENV = {
+    "LLM_MODEL": "gemini/test",
+    "LLM_FALLBACK_MODELS": "",
+    "GOOGLE_API_KEY": "test-key",
+    "LLM_HTTP_POOL": "false",
+    "SESSION_SNAPSHOT": "false",
+    "ADMIN_TOKEN": ADMIN_TOKEN,
+    "READY_REQUIRED": "llm",
+    "WARMUP_WAIT_TIMEOUT": "5",
+}
+
+
+class FakeLiteLLM:
+    """
+    LiteLLM finto: ogni completion restituisce una risposta a chunk numerata.
+    Con release non impostato le chiamate restano in attesa (turni lenti)
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self._lock = threading.Lock()
+
+    def supports_response_schema(self, model):
+        return True
+
+    def completion(self, model, messages, **kwargs):
+        with self._lock:
+            self.calls += 1
+            number = self.calls
+        self.entered.set()
+        self.release.wait(5)
+        content = json.dumps({
+            "action": "NO_ACTION",
+            "chunks": [{"text": f"Risposta {number}", "movements": []}],
+        })
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15),
+        )
+
+
+@contextmanager
+def patched_env(values):
+    saved = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+@contextmanager
+def chat_app(fake, **env):
+    """
+    App Flask (create_app) con LiteLLM finto; log e file di sessione in una directory temporanea
+    Yields:
+        tuple: (client di test Flask, istanza di LLMChatAPI)
+    """
+    cwd = os.getcwd()
+    sys.path.insert(0, WEB_API_DIR)
+    with tempfile.TemporaryDirectory() as work_dir, patched_env(BASE_ENV):
+        os.chdir(work_dir)
+        try:
+            from utils import llm_chat_api
+            llm_chat_api._litellm = fake
+            # Il primo import di main crea anche l'app di modulo (con l'ambiente di base)
+            import main
+            with patched_env(env):
+                app = main.create_app()
+                chat_api = app.extensions["chat_api"]
+                try:
+                    assert app.extensions["warmup"].wait("llm", 5)
+                    yield app.test_client(), chat_api
+                finally:
+                    if chat_api.snapshot:
+                        chat_api.snapshot.close()
+                    chat_api.logger.close()
+        finally:
+            os.chdir(cwd)
+            sys.path.remove(WEB_API_DIR)
+
+
+def app_warmup(client):
+    return client.application.extensions["warmup"]
+
+
+def talk(client, message, chat_id=None, **fields):
+    response = client.post("/chat", json={"action": "talk", "message": message, "chat_id": chat_id, **fields})
+    return response.status_code, response.get_json()
+
+
+def admin(client, action, **fields):
+    response = client.post(f"/admin?token={ADMIN_TOKEN}", json={"action": action, **fields})
+    return response.status_code, response.get_json()
+
+
+def test_concurrent_turns_on_same_chat():
+    if not APP_AVAILABLE:
+        print("Test 1 saltato: Flask o ai_prompts/technical_prompt.py non disponibili.")
+        return
+    fake = FakeLiteLLM()
+    with chat_app(fake, CHAT_BUSY_POLICY="reject") as (client, _):
+        status, first = talk(client, "Ciao NAO")
+        assert status == 200 and first["response"]["chunks"][0]["text"] == "Risposta 1"
+        chat_id = first["chat_id"]
+
+        # Turno lento in corso: il secondo turno sulla stessa chat viene rifiutato
+        fake.release.clear()
+        fake.entered.clear()
+        results = []
+        slow = threading.Thread(target=lambda: results.append(talk(client, "Come stai?", chat_id)))
+        slow.start()
+        assert fake.entered.wait(5)
+        status, busy = talk(client, "Ci sei?", chat_id)
+        assert status == 409 and busy["stage"] == "busy"
+
+        # Un'altra chat non è bloccata dal lock
+        other = threading.Thread(target=lambda: results.append(talk(client, "Nuova chat")))
+        other.start()
+        fake.release.set()
+        slow.join(5)
+        other.join(5)
+        assert sorted(status for status, _ in results) == [200, 200]
+
+        status, history = admin(client, "history", chat_id=chat_id)
+        assert [m["role"] for m in history["history"]] == ["user", "assistant", "user", "assistant"]
+
+    print("Test 1 completato con successo: turni concorrenti sulla stessa chat rifiutati con 409.")
+
+
+def test_concurrent_turns_are_serialized():
+    if not APP_AVAILABLE:
+        print("Test 2 saltato: Flask o ai_prompts/technical_prompt.py non disponibili.")
+        return
+    fake = FakeLiteLLM()
+    with chat_app(fake, CHAT_BUSY_POLICY="wait") as (client, _):
+        _, first = talk(client, "Ciao NAO")
+        chat_id = first["chat_id"]
+
+        fake.release.clear()
+        fake.entered.clear()
+        results = []
+        threads = [
+            threading.Thread(target=lambda text=text: results.append(talk(client, text, chat_id)))
+            for text in ("primo", "secondo")
+        ]
+        for thread in threads:
+            thread.start()
+        assert fake.entered.wait(5)
+        time.sleep(0.2)
+        # Un solo turno alla volta arriva al modello: l'altro attende il lock della chat
+        assert fake.calls == 2
+        fake.release.set()
+        for thread in threads:
+            thread.join(5)
+
+        # Con wait i turni vengono serializzati: domande e risposte non si alternano male
+        assert [status for status, _ in results] == [200, 200]
+        _, history = admin(client, "history", chat_id=chat_id)
+        assert [m["role"] for m in history["history"]] == ["user", "assistant"] * 3
+
+    print("Test 2 completato con successo: turni concorrenti serializzati dal lock della chat.")
+
+
+def test_list_chats_pagination():
+    if not APP_AVAILABLE:
+        print("Test 3 saltato: Flask o ai_prompts/technical_prompt.py non disponibili.")
+        return
+    fake = FakeLiteLLM()
+    with chat_app(fake) as (client, _):
+        chat_ids = [talk(client, f"Ciao {i}")[1]["chat_id"] for i in range(3)]
+
+        status, page = admin(client, "list-chats", limit=2)
+        assert status == 200 and page["total_chats"] == 3
+        assert [c["chat_id"] for c in page["chats"]] == chat_ids[:2]
+        assert page["chats"][0]["messages"] == 2
+
+        _, last = admin(client, "list-chats", limit=2, cursor=page["next_cursor"])
+        assert [c["chat_id"] for c in last["chats"]] == chat_ids[2:]
+        assert last["next_cursor"] is None
+
+    print("Test 3 completato con successo: list-chats paginata con cursore.")
+
+
+def test_retry_deduplicated_per_robot():
+    if not APP_AVAILABLE:
+        print("Test 4 saltato: Flask o ai_prompts/technical_prompt.py non disponibili.")
+        return
+    fake = FakeLiteLLM()
+    with chat_app(fake) as (client, _):
+        status, first = talk(client, "Ciao NAO", request_id="req-1", robot_id="nao-1")
+        status_retry, retry = talk(client, "Ciao NAO", request_id="req-1", robot_id="nao-1")
+
+        # Il retry riceve la stessa risposta senza una nuova chiamata al modello
+        assert status == status_retry == 200
+        assert retry["replayed"] is True and retry["chat_id"] == first["chat_id"]
+        assert fake.calls == 1
+
+        # Un altro robot che riusa lo stesso request_id per una nuova chat ha la sua risposta
+        _, other = talk(client, "Ciao NAO", request_id="req-1", robot_id="nao-2")
+        assert "replayed" not in other and other["chat_id"] != first["chat_id"]
+        assert fake.calls == 2
+
+        _, history = admin(client, "history", chat_id=first["chat_id"])
+        assert len(history["history"]) == 2
+
+    print("Test 4 completato con successo: retry deduplicati per robot e request_id.")
+
+
+def test_sessions_restored_after_restart():
+    if not APP_AVAILABLE:
+        print("Test 5 saltato: Flask o ai_prompts/technical_prompt.py non disponibili.")
+        return
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        env = {"SESSION_SNAPSHOT": "true", "SESSION_SNAPSHOT_DIR": snapshot_dir}
+        with chat_app(FakeLiteLLM(), **env) as (client, chat_api):
+            _, first = talk(client, "Parliamo di astronomia")
+            chat_id = first["chat_id"]
+            talk(client, "Quanto dista la luna?", chat_id)
+            journal = chat_api.snapshot.journal_path
+
+        # Un journal per worker, con il nome dello shard dei chat_id
+        assert os.path.basename(journal) == f"sessions_{chat_id.split('-')[0]}.jsonl"
+
+        with chat_app(FakeLiteLLM(), **env) as (client, chat_api):
+            # Indicizzazione in background senza caricare le cronologie
+            assert app_warmup(client).wait("search", 5)
+            assert chat_api.snapshot.get_stats()["lazy_loads"] == 0
+            assert not chat_api.active_chats[chat_id].loaded
+
+            # La ricerca trova la chat ripristinata; lo snippet legge solo la cronologia del risultato
+            status, found = admin(client, "search", query="luna")
+            assert status == 200 and [r["chat_id"] for r in found["results"]] == [chat_id]
+            assert found["results"][0]["message_index"] == 2
+            assert found["results"][0]["snippet"] == "Quanto dista la luna?"
+            assert chat_api.snapshot.get_stats()["lazy_loads"] == 1
+
+            _, history = admin(client, "history", chat_id=chat_id)
+            assert [m["content"] for m in history["history"] if m["role"] == "user"] == [
+                "Parliamo di astronomia", "Quanto dista la luna?"
+            ]
+
+            # La chat ripristinata continua con lo stesso chat_id
+            status, reply = talk(client, "E il sole?", chat_id)
+            assert status == 200 and reply["chat_id"] == chat_id
+            _, history = admin(client, "history", chat_id=chat_id)
+            assert len(history["history"]) == 6
+
+    print("Test 5 completato con successo: sessioni e indice di ricerca ripristinati al riavvio.")
+
+
+def test_overload_is_shed_with_503():
+    if not APP_AVAILABLE:
+        print("Test 6 saltato: Flask o ai_prompts/technical_prompt.py non disponibili.")
+        return
+    fake = FakeLiteLLM()
+    with chat_app(fake, ADMISSION_LLM_CONCURRENCY="1", ADMISSION_LLM_QUEUE="0") as (client, _):
+        # Un turno lento occupa l'unico posto del budget LLM
+        fake.release.clear()
+        results = []
+        slow = threading.Thread(target=lambda: results.append(talk(client, "Ciao NAO")))
+        slow.start()
+        assert fake.entered.wait(5)
+
+        fields = {"action": "talk", "message": "Ci sei?", "request_id": "req-1", "robot_id": "nao-1"}
+        response = client.post("/chat", json=fields)
+        shed = response.get_json()
+        assert response.status_code == 503 and int(response.headers["Retry-After"]) >= 1
+        assert shed["shed"] is True and shed["budget"] == "llm"
+        assert shed["response"]["chunks"][0]["text"]
+
+        fake.release.set()
+        slow.join(5)
+        assert results[0][0] == 200
+
+        # La risposta rifiutata non viene riproposta al retry con lo stesso request_id
+        response = client.post("/chat", json=fields)
+        assert response.status_code == 200 and "replayed" not in response.get_json()
+        assert fake.calls == 2
+
+    print("Test 6 completato con successo: sovraccarico rifiutato con 503 e Retry-After.")
+
+
+def test_response_encoding_hook():
+    if not APP_AVAILABLE:
+        print("Test 7 saltato: Flask o ai_prompts/technical_prompt.py non disponibili.")
+        return
+    fake = FakeLiteLLM()
+    with chat_app(fake, RESPONSE_COMPRESS_MIN_BYTES="200") as (client, _):
+        status, first = talk(client, "Ciao NAO, raccontami una storia lunga " * 10)
+        assert status == 200
+        chat_id = first["chat_id"]
+
+        # Turno piccolo: nessuna compressione anche se il client la accetta
+        response = client.post("/chat", json={"action": "talk", "message": "ok", "chat_id": chat_id},
+                               headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200 and "Content-Encoding" not in response.headers
+
+        # Cronologia oltre la soglia: compressa con gzip
+        response = client.post(f"/admin?token={ADMIN_TOKEN}", json={"action": "history", "chat_id": chat_id},
+                               headers={"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        history = json.loads(gzip.decompress(response.get_data()))
+        assert len(history["history"]) == 4
+
+        response_encoding = sys.modules["utils.response_encoding"]
+        if response_encoding.msgpack is None:
+            print("Test 7 completato con successo: compressione gzip (msgpack non installato).")
+            return
+
+        # MessagePack solo se preferito a JSON
+        response = client.post("/chat", json={"action": "talk", "message": "ancora", "chat_id": chat_id},
+                               headers={"Accept": "application/msgpack, application/json;q=0.5"})
+        assert response.mimetype == "application/msgpack"
+        reply = response_encoding.msgpack.unpackb(response.get_data(), raw=False)
+        assert reply["chat_id"] == chat_id and reply["response"]["chunks"][0]["text"] == "Risposta 3"
+
+        response = client.post("/chat", json={"action": "talk", "message": "json", "chat_id": chat_id},
+                               headers={"Accept": "application/json, application/msgpack;q=0.5"})
+        assert response.mimetype == "application/json" and response.get_json()["chat_id"] == chat_id
+
+    print("Test 7 completato con successo: compressione e MessagePack negoziati dall'app.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test rotte Flask...")
+    test_concurrent_turns_on_same_chat()
+    test_concurrent_turns_are_serialized()
+    test_list_chats_pagination()
+    test_retry_deduplicated_per_robot()
+    test_sessions_restored_after_restart()
+    test_overload_is_shed_with_503()
+    test_response_encoding_hook()
+    print("Tutti i test completati con successo!")
@@ -0,0 +1,157 @@
+"""
+File:	/tests/utils/test_chat_history.py
+-----
+Test cronologia compatta delle chat
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:09:50 am
+-----
+Last Modified: 	October 19th 2026 4:56:58 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import json
+import threading
+import time
+
+# Aggiunge la root del progetto al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from web_api.utils.chat_history import ChatHistory, Message, ROLES
+
+RESPONSE = {
+    "action": "NO_ACTION",
+    "chunks": [{"text": "Ciao! Che bello vederti, oggi è una giornata splendida.", "movements": ["NAO/Gestures/Hey_1"]}] * 6,
+}
+
+
+def test_assistant_json_is_minified():
+    history = ChatHistory()
+    history.append("user", "Ciao NAO")
+    message = history.append("assistant", RESPONSE)
+
+    assert message["content"] == json.dumps(RESPONSE, ensure_ascii=False, separators=(",", ":"))
+    assert json.loads(history[-1]["content"]) == RESPONSE
+    assert history.to_list() == [{"role": "user", "content": "Ciao NAO"}, message]
+
+    print("Test 1 completato con successo: risposta salvata come JSON minificato.")
+
+
+def test_compression_is_transparent():
+    history = ChatHistory(compress_min_bytes=64)
+    message = history.append("assistant", RESPONSE)
+    history.append("user", "Ciao")
+
+    # Il contenuto lungo è compresso in memoria ma restituito identico
+    assert isinstance(history._messages[0]._content, bytes)
+    assert history._messages[0].stored_size < len(message["content"].encode("utf-8"))
+    assert isinstance(history._messages[1]._content, str)
+    assert history[0] == message
+
+    print("Test 2 completato con successo: compressione trasparente dei contenuti lunghi.")
+
+
+def test_provider_messages_and_list_api():
+    history = ChatHistory([{"role": "user", "content": f"messaggio {i}"} for i in range(30)])
+
+    assert len(history) == 30
+    last = history.provider_messages(20)
+    assert len(last) == 20 and last[0]["content"] == "messaggio 10"
+    assert history[-2:] == [{"role": "user", "content": "messaggio 28"}, {"role": "user", "content": "messaggio 29"}]
+    assert [m["content"] for m in history][:2] == ["messaggio 0", "messaggio 1"]
+
+    print("Test 3 completato con successo: ultimi messaggi per il provider e accesso come lista.")
+
+
+def test_roles_are_interned_and_validated():
+    a, b = Message("user", "uno"), Message("".join(["us", "er"]), "due")
+    assert a.role is b.role and a.role in ROLES
+    assert not hasattr(a, "__dict__")
+    try:
+        Message("robot", "ciao")
+        assert False, "Ruolo non valido accettato"
+    except ValueError:
+        pass
+
+    print("Test 4 completato con successo: ruoli internati e validati, record con __slots__.")
+
+
+def test_parsed_list_for_history_routes():
+    history = ChatHistory(compress_min_bytes=64)
+    history.append("user", '{"non": "decodificare"}')
+    history.append("assistant", RESPONSE)
+    history.append("assistant", "Testo non JSON (fallback)")
+
+    parsed = history.to_list(parsed=True)
+    # Solo le risposte JSON del modello diventano oggetti
+    assert parsed[0]["content"] == '{"non": "decodificare"}'
+    assert parsed[1]["content"] == RESPONSE
+    assert parsed[2]["content"] == "Testo non JSON (fallback)"
+    # Il formato del provider resta testuale
+    assert isinstance(history.to_list()[1]["content"], str)
+
+    print("Test 5 completato con successo: risposte del modello come oggetti nella history.")
+
+
+def test_concurrent_first_access_loads_once():
+    calls = []
+    started = threading.Event()
+
+    def slow_loader():
+        calls.append(threading.current_thread().name)
+        started.set()
+        time.sleep(0.2)
+        return [("user", "Ciao"), ("assistant", '{"action":"NO_ACTION","chunks":[]}')]
+
+    history = ChatHistory(loader=slow_loader, length=2)
+    results = {}
+
+    def read(name):
+        results[name] = history.to_list()
+
+    # /talk carica la cronologia, una rotta admin la legge durante il caricamento
+    talk = threading.Thread(target=read, args=("talk",), name="talk")
+    talk.start()
+    assert started.wait(5)
+    admin = threading.Thread(target=read, args=("admin",), name="admin")
+    admin.start()
+    talk.join(5)
+    admin.join(5)
+
+    # Il loader viene chiamato una volta e nessuno vede la cronologia a metà
+    assert calls == ["talk"]
+    assert results["talk"] == results["admin"]
+    assert [m["role"] for m in results["admin"]] == ["user", "assistant"]
+    assert history.loaded and len(history) == 2
+
+    print("Test 6 completato con successo: primo accesso concorrente alla cronologia ripristinata.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test cronologia compatta...")
+    test_assistant_json_is_minified()
+    test_compression_is_transparent()
+    test_provider_messages_and_list_api()
+    test_roles_are_interned_and_validated()
+    test_parsed_list_for_history_routes()
+    test_concurrent_first_access_loads_once()
+    print("Tutti i test completati con successo!")
@@ -0,0 +1,130 @@
+"""
+File:	/tests/utils/test_chat_id.py
+-----
+Test generatore dei chat_id
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:08:07 am
+-----
+Last Modified: 	October 19th 2026 4:37:08 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import re
+import threading
+
+# Aggiunge la root del progetto al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from web_api.utils.chat_id import ChatIdGenerator, parse_shard, worker_shard
+
+
+class FrozenClock:
+    """Orologio fermo: tutti gli id vengono generati nello stesso millisecondo"""
+    def __init__(self, now=1760900000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_format_and_shard():
+    generator = ChatIdGenerator("w1")
+    chat_id = generator.new_id()
+
+    assert re.match(r"^w1-[0-9a-z]{15}$", chat_id)
+    assert parse_shard(chat_id) == "w1"
+    # Gli id nel vecchio formato numerico non hanno shard
+    assert parse_shard("140234567890") is None
+
+    print("Test 1 completato con successo: formato URL-safe con prefisso dello shard.")
+
+
+def test_ids_are_unique_and_ordered():
+    clock = FrozenClock()
+    generator = ChatIdGenerator("w1", clock=clock)
+
+    ids = [generator.new_id() for _ in range(3000)]
+    clock.now += 0.5
+    ids.append(generator.new_id())
+
+    # Anche oltre 1296 id nello stesso millisecondo restano univoci e crescenti
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+
+    # Orologio tornato indietro: l'ordine non si inverte
+    clock.now -= 10
+    assert generator.new_id() > ids[-1]
+
+    print("Test 2 completato con successo: id univoci e crescenti.")
+
+
+def test_thread_safety():
+    generator = ChatIdGenerator("w2")
+    ids = []
+    lock = threading.Lock()
+
+    def worker():
+        local = [generator.new_id() for _ in range(500)]
+        with lock:
+            ids.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(set(ids)) == 4000
+
+    print("Test 3 completato con successo: nessuna collisione tra thread.")
+
+
+def test_default_and_invalid_shard():
+    assert ChatIdGenerator().shard == worker_shard()
+    assert ChatIdGenerator("W1").shard == "w1"
+    try:
+        ChatIdGenerator("worker_1")
+        assert False, "Shard non valido accettato"
+    except ValueError:
+        pass
+
+    print("Test 4 completato con successo: shard predefinito e validazione.")
+
+
+def test_worker_shard():
+    # Prefisso dell'istanza più indice stabile del worker (WORKER_INDEX da gunicorn.conf.py)
+    assert worker_shard("nao", "2") == "nao2"
+    assert worker_shard("", "0") == "w0"
+    assert ChatIdGenerator(worker_shard("A", "1")).new_id().startswith("a1-")
+
+    print("Test 5 completato con successo: shard stabile per worker.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test generatore chat_id...")
+    test_format_and_shard()
+    test_ids_are_unique_and_ordered()
+    test_thread_safety()
+    test_default_and_invalid_shard()
+    test_worker_shard()
+    print("Tutti i test completati con successo!")
@@ -0,0 +1,171 @@
+"""
+File:	/tests/utils/test_chat_logger.py
+-----
+Test logger asincrono con rotazione dei file
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 3:49:13 am
+-----
+Last Modified: 	October 19th 2026 4:33:58 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import gzip
+import json
+import logging
+import tempfile
+from datetime import datetime
+
+# Aggiunge la root del progetto al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from web_api.utils.chat_logger import ChatLogger, DailyRotatingFileHandler
+
+
+def make_record(message, day):
+    """Crea un record di log con la data indicata (YYYYMMDD)"""
+    record = logging.LogRecord("test", logging.INFO, __file__, 0, message, None, None)
+    record.created = datetime.strptime(day, "%Y%m%d").replace(hour=12).timestamp()
+    return record
+
+
+def test_midnight_rollover_and_compression():
+    with tempfile.TemporaryDirectory() as log_dir:
+        handler = DailyRotatingFileHandler(log_dir)
+        handler.emit(make_record("primo giorno", "20261018"))
+        handler.emit(make_record("secondo giorno", "20261019"))
+        handler.close()
+
+        assert sorted(os.listdir(log_dir)) == ["chat_log_20261018.txt.gz", "chat_log_20261019.txt"]
+        with gzip.open(os.path.join(log_dir, "chat_log_20261018.txt.gz"), "rt", encoding="utf-8") as f:
+            assert f.read().strip() == "primo giorno"
+
+    print("Test 1 completato con successo: rotazione a mezzanotte con compressione.")
+
+
+def test_size_rollover():
+    with tempfile.TemporaryDirectory() as log_dir:
+        handler = DailyRotatingFileHandler(log_dir, max_bytes=100, compress=False)
+        for i in range(10):
+            handler.emit(make_record(f"messaggio {i} " + "x" * 30, "20261019"))
+        handler.close()
+
+        files = sorted(os.listdir(log_dir))
+        assert "chat_log_20261019.txt" in files
+        assert "chat_log_20261019_1.txt" in files
+        for name in files:
+            assert os.path.getsize(os.path.join(log_dir, name)) <= 100 + 50
+
+    print("Test 2 completato con successo: rotazione per dimensione.")
+
+
+def test_retention():
+    with tempfile.TemporaryDirectory() as log_dir:
+        for day in ("20260901", "20261015"):
+            with open(os.path.join(log_dir, f"chat_log_{day}.txt"), "w") as f:
+                f.write("vecchio log\n")
+
+        handler = DailyRotatingFileHandler(log_dir, retention_days=7)
+        handler.emit(make_record("oggi", "20261019"))
+        handler.close()
+
+        assert sorted(os.listdir(log_dir)) == ["chat_log_20261015.txt.gz", "chat_log_20261019.txt"]
+
+    print("Test 3 completato con successo: eliminati i log oltre la retention.")
+
+
+def test_async_chat_logger():
+    with tempfile.TemporaryDirectory() as log_dir:
+        chat_logger = ChatLogger(log_dir)
+        chat_logger.log_chat_message("chat_001", "user", "Ciao NAO")
+        chat_logger.log_error("Errore di connessione")
+        chat_logger.close()
+
+        log_file = os.path.join(log_dir, f"chat_log_{datetime.now().strftime('%Y%m%d')}.txt")
+        with open(log_file, encoding="utf-8") as f:
+            content = f.read()
+        assert "CHAT_ID: chat_001 | ROLE: user | MSG: Ciao NAO" in content
+        assert "ERROR - Errore di connessione" in content
+
+    print("Test 4 completato con successo: log scritti dal thread del listener.")
+
+
+def test_structured_events():
+    with tempfile.TemporaryDirectory() as log_dir:
+        chat_logger = ChatLogger(log_dir)
+        chat_logger.log_chat_message("chat_001", "user", "Ciao NAO")
+        chat_logger.log_event("turn", chat_id="chat_001", llm_ms=1840, fallback=False)
+        chat_logger.close()
+
+        today = datetime.now().strftime('%Y%m%d')
+        with open(os.path.join(log_dir, f"chat_events_{today}.jsonl"), encoding="utf-8") as f:
+            events = [json.loads(line) for line in f]
+        assert [e["event"] for e in events] == ["message", "turn"]
+        assert events[0]["role"] == "user" and events[0]["content"] == "Ciao NAO"
+        assert events[1]["llm_ms"] == 1840
+
+        # Gli eventi non finiscono nel log testuale
+        with open(os.path.join(log_dir, f"chat_log_{today}.txt"), encoding="utf-8") as f:
+            assert '"event"' not in f.read()
+
+    print("Test 5 completato con successo: eventi strutturati nel file JSONL.")
+
+
+def read_all_logs(log_dir):
+    """Righe di tutti i file di log della directory, compressi e non"""
+    lines = []
+    for name in os.listdir(log_dir):
+        path = os.path.join(log_dir, name)
+        opener = gzip.open if name.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            lines.extend(line.strip() for line in f if line.strip())
+    return lines
+
+
+def test_rotation_shared_between_processes():
+    with tempfile.TemporaryDirectory() as log_dir:
+        # Due handler sulla stessa directory simulano due worker gunicorn
+        workers = [DailyRotatingFileHandler(log_dir, max_bytes=120) for _ in range(2)]
+        expected = []
+        for i in range(20):
+            message = f"worker {i % 2} messaggio {i} " + "x" * 20
+            workers[i % 2].emit(make_record(message, "20261019"))
+            expected.append(message)
+        for handler in workers:
+            handler.close()
+
+        # Nessun record scritto in un file ruotato e poi compresso da un altro worker
+        assert sorted(read_all_logs(log_dir)) == sorted(expected)
+        assert any(name.endswith(".gz") for name in os.listdir(log_dir))
+
+    print("Test 6 completato con successo: rotazione condivisa tra processi senza perdita di log.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test logger...")
+    test_midnight_rollover_and_compression()
+    test_size_rollover()
+    test_retention()
+    test_async_chat_logger()
+    test_structured_events()
+    test_rotation_shared_between_processes()
+    print("Tutti i test completati con successo!")
@@ -0,0 +1,142 @@
+"""
+File:	/tests/utils/test_chat_search.py
+-----
+Test indice di ricerca full-text delle chat
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 3:53:27 am
+-----
+Last Modified: 	October 19th 2026 4:55:25 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import time
+import random
+
+# Aggiunge la root del progetto al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from web_api.utils.chat_search import ChatSearchIndex, tokenize
+
+
+MESSAGES = {
+    ("c1", 0): ("user", "Ciao NAO, mi racconti una storia sui dinosauri?"),
+    ("c1", 1): ("assistant", "Certo! I dinosauri vissero milioni di anni fa."),
+    ("c2", 0): ("user", "Che tempo fa oggi a Bari?"),
+    ("c2", 1): ("assistant", "Non posso sapere il meteo, ma a Bari c'è spesso il sole."),
+    ("c3", 0): ("user", "Qual è la città più bella della Puglia? Bari o Lecce?"),
+}
+
+
+def build_index(messages=MESSAGES):
+    # Il testo degli snippet viene letto dalle "cronologie", non dall'indice
+    index = ChatSearchIndex(text_source=lambda chat_id, i: messages.get((chat_id, i), (None, None))[1])
+    for (chat_id, i), (role, text) in messages.items():
+        index.add_message(chat_id, i, role, text)
+    return index
+
+
+def test_ranking_and_snippet():
+    index = build_index()
+
+    results, total = index.search("dinosauri storia")
+    assert total == 2
+    # Il messaggio con entrambi i termini viene prima
+    assert (results[0]["chat_id"], results[0]["message_index"]) == ("c1", 0)
+
+    first = results[0]
+    for start, end in first["highlights"]:
+        assert first["snippet"][start:end].lower() in ("dinosauri", "storia")
+
+    print("Test 1 completato con successo: ranking e snippet.")
+
+
+def test_accents_filters_and_removal():
+    index = build_index()
+
+    # Ricerca senza accenti e maiuscole
+    results, _ = index.search("CITTA")
+    assert [r["chat_id"] for r in results] == ["c3"]
+
+    results, _ = index.search("bari", role="assistant")
+    assert [r["chat_id"] for r in results] == ["c2"]
+
+    index.remove_chat("c2")
+    results, _ = index.search("bari")
+    assert [r["chat_id"] for r in results] == ["c3"]
+
+    # Solo stopword: nessun risultato
+    assert index.search("di che il") == ([], 0)
+
+    print("Test 2 completato con successo: accenti, filtri e rimozione chat.")
+
+
+def test_search_speed():
+    words = ["robot", "scuola", "musica", "calcio", "storia", "pianeta", "gatto", "ricetta", "viaggio", "libro"]
+    rng = random.Random(42)
+    index = ChatSearchIndex()
+    for chat in range(2000):
+        for i in range(10):
+            index.add_message(f"chat{chat}", i, "user", " ".join(rng.choice(words) for _ in range(15)) + f" sessione{chat}")
+
+    start = time.perf_counter()
+    results, _ = index.search("sessione1234 robot")
+    elapsed = time.perf_counter() - start
+
+    assert results[0]["chat_id"] == "chat1234"
+    assert elapsed < 0.5
+
+    print(f"Test 3 completato con successo: ricerca su 20000 messaggi in {elapsed * 1000:.1f} ms.")
+
+
+def test_index_keeps_no_text_copy():
+    messages = dict(MESSAGES)
+    index = build_index(messages)
+    # Per documento solo ruolo e numero di termini
+    assert all(doc == (role, len(tokenize(text))) for doc, (role, text) in zip(index._docs.values(), messages.values()))
+
+    # Un messaggio reindicizzato alla stessa posizione sostituisce il precedente
+    messages[("c1", 0)] = ("user", "Parliamo di pianeti")
+    index.add_message("c1", 0, "user", "Parliamo di pianeti")
+    assert index.search("storia") == ([], 0)
+    results, _ = index.search("pianeti")
+    assert results[0]["snippet"] == "Parliamo di pianeti" and results[0]["highlights"] == [[12, 19]]
+    assert index._chat_docs["c1"] == [0, 1]
+
+    # Chat non più disponibile nella cronologia: risultato senza snippet
+    del messages[("c3", 0)]
+    results, _ = index.search("lecce")
+    assert results[0]["chat_id"] == "c3" and results[0]["snippet"] == ""
+
+    index.remove_chat("c1")
+    assert "c1" not in index._chat_terms and index.search("dinosauri") == ([], 0)
+
+    print("Test 4 completato con successo: indice senza copia del testo, snippet dalla cronologia.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test ricerca chat...")
+    test_ranking_and_snippet()
+    test_accents_filters_and_removal()
+    test_search_speed()
+    test_index_keeps_no_text_copy()
+    print("Tutti i test completati con successo!")
@@ -0,0 +1,66 @@
+"""
+File:	/tests/utils/test_clean_text.py
+-----
+Test clean_text su corpus golden
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 3:46:13 am
+-----
+Last Modified: 	October 19th 2026 3:46:13 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import json
+
+# Aggiunge la root del progetto al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from web_api.utils.cleantext import clean_text
+
+# Corpus golden: input e output della versione originale di clean_text (14 passate re.sub)
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cleantext_golden.json")
+
+
+def test_golden_corpus():
+    with open(GOLDEN_FILE, 'r', encoding='utf-8') as f:
+        golden = json.load(f)
+
+    mismatches = [case for case in golden if clean_text(case["input"]) != case["expected"]]
+
+    assert not mismatches, f"{len(mismatches)} differenze, es. {mismatches[0]!r}"
+
+    print(f"Test 1 completato con successo: {len(golden)} casi identici alla versione originale.")
+
+
+def test_examples():
+    assert clean_text("Ciao!! 😊 Come stai??? :) ") == "Ciao! Come stai?"
+    assert clean_text('Andiamo a fare una "passeggiata" [ore 15:00]') == "Andiamo a fare una passeggiata ore 15:00"
+    assert clean_text("**Attenzione** ... fine ---") == "Attenzione. fine -"
+
+    print("Test 2 completato con successo: esempi di pulizia del testo.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test clean_text...")
+    test_golden_corpus()
+    test_examples()
+    print("Tutti i test completati con successo!")
@@ -0,0 +1,102 @@
+"""
+File:	/tests/utils/test_fix_movements.py
+-----
+Test indice dei movimenti di NAO
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 3:47:00 am
+-----
+Last Modified: 	October 19th 2026 4:32:42 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+
+# Aggiunge la root del progetto al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from web_api.utils.fix_movements import MovementIndex, fix_animation
+
+LIBRARY = [
+    "BodyTalk/Speaking/BodyTalk_(20)",
+    "Emotions/Positive/Happy_(4)",
+    "Gestures/Hey_(7)",
+    "NAO/Emotions/Negative/Angry_1",
+]
+
+
+def test_exact_and_variants():
+    index = MovementIndex(LIBRARY)
+
+    for _ in range(20):
+        path = index.resolve("Emotions/Positive/Happy_(4)")
+        prefix, variant = path.rsplit("_", 1)
+        assert prefix == "animations/Stand/Emotions/Positive/Happy"
+        assert 1 <= int(variant) <= 4
+
+    # Movimento a variante singola: percorso invariato
+    assert index.resolve("NAO/Emotions/Negative/Angry_1") == "animations/Stand/NAO/Emotions/Negative/Angry_1"
+
+    print("Test 1 completato con successo: espansione delle varianti tramite indice.")
+
+
+def test_normalized_and_fuzzy_match():
+    index = MovementIndex(LIBRARY)
+
+    # Variante esplicita o maiuscole/minuscole diverse
+    assert index.resolve("emotions/positive/happy_2").startswith("animations/Stand/Emotions/Positive/Happy_")
+    # Nome scritto male
+    assert index.resolve("Gestures/Hei_(7)").startswith("animations/Stand/Gestures/Hey_")
+    # Movimento inesistente: scartato
+    assert index.resolve("Dance/Macarena") is None
+    assert index.stats == {"exact": 0, "normalized": 1, "fuzzy": 1, "dropped": 1}
+
+    print("Test 2 completato con successo: correzione dei nomi errati e scarto degli sconosciuti.")
+
+
+def test_fix_animation_compatibility():
+    assert fix_animation("Gestures/Yes_1") == "animations/Stand/Gestures/Yes_1"
+    assert fix_animation("Gestures/Hey_(1)") == "animations/Stand/Gestures/Hey_1"
+
+    print("Test 3 completato con successo: fix_animation invariata.")
+
+
+def test_suffixed_entries_and_full_paths():
+    index = MovementIndex(LIBRARY + ["Gestures/Yes_1", "Gestures/Yes_2"])
+
+    # Yes_1 e Yes_2 sono voci distinte: nessuna collisione sulla chiave
+    assert index.resolve("gestures/yes_2") == "animations/Stand/Gestures/Yes_2"
+    # Variante esplicita di un gruppo: mantenuta se esiste
+    assert index.resolve("Emotions/Positive/Happy_3") == "animations/Stand/Emotions/Positive/Happy_3"
+    # Percorsi completi scritti dal modello: verificati sulla libreria
+    assert index.resolve("animations/Stand/Gestures/Yes_2") == "animations/Stand/Gestures/Yes_2"
+    assert index.resolve("animations/Stand/Dance/Moonwalk_4") is None
+
+    print("Test 4 completato con successo: varianti _n distinte e percorsi completi verificati.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test indice movimenti...")
+    test_exact_and_variants()
+    test_normalized_and_fuzzy_match()
+    test_fix_animation_compatibility()
+    test_suffixed_entries_and_full_paths()
+    print("Tutti i test completati con successo!")
@@ -0,0 +1,98 @@
+"""
+File:	/tests/utils/test_http_pool.py
+-----
+Test pool di connessioni HTTP verso il provider LLM
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 3:59:57 am
+-----
+Last Modified: 	October 19th 2026 3:59:57 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import types
+
+# Aggiunge la root del progetto al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from web_api.utils.http_pool import HttpPool, get_provider
+
+
+def test_get_provider():
+    assert get_provider("gemini/gemini-2.5-flash") == "gemini"
+    assert get_provider("openrouter/google/gemini-2.5-flash") == "openrouter"
+    assert get_provider("claude-sonnet-4-20250514") == "anthropic"
+    assert get_provider("gpt-4.1") == "openai"
+
+    print("Test 1 completato con successo: provider ricavato dal nome del modello.")
+
+
+def test_completion_kwargs_without_install():
+    pool = HttpPool()
+
+    # Prima del warm-up LiteLLM usa i propri client: nessun parametro aggiunto
+    assert pool.completion_kwargs("gemini/gemini-2.5-flash") == {}
+    assert pool.get_stats()["installed"] is False
+    assert pool.get_stats()["requests"] == 1
+
+    print("Test 2 completato con successo: nessun client prima dell'installazione.")
+
+
+def test_install_sets_client_session():
+    fake_litellm = types.SimpleNamespace(client_session=None)
+    pool = HttpPool(max_connections=5, max_keepalive_connections=2)
+    pool.install(fake_litellm, ["gemini/gemini-2.5-flash", "gpt-4.1", "ollama/llama3"])
+    try:
+        assert fake_litellm.client_session is pool.client
+        # Gli host da tenere caldi sono quelli dei provider noti, senza duplicati
+        assert pool.ping_urls == ["https://api.openai.com", "https://generativelanguage.googleapis.com"]
+
+        # Una seconda installazione non crea un nuovo client
+        client = pool.client
+        pool.install(fake_litellm, ["gpt-4.1"])
+        assert pool.client is client
+        assert pool.get_stats()["installed"] is True
+    finally:
+        pool.close()
+
+    print("Test 3 completato con successo: client condiviso impostato in LiteLLM.")
+
+
+def test_install_with_custom_api_base():
+    fake_litellm = types.SimpleNamespace(client_session=None)
+    pool = HttpPool()
+    pool.install(fake_litellm, ["openai/stub"], api_base="http://127.0.0.1:8099/v1")
+    try:
+        assert pool.ping_urls == ["http://127.0.0.1:8099/v1"]
+    finally:
+        pool.close()
+
+    print("Test 4 completato con successo: ping verso l'URL base personalizzato.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test pool HTTP...")
+    test_get_provider()
+    test_completion_kwargs_without_install()
+    test_install_sets_client_session()
+    test_install_with_custom_api_base()
+    print("Tutti i test completati con successo!")
@@ -33,7 +33,7 @@ import os
 # Aggiunge la directory web_api al path per importare i moduli in modo corretto
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
-from web_api.utils.cleantext import extract_and_parse_llm_json
+from web_api.utils.cleantext import extract_and_parse_llm_json, parse_llm_json
 import json
 
 def test_multiple_jsons_with_comments():
@@ -150,6 +150,60 @@ def test_pure_json_with_comments():
     
     print("Test 5 completato con successo: Parsing da JSON puro contente commenti C-style ha rimosso i commenti e funzionato.")
 
+def test_repair_truncated_json():
+    # JSON troncato dopo il primo chunk completo: la riparazione locale lo chiude
+    test_str = '''
+    {
+      "action": "ACT_DANCE",
+      "chunks": [
+        {
+          "text": "Sto ballando!",
+          "movements": ["animations/Stand/Gestures/Yes_1"]
+        },
+        {
+          "text": "Guarda che mos
+    '''
+    result, outcome = parse_llm_json(test_str)
+
+    assert outcome == "local_repair"
+    assert result["action"] == "ACT_DANCE"
+    assert result["chunks"][0]["text"] == "Sto ballando!"
+
+    print("Test 6 completato con successo: JSON troncato riparato localmente.")
+
+def test_repair_single_quotes_and_newlines():
+    # Dizionario con apici singoli (come nell'esempio di cleantext) e a capo non escapati
+    single_quotes = "{'chunks': [{'text': 'Ciao! Sono NAO.', 'movements': ['Gestures/Hey_(7)']}]}"
+    result, outcome = parse_llm_json(single_quotes)
+
+    assert outcome == "local_repair"
+    assert result["chunks"][0]["text"] == "Ciao! Sono NAO."
+    assert result["action"] == "NO_ACTION"
+
+    newlines = '{"action": "NO_ACTION", "chunks": [{"text": "Prima riga\nseconda riga", "movements": []}]}'
+    result, outcome = parse_llm_json(newlines)
+
+    assert outcome == "local_repair"
+    assert result["chunks"][0]["text"] == "Prima riga\nseconda riga"
+
+    print("Test 7 completato con successo: apici singoli e a capo non escapati riparati.")
+
+def test_repair_unbalanced_brackets():
+    test_str = '{"action": "NO_ACTION", "chunks": [{"text": "Ciao", "movements": ["Gestures/Hey_1"}]}}'
+    result, outcome = parse_llm_json(test_str)
+
+    assert outcome == "local_repair"
+    assert result["chunks"][0]["movements"] == ["Gestures/Hey_1"]
+
+    # Un JSON valido non passa dalla riparazione
+    _, outcome = parse_llm_json('{"action": "NO_ACTION", "chunks": []}')
+    assert outcome == "parsed"
+
+    # Testo senza JSON: non recuperabile localmente
+    assert parse_llm_json("Nessun JSON qui") == (None, None)
+
+    print("Test 8 completato con successo: parentesi sbilanciate riparate.")
+
 def test_historical_errors():
     current_dir = os.path.dirname(os.path.abspath(__file__))
     bad_responses_file = os.path.join(current_dir, "bad_responses.json")
@@ -163,6 +217,7 @@ def test_historical_errors():
         
     success_count = 0
     fallback_count = 0
+    repaired_count = 0
         
     for index, err_str in enumerate(errors):
         try:
@@ -174,6 +229,9 @@ def test_historical_errors():
             # Se ha restituito confuso era perchè era completamene malformato
             if "confuso" in result["chunks"][0].get("text", "").lower():
                 fallback_count += 1
+                # Verifica se la riparazione locale l'avrebbe recuperato
+                if parse_llm_json(err_str)[1] == "local_repair":
+                    repaired_count += 1
             
             success_count += 1
         except Exception as e:
@@ -181,6 +239,7 @@ def test_historical_errors():
             print(f"Testo: {err_str[:100]}...")
             
     print(f"Test Storici: {success_count}/{len(errors)} errori passati con successo. Di cui {fallback_count} convertiti in fallback.")
+    print(f"Riparazione locale: {repaired_count}/{fallback_count} fallback recuperati.")
 
 if __name__ == "__main__":
     print("Esecuzione test parser JSON...")
@@ -189,6 +248,9 @@ if __name__ == "__main__":
     test_json_blocks_with_naked_braces()
     test_incomplete_json()
     test_pure_json_with_comments()
+    test_repair_truncated_json()
+    test_repair_single_quotes_and_newlines()
+    test_repair_unbalanced_brackets()
     print("-" * 50)
     test_historical_errors()
     print("Tutti i test completati con successo!")
@@ -0,0 +1,159 @@
+"""
+File:	/tests/utils/test_key_retry.py
+-----
+Test tentativi con più API key entro la deadline del tentativo
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:50:09 am
+-----
+Last Modified: 	October 19th 2026 4:56:23 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+
+import sys
+import os
+import json
+import time
+from types import SimpleNamespace
+
+# Aggiunge la cartella dei test al path per riusare LLMChatAPI con LiteLLM finto
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from test_response_schema import chat_api, APP_AVAILABLE
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class Timeout(Exception):
+    """Come litellm.Timeout"""
+
+
+class ScriptedLiteLLM:
+    """LiteLLM finto: ogni chiamata attende delay secondi e poi fallisce con error (o risponde)"""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.calls = []
+
+    def supports_response_schema(self, model):
+        return True
+
+    def completion(self, model, messages, api_key=None, timeout=None, **kwargs):
+        self.calls.append((api_key, timeout))
+        delay, error = self.script.pop(0) if self.script else (0, None)
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        content = json.dumps({"action": "NO_ACTION", "chunks": [{"text": "Ciao", "movements": []}]})
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(total_tokens=10),
+        )
+
+
+ENV = {
+    "LLM_MODEL": "gemini/test",
+    "LLM_FALLBACK_MODELS": "",
+    "GOOGLE_API_KEY": "key-a-0001,key-b-0002,key-c-0003",
+    "LLM_KEY_MAX_ATTEMPTS": "3",
+}
+
+
+def test_timeout_is_not_retried_on_other_keys():
+    if not APP_AVAILABLE:
+        print("Test 1 saltato: Flask o ai_prompts/technical_prompt.py non disponibili.")
+        return
+    fake = ScriptedLiteLLM([(0, Timeout("Request timed out"))])
+    with chat_api(fake, LLM_ATTEMPT_TIMEOUT="1", **ENV) as api:
+        try:
+            api._call_llm([{"role": "user", "content": "ciao"}])
+            assert False, "Il timeout doveva arrivare al chiamante"
+        except Timeout:
+            pass
+    # Un timeout è un problema del modello: nessuna altra chiave viene provata
+    assert len(fake.calls) == 1
+
+    print("Test 1 completato con successo: timeout senza rotazione delle chiavi.")
+
+
+def test_key_retries_share_the_attempt_deadline():
+    if not APP_AVAILABLE:
+        print("Test 2 saltato: Flask o ai_prompts/technical_prompt.py non disponibili.")
+        return
+    fake = ScriptedLiteLLM([(0.3, RateLimitError("quota")), (0, None)])
+    with chat_api(fake, LLM_ATTEMPT_TIMEOUT="1", **ENV) as api:
+        model, _ = api._call_llm([{"role": "user", "content": "ciao"}])
+    assert model == "gemini/test"
+    (first_key, first_timeout), (second_key, second_timeout) = fake.calls
+    # Il 429 fa cambiare chiave, con il solo tempo residuo del tentativo
+    assert first_key != second_key
+    assert 0.9 < first_timeout <= 1.0
+    assert second_timeout <= 0.75
+
+    print("Test 2 completato con successo: il cambio di chiave usa il tempo residuo.")
+
+
+def test_key_retries_stop_when_budget_is_spent():
+    if not APP_AVAILABLE:
+        print("Test 3 saltato: Flask o ai_prompts/technical_prompt.py non disponibili.")
+        return
+    fake = ScriptedLiteLLM([(0.5, RateLimitError("quota")), (0, None)])
+    with chat_api(fake, LLM_ATTEMPT_TIMEOUT="0.4", **ENV) as api:
+        start = time.monotonic()
+        try:
+            api._call_llm([{"role": "user", "content": "ciao"}])
+            assert False, "La deadline del tentativo doveva scadere"
+        except TimeoutError:
+            pass
+        elapsed = time.monotonic() - start
+    # Deadline già scaduta: nessuna chiamata con la seconda chiave
+    assert len(fake.calls) == 1 and elapsed < 1.0
+
+    print("Test 3 completato con successo: nessun nuovo tentativo oltre la deadline.")
+
+
+def test_warm_up_call_uses_a_single_key():
+    if not APP_AVAILABLE:
+        print("Test 4 saltato: Flask o ai_prompts/technical_prompt.py non disponibili.")
+        return
+    fake = ScriptedLiteLLM([(0, RateLimitError("quota")), (0, None)])
+    with chat_api(fake, LLM_ATTEMPT_TIMEOUT="1", WARMUP_LLM_CALL="true", **ENV) as api:
+        try:
+            api.warm_up()
+            assert False, "Il 429 del warm-up doveva arrivare al WarmupManager"
+        except RateLimitError:
+            pass
+    # Un solo tentativo con il timeout del tentativo, nessuna rotazione delle chiavi
+    assert len(fake.calls) == 1
+    assert 0.9 < fake.calls[0][1] <= 1.0
+
+    print("Test 4 completato con successo: chiamata di warm-up con un solo tentativo.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test tentativi con più API key...")
+    test_timeout_is_not_retried_on_other_keys()
+    test_key_retries_share_the_attempt_deadline()
+    test_key_retries_stop_when_budget_is_spent()
+    test_warm_up_call_uses_a_single_key()
+    print("Tutti i test completati con successo!")
@@ -0,0 +1,175 @@
+"""
+File:	/tests/utils/test_key_scheduler.py
+-----
+Test scheduler API key
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 3:39:25 am
+-----
+Last Modified: 	October 19th 2026 4:49:14 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+
+# Aggiunge la root del progetto al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from web_api.utils.key_scheduler import ApiKeyScheduler, is_retryable_error
+
+
+class FakeClock:
+    """Orologio controllabile per simulare il passare del tempo"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+
+class FakeServerError(Exception):
+    status_code = 503
+
+
+class RateLimitError(Exception):
+    """Come litellm.RateLimitError quando il codice HTTP non è disponibile"""
+
+
+class Timeout(Exception):
+    """Come litellm.Timeout"""
+
+
+def test_least_loaded_key_is_chosen():
+    scheduler = ApiKeyScheduler(["key-a", "key-b"], clock=FakeClock())
+
+    first = scheduler.acquire()
+    second = scheduler.acquire()
+
+    # Con una richiesta in corso sulla prima chiave, la seconda deve andare all'altra
+    assert first != second
+
+    scheduler.release(first)
+    third = scheduler.acquire()
+    assert third == first
+
+    print("Test 1 completato con successo: scelta la chiave meno carica.")
+
+
+def test_rate_limited_key_goes_in_cooldown():
+    clock = FakeClock()
+    scheduler = ApiKeyScheduler(["key-a", "key-b"], base_cooldown=10, clock=clock)
+
+    key = scheduler.acquire()
+    scheduler.release(key, error=FakeRateLimitError("429 Too Many Requests"))
+
+    # Durante il cooldown la chiave in errore non viene più scelta
+    for _ in range(3):
+        other = scheduler.acquire()
+        assert other != key
+        scheduler.release(other)
+
+    # Scaduto il cooldown la chiave torna disponibile
+    clock.now += 11
+    chosen = {scheduler.acquire(), scheduler.acquire()}
+    assert key in chosen
+
+    print("Test 2 completato con successo: chiave in rate limit messa in cooldown.")
+
+
+def test_cooldown_is_exponential():
+    clock = FakeClock()
+    scheduler = ApiKeyScheduler(["key-a"], base_cooldown=5, max_cooldown=300, clock=clock)
+
+    for expected in (5, 10, 20):
+        key = scheduler.acquire()
+        scheduler.release(key, error=FakeRateLimitError("quota exceeded"))
+        stats = scheduler.get_stats()[0]
+        assert stats["cooldown_remaining_s"] == expected
+        clock.now += expected
+
+    print("Test 3 completato con successo: cooldown esponenziale.")
+
+
+def test_rpm_limit():
+    clock = FakeClock()
+    scheduler = ApiKeyScheduler(["key-a", "key-b"], rpm_limit=1, clock=clock)
+
+    used = set()
+    for _ in range(2):
+        key = scheduler.acquire()
+        scheduler.release(key, tokens=100)
+        used.add(key)
+
+    # Con limite di 1 richiesta al minuto le due richieste usano chiavi diverse
+    assert used == {"key-a", "key-b"}
+    assert all(not s["healthy"] for s in scheduler.get_stats())
+
+    clock.now += 61
+    assert all(s["healthy"] for s in scheduler.get_stats())
+
+    print("Test 4 completato con successo: rispettato il limite di richieste al minuto.")
+
+
+def test_exclude_and_retryable_errors():
+    scheduler = ApiKeyScheduler(["key-a"], clock=FakeClock())
+
+    assert scheduler.acquire(exclude={"key-a"}) is None
+    assert is_retryable_error(FakeRateLimitError("boom"))
+    assert is_retryable_error(RateLimitError("RESOURCE_EXHAUSTED: quota"))
+    assert is_retryable_error(type("AuthenticationError", (Exception,), {})("invalid api key"))
+    # 5xx e timeout non dipendono dalla chiave: niente rotazione (li gestisce il router dei modelli)
+    assert not is_retryable_error(FakeServerError("Service Unavailable"))
+    assert not is_retryable_error(Timeout("Request timed out"))
+    assert not is_retryable_error(ValueError("messaggio non valido"))
+    # Un "429" nel testo (id richiesta, conteggio token...) non è un rate limit
+    assert not is_retryable_error(ValueError("request id req_4291: prompt of 1429 tokens"))
+
+    print("Test 5 completato con successo: esclusione chiavi e classificazione errori.")
+
+
+def test_server_error_does_not_cool_down_key():
+    clock = FakeClock()
+    scheduler = ApiKeyScheduler(["key-a"], base_cooldown=10, clock=clock)
+
+    key = scheduler.acquire()
+    scheduler.release(key, error=FakeServerError("503 Service Unavailable"))
+
+    # Un disservizio del provider non dipende dalla chiave: niente cooldown
+    stats = scheduler.get_stats()[0]
+    assert stats["healthy"] and stats["cooldown_remaining_s"] == 0
+    assert stats["total_errors"] == 1
+
+    print("Test 6 completato con successo: errori 5xx senza cooldown della chiave.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test scheduler API key...")
+    test_least_loaded_key_is_chosen()
+    test_rate_limited_key_goes_in_cooldown()
+    test_cooldown_is_exponential()
+    test_rpm_limit()
+    test_exclude_and_retryable_errors()
+    test_server_error_does_not_cool_down_key()
+    print("Tutti i test completati con successo!")
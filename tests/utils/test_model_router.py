@@ -0,0 +1,147 @@
+"""
+File:	/tests/utils/test_model_router.py
+-----
+Test router modelli LLM (fallback e hedging)
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 3:41:03 am
+-----
+Last Modified: 	October 19th 2026 4:30:10 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import threading
+import time
+
+# Aggiunge la root del progetto al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from web_api.utils.model_router import ModelRouter
+
+
+def test_fallback_on_error():
+    router = ModelRouter(["primario", "secondario"], attempt_timeout=1.0)
+
+    def attempt(model, timeout):
+        if model == "primario":
+            raise RuntimeError("provider non disponibile")
+        return f"risposta da {model}"
+
+    model, result = router.call(attempt)
+
+    assert model == "secondario"
+    assert result == "risposta da secondario"
+    stats = {s["model"]: s for s in router.get_stats()}
+    assert stats["primario"]["errors"] == 1
+    assert stats["secondario"]["wins"] == 1
+
+    print("Test 1 completato con successo: fallback sul secondo modello in caso di errore.")
+
+
+def test_attempt_deadline():
+    router = ModelRouter(["lento", "veloce"], attempt_timeout=0.2)
+    threads = []
+
+    def attempt(model, timeout):
+        threads.append(threading.current_thread())
+        if model == "lento":
+            # Come LiteLLM: la chiamata rispetta il timeout ricevuto
+            time.sleep(timeout)
+            raise TimeoutError("timeout del provider")
+        return model
+
+    start = time.monotonic()
+    model, _ = router.call(attempt)
+
+    assert model == "veloce"
+    assert time.monotonic() - start < 0.8
+    assert router.get_stats()[0]["timeouts"] == 1
+    # Senza hedging i tentativi girano nel thread chiamante
+    assert threads == [threading.current_thread()] * 2
+
+    print("Test 2 completato con successo: deadline per tentativo rispettata.")
+
+
+def test_hedged_request_wins():
+    router = ModelRouter(["lento", "veloce"], attempt_timeout=2.0, hedging=True, hedge_min_delay=0.1)
+
+    def attempt(model, timeout):
+        time.sleep(1.0 if model == "lento" else 0.05)
+        return model
+
+    start = time.monotonic()
+    model, _ = router.call(attempt)
+
+    assert model == "veloce"
+    assert time.monotonic() - start < 0.6
+    stats = {s["model"]: s for s in router.get_stats()}
+    assert stats["veloce"]["hedges"] == 1
+    assert stats["veloce"]["wins"] == 1
+    assert stats["lento"]["losses"] == 1
+
+    print("Test 3 completato con successo: la richiesta hedged vince sul modello lento.")
+
+
+def test_all_models_fail():
+    router = ModelRouter(["a", "b"], attempt_timeout=1.0)
+
+    def attempt(model, timeout):
+        raise ValueError(f"errore {model}")
+
+    try:
+        router.call(attempt)
+        assert False, "Doveva sollevare un'eccezione"
+    except ValueError as e:
+        assert "errore b" in str(e)
+
+    print("Test 4 completato con successo: eccezione propagata se tutti i modelli falliscono.")
+
+
+def test_deadline_starts_when_attempt_runs():
+    # Pool con un solo thread: il secondo tentativo resta in coda dietro al primo
+    router = ModelRouter(["a", "b"], attempt_timeout=0.3, hedging=True, hedge_min_delay=0.05,
+                         max_workers=1)
+
+    def attempt(model, timeout):
+        time.sleep(0.25 if model == "a" else 0.2)
+        if model == "a":
+            raise RuntimeError("provider non disponibile")
+        return model
+
+    model, _ = router.call(attempt)
+
+    # "b" resta in coda 0.2s e poi impiega 0.2s: contando la coda scadrebbe (0.4s > 0.3s)
+    assert model == "b"
+    stats = {s["model"]: s for s in router.get_stats()}
+    assert stats["b"]["timeouts"] == 0 and stats["b"]["wins"] == 1
+
+    print("Test 5 completato con successo: la deadline parte all'esecuzione del tentativo.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test router modelli...")
+    test_fallback_on_error()
+    test_attempt_deadline()
+    test_hedged_request_wins()
+    test_all_models_fail()
+    test_deadline_starts_when_attempt_runs()
+    print("Tutti i test completati con successo!")
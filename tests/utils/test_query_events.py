@@ -0,0 +1,104 @@
+"""
+File:	/tests/utils/test_query_events.py
+-----
+Test interrogazione eventi JSONL
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 3:50:53 am
+-----
+Last Modified: 	October 19th 2026 3:50:53 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import gzip
+import json
+import tempfile
+
+# Aggiunge la root del progetto e la cartella dei tool al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from query_events import list_event_files, iter_events, aggregate
+
+DAY1 = [
+    {"event": "message", "chat_id": "c1", "role": "user", "content": "Ciao"},
+    {"event": "turn", "chat_id": "c1", "personality": "default", "model": "gemini/gemini-2.5-flash",
+     "json_outcome": "parsed", "fallback": False, "llm_ms": 1000, "total_ms": 1100, "total_tokens": 500},
+]
+DAY2 = [
+    {"event": "turn", "chat_id": "c2", "personality": "professore", "model": "gemini/gemini-2.5-flash",
+     "json_outcome": "fallback", "fallback": True, "llm_ms": 3000, "total_ms": 3200, "total_tokens": 300},
+    {"event": "error", "chat_id": "c2", "stage": "talk", "error_type": "TimeoutError"},
+]
+
+
+def write_logs(log_dir):
+    with gzip.open(os.path.join(log_dir, "chat_events_20261018.jsonl.gz"), "wt", encoding="utf-8") as f:
+        f.write("\n".join(json.dumps(e) for e in DAY1) + "\n")
+    with open(os.path.join(log_dir, "chat_events_20261019.jsonl"), "w", encoding="utf-8") as f:
+        f.write("\n".join(json.dumps(e) for e in DAY2) + "\n")
+    # File di log testuale: non deve essere letto
+    with open(os.path.join(log_dir, "chat_log_20261019.txt"), "w", encoding="utf-8") as f:
+        f.write("2026-10-19 10:00:00,000 - INFO - testo\n")
+
+
+def test_filters_across_days():
+    with tempfile.TemporaryDirectory() as log_dir:
+        write_logs(log_dir)
+
+        paths = list_event_files(log_dir)
+        assert [os.path.basename(p) for p in paths] == ["chat_events_20261018.jsonl.gz", "chat_events_20261019.jsonl"]
+        assert len(list_event_files(log_dir, date_from="2026-10-19")) == 1
+
+        turns = list(iter_events(paths, {"event": "turn"}))
+        assert [e["chat_id"] for e in turns] == ["c1", "c2"]
+
+        fallbacks = list(iter_events(paths, {"fallback": True}))
+        assert [e["chat_id"] for e in fallbacks] == ["c2"]
+
+    print("Test 1 completato con successo: filtri su più giorni e file compressi.")
+
+
+def test_aggregate():
+    with tempfile.TemporaryDirectory() as log_dir:
+        write_logs(log_dir)
+        paths = list_event_files(log_dir)
+
+        report = aggregate(iter_events(paths))["all"]
+        assert report["events"] == {"message": 1, "turn": 2, "error": 1}
+        assert report["chats"] == 2
+        assert report["fallback_rate"] == 0.5
+        assert report["errors"] == 1
+        assert report["latency_ms"]["llm_ms"]["p95"] == 3000
+        assert report["tokens"]["total_tokens"] == 800
+
+        by_personality = aggregate(iter_events(paths, {"event": "turn"}), group_by="personality")
+        assert set(by_personality) == {"default", "professore"}
+
+    print("Test 2 completato con successo: statistiche aggregate.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test eventi JSONL...")
+    test_filters_across_days()
+    test_aggregate()
+    print("Tutti i test completati con successo!")
@@ -0,0 +1,196 @@
+"""
+File:	/tests/utils/test_request_cache.py
+-----
+Test deduplicazione delle richieste ripetute (request_id)
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:07:15 am
+-----
+Last Modified: 	October 19th 2026 4:35:37 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import time
+import threading
+
+# Aggiunge la root del progetto al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from web_api.utils.request_cache import RequestCache, RequestInFlightError
+
+
+class FakeClock:
+    """Orologio controllabile per simulare il passare del tempo"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_retry_gets_stored_response():
+    cache = RequestCache(ttl=60, clock=FakeClock())
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return ({"chat_id": "1", "success": True}, 200)
+
+    first = cache.run("talk::abc", compute)
+    second = cache.run("talk::abc", compute)
+
+    assert first == (({"chat_id": "1", "success": True}, 200), "computed")
+    assert second[1] == "replayed" and second[0] == first[0]
+    assert len(calls) == 1
+
+    print("Test 1 completato con successo: il retry riceve la risposta memorizzata.")
+
+
+def test_in_flight_duplicate_waits():
+    cache = RequestCache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+    results = []
+
+    def slow_compute():
+        calls.append(1)
+        started.set()
+        release.wait(2)
+        return ("risposta", 200)
+
+    leader = threading.Thread(target=lambda: results.append(cache.run("k", slow_compute)))
+    leader.start()
+    started.wait(2)
+    follower = threading.Thread(target=lambda: results.append(cache.run("k", slow_compute)))
+    follower.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join()
+    follower.join()
+
+    # Una sola chiamata: il duplicato condivide il risultato della richiesta in corso
+    assert len(calls) == 1
+    assert sorted(source for _, source in results) == ["computed", "joined"]
+    assert cache.get_stats()["joined"] == 1
+
+    print("Test 2 completato con successo: duplicato in corso condivide il risultato.")
+
+
+def test_ttl_and_max_entries():
+    clock = FakeClock()
+    cache = RequestCache(ttl=10, max_entries=3, clock=clock)
+    for i in range(5):
+        cache.run(f"k{i}", lambda i=i: (i, 200))
+    # Restano solo le ultime 3 richieste
+    assert len(cache) == 3
+    assert cache.run("k4", lambda: ("nuovo", 200))[1] == "replayed"
+    assert cache.run("k0", lambda: ("nuovo", 200)) == (("nuovo", 200), "computed")
+
+    clock.now += 11
+    assert cache.run("k4", lambda: ("dopo ttl", 200)) == (("dopo ttl", 200), "computed")
+
+    print("Test 3 completato con successo: scadenza TTL e numero massimo di voci.")
+
+
+def test_errors_are_not_cached():
+    cache = RequestCache()
+    cacheable = lambda result: result[1] < 500
+
+    assert cache.run("k", lambda: ("errore", 500), cacheable)[1] == "computed"
+    assert cache.run("k", lambda: ("ok", 200), cacheable) == (("ok", 200), "computed")
+
+    def failing():
+        raise RuntimeError("boom")
+
+    try:
+        cache.run("x", failing)
+        assert False, "L'eccezione doveva propagarsi"
+    except RuntimeError:
+        pass
+    assert cache.run("x", lambda: ("ok", 200)) == (("ok", 200), "computed")
+
+    print("Test 4 completato con successo: errori ed eccezioni non memorizzati.")
+
+
+def test_wait_timeout():
+    cache = RequestCache(wait_timeout=0.05)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_compute():
+        started.set()
+        release.wait(2)
+        return ("ok", 200)
+
+    leader = threading.Thread(target=lambda: cache.run("k", slow_compute))
+    leader.start()
+    started.wait(2)
+    try:
+        cache.run("k", slow_compute)
+        assert False, "Il duplicato doveva scadere"
+    except RequestInFlightError:
+        pass
+    release.set()
+    leader.join()
+
+    print("Test 5 completato con successo: attesa del duplicato limitata.")
+
+
+def test_in_flight_entry_does_not_block_expiry():
+    clock = FakeClock()
+    cache = RequestCache(ttl=10, clock=clock)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_compute():
+        started.set()
+        release.wait(2)
+        return ("lenta", 200)
+
+    # La richiesta più vecchia resta in corso mentre le altre vengono completate
+    slow = threading.Thread(target=lambda: cache.run("lenta", slow_compute))
+    slow.start()
+    assert started.wait(2)
+    for i in range(3):
+        cache.run(f"k{i}", lambda: ("ok", 200))
+    assert len(cache) == 4
+
+    # Scaduto il TTL le voci completate vengono eliminate anche con la lenta ancora in corso
+    clock.now += 11
+    cache.run("nuova", lambda: ("ok", 200))
+    assert cache.get_stats()["entries"] == 1
+    assert cache.get_stats()["in_flight"] == 1
+
+    release.set()
+    slow.join(2)
+    assert cache.run("lenta", slow_compute)[1] == "replayed"
+
+    print("Test 6 completato con successo: una richiesta in corso non blocca la scadenza delle altre.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test deduplicazione richieste...")
+    test_retry_gets_stored_response()
+    test_in_flight_duplicate_waits()
+    test_ttl_and_max_entries()
+    test_errors_are_not_cached()
+    test_wait_timeout()
+    test_in_flight_entry_does_not_block_expiry()
+    print("Tutti i test completati con successo!")
@@ -0,0 +1,138 @@
+"""
+File:	/tests/utils/test_response_encoding.py
+-----
+Test codifica delle risposte (compressione e MessagePack)
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:23:08 am
+-----
+Last Modified: 	October 19th 2026 4:42:30 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import gzip
+import json
+
+# Aggiunge la root del progetto al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from web_api.utils import response_encoding
+from web_api.utils.response_encoding import ResponseEncoder, choose_encoding, parse_accept, wants_msgpack
+
+
+class FakeResponse:
+    """Sostituto minimo di una risposta Werkzeug (dati, header, Vary e streaming)"""
+
+    def __init__(self, payload=None, chunks=None, mimetype="application/json"):
+        self._data = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        self.response = chunks
+        self.is_streamed = chunks is not None
+        self.direct_passthrough = False
+        self.mimetype = mimetype
+        self.headers = {}
+        self.vary = set()
+
+    def get_data(self):
+        return self._data
+
+    def set_data(self, data):
+        self._data = data
+        self.headers["Content-Length"] = str(len(data))
+
+
+def test_negotiation():
+    assert parse_accept("gzip;q=0.5, br") == {"gzip": 0.5, "br": 1.0}
+    assert choose_encoding("gzip, deflate, br", available=("br", "gzip")) == "br"
+    assert choose_encoding("gzip;q=1.0, br;q=0.2", available=("br", "gzip")) == "gzip"
+    assert choose_encoding("br", available=("gzip",)) is None
+    assert choose_encoding("*", available=("gzip",)) == "gzip"
+    assert choose_encoding("gzip;q=0", available=("gzip",)) is None
+    assert choose_encoding("") is None
+
+    print("Test 1 completato con successo: negoziazione di Accept-Encoding.")
+
+
+def test_only_large_responses_are_compressed():
+    encoder = ResponseEncoder(min_bytes=1024, msgpack_enabled=False)
+    small = {"chat_id": "w1-0mveqh88z00pnhj", "response": {"chunks": [{"text": "Ciao!", "movements": []}]}}
+    response = encoder.apply(FakeResponse(small), accept_encoding="gzip")
+    assert "Content-Encoding" not in response.headers
+    assert json.loads(response.get_data()) == small
+
+    large = {"history": [{"role": "user", "content": f"messaggio numero {i}"} for i in range(200)]}
+    response = encoder.apply(FakeResponse(large), accept_encoding="gzip")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.vary
+    assert json.loads(gzip.decompress(response.get_data())) == large
+    assert len(response.get_data()) < len(json.dumps(large)) / 4
+
+    print("Test 2 completato con successo: compresse solo le risposte grandi.")
+
+
+def test_streamed_response_is_compressed_by_chunks():
+    lines = [json.dumps({"chat_id": f"w1-{i}", "history": []}) + "\n" for i in range(100)]
+    response = FakeResponse(chunks=iter(lines), mimetype="application/x-ndjson")
+    response.headers["Content-Length"] = "1"
+    encoder = ResponseEncoder(min_bytes=1024)
+    encoder.apply(response, accept_encoding="gzip")
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    assert gzip.decompress(b"".join(response.response)).decode("utf-8") == "".join(lines)
+
+    print("Test 3 completato con successo: risposta in streaming compressa blocco per blocco.")
+
+
+def test_msgpack_on_request():
+    payload = {"chat_id": "w1-0mveqh88z00pnhj", "response": {"action": "NO_ACTION", "chunks": [{"text": "Perché no?", "movements": ["Yes_1"]}]}}
+    if response_encoding.msgpack is None:
+        # Senza il modulo msgpack la risposta resta JSON anche se richiesto
+        assert not wants_msgpack("application/msgpack")
+        response = ResponseEncoder().apply(FakeResponse(payload), accept="application/msgpack")
+        assert response.mimetype == "application/json"
+        print("Test 4 completato con successo: msgpack non installato, risposta JSON.")
+        return
+
+    assert wants_msgpack("application/x-msgpack, application/json;q=0.5")
+    assert not wants_msgpack("application/json")
+    # Il q di MessagePack viene confrontato con quello di JSON e dei caratteri jolly
+    assert not wants_msgpack("application/json, application/msgpack;q=0.5")
+    assert not wants_msgpack("*/*, application/msgpack;q=0.1")
+    assert not wants_msgpack("application/msgpack;q=0")
+    assert wants_msgpack("application/json;q=0.9, application/msgpack")
+    assert wants_msgpack("application/msgpack, */*;q=0.8")
+    assert wants_msgpack("*/*;q=0.9, application/json;q=0.1, application/msgpack;q=0.5")
+    response = ResponseEncoder().apply(FakeResponse(payload), accept="application/msgpack")
+    assert response.mimetype == "application/msgpack" and "Accept" in response.vary
+    assert response_encoding.msgpack.unpackb(response.get_data(), raw=False) == payload
+    assert len(response.get_data()) < len(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+    print("Test 4 completato con successo: MessagePack su richiesta del client.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test codifica delle risposte...")
+    test_negotiation()
+    test_only_large_responses_are_compressed()
+    test_streamed_response_is_compressed_by_chunks()
+    test_msgpack_on_request()
+    print("Tutti i test completati con successo!")
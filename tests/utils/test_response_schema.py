@@ -0,0 +1,197 @@
+"""
+File:	/tests/utils/test_response_schema.py
+-----
+Test schema di risposta neutro e adattatore json_schema
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 3:55:44 am
+-----
+Last Modified: 	October 19th 2026 4:32:01 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import json
+import tempfile
+import importlib.util
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+# Aggiunge la root del progetto al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+WEB_API_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'web_api'))
+# LLMChatAPI richiede Flask e ai_prompts/technical_prompt.py (vedi README, configurazione)
+APP_AVAILABLE = (
+    importlib.util.find_spec("flask") is not None
+    and os.path.exists(os.path.join(WEB_API_DIR, "ai_prompts", "technical_prompt.py"))
+)
+
+from web_api.ai_prompts.system_prompt import (
+    create_response_schema,
+    schema_to_json_schema,
+    create_response_format,
+)
+
+
+def test_schema_is_plain_dict():
+    schema = create_response_schema(["Gestures/Hey_(7)"], ["ACT_DANCE"])
+
+    assert schema["properties"]["action"]["enum"] == ["ACT_DANCE", "NO_ACTION"]
+    movements = schema["properties"]["chunks"]["items"]["properties"]["movements"]
+    assert movements["items"]["enum"] == ["Gestures/Hey_(7)"]
+    # Lo schema neutro non richiede google-genai
+    assert "google.genai" not in sys.modules
+
+    print("Test 1 completato con successo: schema neutro senza google-genai.")
+
+
+def test_json_schema_adapter():
+    json_schema = schema_to_json_schema(create_response_schema([], ["ACT_DANCE"]))
+
+    assert json_schema["additionalProperties"] is False
+    assert json_schema["required"] == ["action", "chunks"]
+    chunk = json_schema["properties"]["chunks"]["items"]
+    assert chunk["additionalProperties"] is False
+    assert chunk["required"] == ["text", "movements"]
+    # Enum vuoto (nessun movimento configurato) omesso
+    assert chunk["properties"]["movements"]["items"] == {"type": "string"}
+
+    response_format = create_response_format(json_schema)
+    assert response_format["type"] == "json_schema"
+    assert response_format["json_schema"]["strict"] is True
+
+    print("Test 2 completato con successo: adattatore json_schema strict.")
+
+
+class FakeLiteLLM:
+    """LiteLLM finto: supporto allo schema per modello e completion registrate"""
+
+    def __init__(self, schema_support, failing=()):
+        self.schema_support = schema_support
+        self.failing = set(failing)
+        self.calls = []
+
+    def supports_response_schema(self, model):
+        support = self.schema_support.get(model)
+        if isinstance(support, Exception):
+            raise support
+        return support
+
+    def completion(self, model, messages, **kwargs):
+        self.calls.append((model, kwargs.get("response_format")))
+        if model in self.failing:
+            raise RuntimeError(f"{model} non disponibile")
+        content = json.dumps({"action": "NO_ACTION", "chunks": [{"text": "Ciao", "movements": []}]})
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(total_tokens=10),
+        )
+
+
+@contextmanager
+def chat_api(fake, **env):
+    """LLMChatAPI con LiteLLM finto e variabili d'ambiente temporanee"""
+    env = {
+        "GOOGLE_API_KEY": "test-key",
+        "OPENROUTER_API_KEY": "test-key",
+        "LLM_HTTP_POOL": "false",
+        "SESSION_SNAPSHOT": "false",
+        **env,
+    }
+    saved = {name: os.environ.get(name) for name in env}
+    os.environ.update(env)
+    sys.path.insert(0, WEB_API_DIR)
+    try:
+        from utils import llm_chat_api
+        llm_chat_api._litellm = fake
+        with tempfile.TemporaryDirectory() as logs_dir:
+            api = llm_chat_api.LLMChatAPI(logs_dir=logs_dir)
+            try:
+                yield api
+            finally:
+                api.logger.close()
+    finally:
+        sys.path.remove(WEB_API_DIR)
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def test_response_format_per_model():
+    if not APP_AVAILABLE:
+        print("Test 3 saltato: Flask o ai_prompts/technical_prompt.py non disponibili.")
+        return
+    fake = FakeLiteLLM({
+        "gemini/schema": True,
+        "openrouter/json-object": False,
+        "openrouter/sconosciuto": RuntimeError("modello non in elenco"),
+    })
+    with chat_api(fake, LLM_MODEL="gemini/schema", LLM_FALLBACK_MODELS="") as api:
+        schema_format = api._get_response_format("gemini/schema")
+        assert schema_format["type"] == "json_schema"
+        assert schema_format["json_schema"]["strict"] is True
+        actions = schema_format["json_schema"]["schema"]["properties"]["action"]
+        assert "NO_ACTION" in actions["enum"]
+        # Provider senza json_schema (o supporto non verificabile): json_object
+        assert api._get_response_format("openrouter/json-object") == {"type": "json_object"}
+        assert api._get_response_format("openrouter/sconosciuto") == {"type": "json_object"}
+
+        # Il supporto viene verificato una sola volta per modello
+        fake.schema_support["gemini/schema"] = False
+        assert api._get_response_format("gemini/schema")["type"] == "json_schema"
+
+    with chat_api(fake, LLM_MODEL="gemini/schema", LLM_STRUCTURED_OUTPUT="off") as api:
+        assert api._get_response_format("gemini/schema") == {"type": "json_object"}
+    with chat_api(fake, LLM_MODEL="gemini/schema", LLM_STRUCTURED_OUTPUT="on") as api:
+        assert api._get_response_format("openrouter/json-object")["type"] == "json_schema"
+
+    print("Test 3 completato con successo: response_format scelto in base al modello.")
+
+
+def test_fallback_model_gets_json_object():
+    if not APP_AVAILABLE:
+        print("Test 4 saltato: Flask o ai_prompts/technical_prompt.py non disponibili.")
+        return
+    fake = FakeLiteLLM(
+        {"gemini/schema": True, "openrouter/json-object": False},
+        failing={"gemini/schema"},
+    )
+    with chat_api(fake, LLM_MODEL="gemini/schema", LLM_FALLBACK_MODELS="openrouter/json-object") as api:
+        model, _ = api._call_llm([{"role": "user", "content": "ciao"}], structured_output=True)
+
+    # Il modello principale riceve lo schema strict, il fallback che non lo supporta json_object
+    assert model == "openrouter/json-object"
+    assert fake.calls[0][0] == "gemini/schema" and fake.calls[0][1]["type"] == "json_schema"
+    assert fake.calls[-1] == ("openrouter/json-object", {"type": "json_object"})
+
+    print("Test 4 completato con successo: json_object per il modello di fallback senza json_schema.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test schema di risposta...")
+    test_schema_is_plain_dict()
+    test_json_schema_adapter()
+    test_response_format_per_model()
+    test_fallback_model_gets_json_object()
+    print("Tutti i test completati con successo!")
@@ -0,0 +1,273 @@
+"""
+File:	/tests/utils/test_session_snapshot.py
+-----
+Test snapshot e ripristino delle sessioni
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:13:09 am
+-----
+Last Modified: 	October 19th 2026 4:48:45 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import tempfile
+import threading
+
+# Aggiunge la root del progetto al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from web_api.utils.session_snapshot import SessionSnapshot, SnapshotLockedError, fcntl
+from web_api.utils.chat_history import ChatHistory
+
+
+def crash(snapshot):
+    """Simula un crash: il journal viene chiuso senza flush della coda né checkpoint"""
+    snapshot._journal.close()
+
+
+def test_restore_after_restart():
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot = SessionSnapshot(directory)
+        snapshot.record_personality("w1-a", "pirata")
+        snapshot.record_message("w1-a", "user", "Ciao NAO")
+        snapshot.record_message("w1-a", "assistant", '{"chunks":[{"text":"Ahoy!"}]}')
+        snapshot.record_message("w1-b", "user", "Che ore sono?")
+
+        # Le registrazioni sono solo accodate: il journal viene scritto dal flush
+        assert os.path.getsize(snapshot.journal_path) == 0
+        snapshot.close()
+
+        restored = SessionSnapshot(directory)
+        chats = restored.restore()
+        assert list(chats) == ["w1-a", "w1-b"]
+        assert chats["w1-a"]["personality"] == "pirata"
+        assert chats["w1-a"]["count"] == 2
+        assert restored.load_history("w1-a") == [
+            ("user", "Ciao NAO"), ("assistant", '{"chunks":[{"text":"Ahoy!"}]}')
+        ]
+        restored.close()
+
+    print("Test 1 completato con successo: sessioni e personalità ripristinate al riavvio.")
+
+
+def test_crash_replays_tail_and_drops_truncated_line():
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot = SessionSnapshot(directory)
+        snapshot.record_message("w1-a", "user", "primo")
+        snapshot.flush()
+        snapshot.checkpoint()
+        # Dopo il checkpoint: un record scritto e una riga troncata dal crash
+        snapshot.record_message("w1-a", "user", "secondo")
+        snapshot.flush()
+        snapshot._journal.write(b'{"op":"m","c":"w1-a","r":"user","t":"ter')
+        crash(snapshot)
+
+        restored = SessionSnapshot(directory)
+        chats = restored.restore()
+        assert chats["w1-a"]["count"] == 2
+        assert restored.load_history("w1-a") == [("user", "primo"), ("user", "secondo")]
+
+        # La riga troncata è stata rimossa: i nuovi record restano leggibili
+        restored.record_message("w1-a", "user", "terzo")
+        restored.close()
+        final = SessionSnapshot(directory)
+        final.restore()
+        assert [text for _, text in final.load_history("w1-a")] == ["primo", "secondo", "terzo"]
+        final.close()
+
+    print("Test 2 completato con successo: coda del journal rieseguita, riga troncata scartata.")
+
+
+def test_end_reset_and_clear():
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot = SessionSnapshot(directory)
+        snapshot.record_message("w1-a", "user", "da chiudere")
+        snapshot.record_end("w1-a")
+        snapshot.record_message("w1-b", "user", "prima del reset")
+        snapshot.record_personality("w1-b", "prof")
+        snapshot.record_reset("w1-b")
+        snapshot.record_message("w1-b", "user", "dopo il reset")
+        snapshot.close()
+
+        restored = SessionSnapshot(directory)
+        chats = restored.restore()
+        assert list(chats) == ["w1-b"]
+        assert chats["w1-b"]["personality"] == "prof"
+        assert restored.load_history("w1-b") == [("user", "dopo il reset")]
+
+        restored.record_clear()
+        restored.close()
+        final = SessionSnapshot(directory)
+        assert final.restore() == {}
+        final.close()
+
+    print("Test 3 completato con successo: chiusura, reset e cancellazione registrati.")
+
+
+def test_compaction_keeps_live_chats():
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot = SessionSnapshot(directory, compact_min_bytes=1024)
+        for i in range(50):
+            snapshot.record_message("w1-old", "user", f"messaggio lungo numero {i} " * 4)
+        snapshot.record_message("w1-live", "user", "resta")
+        snapshot.record_end("w1-old")
+        snapshot.flush()
+        before = os.path.getsize(snapshot.journal_path)
+        snapshot.checkpoint()
+
+        assert snapshot.get_stats()["compactions"] == 1
+        assert os.path.getsize(snapshot.journal_path) < before / 10
+        assert snapshot.load_history("w1-live") == [("user", "resta")]
+        snapshot.close()
+
+        restored = SessionSnapshot(directory)
+        assert list(restored.restore()) == ["w1-live"]
+        assert restored.load_history("w1-live") == [("user", "resta")]
+        restored.close()
+
+    print("Test 4 completato con successo: journal compattato senza perdere le chat attive.")
+
+
+def test_lazy_history():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return [("user", "vecchio"), ("assistant", '{"chunks":[]}')]
+
+    history = ChatHistory(loader=loader, length=2)
+    # len() non richiede il caricamento
+    assert len(history) == 2 and not history.loaded and not calls
+
+    history.append("user", "nuovo")
+    assert calls == [1] and history.loaded
+    assert [m["content"] for m in history] == ["vecchio", '{"chunks":[]}', "nuovo"]
+    assert len(history) == 3
+
+    print("Test 5 completato con successo: cronologia caricata solo al primo accesso.")
+
+
+def test_journal_lock_between_processes():
+    if fcntl is None:
+        print("Test 6 saltato: lock tra processi non disponibile su questa piattaforma.")
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot = SessionSnapshot(directory, shard="w1")
+        try:
+            SessionSnapshot(directory, shard="w1")
+            assert False, "Il secondo snapshot sullo stesso journal doveva fallire"
+        except SnapshotLockedError:
+            pass
+        # Shard diversi usano journal diversi
+        other = SessionSnapshot(directory, shard="w2")
+        other.close()
+        snapshot.close()
+
+    print("Test 6 completato con successo: un solo processo per journal.")
+
+
+def test_dead_bytes_drive_compaction():
+    with tempfile.TemporaryDirectory() as directory:
+        # Solo chat attive con messaggi brevi: il journal è quasi tutto overhead JSON,
+        # ma nessun byte è recuperabile e la compattazione non deve partire
+        snapshot = SessionSnapshot(directory, compact_min_bytes=1024)
+        for i in range(50):
+            snapshot.record_message("w1-a", "user", f"m{i}")
+        snapshot.flush()
+        snapshot.checkpoint()
+        assert snapshot.get_stats()["dead_bytes"] == 0
+        assert snapshot.get_stats()["compactions"] == 0
+
+        # Personalità sostituite e reset rendono inutili i record precedenti
+        for name in ("pirata", "prof", "pirata", "prof"):
+            snapshot.record_personality("w1-a", name)
+        snapshot.record_reset("w1-a")
+        snapshot.flush()
+        size = os.path.getsize(snapshot.journal_path)
+        dead = snapshot.get_stats()["dead_bytes"]
+        assert dead * 2 > size
+        # Chiusura senza compattazione, per verificare il conteggio dopo il riavvio
+        snapshot.compact_min_bytes = 0
+        snapshot.close()
+
+        # Il conteggio sopravvive al riavvio (indice più coda del journal)
+        restored = SessionSnapshot(directory, compact_min_bytes=0)
+        assert restored.restore()["w1-a"]["personality"] == "prof"
+        assert restored.get_stats()["dead_bytes"] == dead
+        restored.compact_min_bytes = 1024
+        restored.record_message("w1-a", "user", "dopo")
+        restored.flush()
+        restored.checkpoint()
+        assert restored.get_stats()["compactions"] == 1
+        assert restored.get_stats()["dead_bytes"] == 0
+        restored.close()
+
+        final = SessionSnapshot(directory)
+        chats = final.restore()
+        assert chats["w1-a"]["personality"] == "prof"
+        assert final.load_history("w1-a") == [("user", "dopo")]
+        final.close()
+
+    print("Test 7 completato con successo: compattazione decisa dai byte non più necessari.")
+
+
+def test_iter_messages_for_search_index():
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot = SessionSnapshot(directory)
+        snapshot.record_message("w1-a", "user", "uno")
+        snapshot.record_message("w1-b", "user", "due")
+        snapshot.record_message("w1-a", "assistant", "tre")
+        snapshot.record_message("w1-c", "user", "chiusa")
+        snapshot.record_end("w1-c")
+        snapshot.close()
+
+        restored = SessionSnapshot(directory)
+        counts = {chat_id: info["count"] for chat_id, info in restored.restore().items()}
+        # Messaggi arrivati dopo il ripristino: non fanno parte dei count
+        restored.record_message("w1-a", "user", "nuovo")
+        restored.flush()
+
+        messages = restored.iter_messages(counts)
+        assert next(messages) == ("w1-a", 0, "user", "uno")
+        # Durante la lettura il lock del journal è libero: la scrittura di un altro thread non attende
+        writer = threading.Thread(target=lambda: (restored.record_message("w1-b", "user", "altro"), restored.flush()))
+        writer.start()
+        writer.join(2)
+        assert not writer.is_alive()
+        assert list(messages) == [("w1-b", 0, "user", "due"), ("w1-a", 1, "assistant", "tre")]
+        assert restored.get_stats()["lazy_loads"] == 0
+        restored.close()
+
+    print("Test 8 completato con successo: messaggi delle chat ripristinate letti in ordine di journal.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test snapshot sessioni...")
+    test_restore_after_restart()
+    test_crash_replays_tail_and_drops_truncated_line()
+    test_end_reset_and_clear()
+    test_compaction_keeps_live_chats()
+    test_lazy_history()
+    test_journal_lock_between_processes()
+    test_dead_bytes_drive_compaction()
+    test_iter_messages_for_search_index()
+    print("Tutti i test completati con successo!")
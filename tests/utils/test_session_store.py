@@ -0,0 +1,148 @@
+"""
+File:	/tests/utils/test_session_store.py
+-----
+Test lock per chat e politiche per i turni concorrenti
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:05:53 am
+-----
+Last Modified: 	October 19th 2026 4:05:53 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import time
+import threading
+
+# Aggiunge la root del progetto al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from web_api.utils.session_store import SessionStore, ChatBusyError
+
+
+def test_wait_policy_serializes_turns():
+    store = SessionStore(busy_policy="wait", lock_timeout=5)
+    history = []
+
+    def turn(label):
+        with store.lock("chat-1"):
+            # Simula un turno: domanda, chiamata lenta al modello, risposta
+            history.append(("user", label))
+            time.sleep(0.05)
+            history.append(("assistant", label))
+
+    threads = [threading.Thread(target=turn, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # Domanda e risposta di ogni turno restano adiacenti
+    for i in range(0, len(history), 2):
+        assert history[i][0] == "user" and history[i + 1] == ("assistant", history[i][1])
+    stats = store.get_stats()
+    assert stats["turns"] == 4 and stats["waited"] == 3 and stats["rejected"] == 0
+
+    print("Test 1 completato con successo: turni concorrenti serializzati.")
+
+
+def test_reject_policy():
+    store = SessionStore(busy_policy="reject")
+    started, release = threading.Event(), threading.Event()
+
+    def slow_turn():
+        with store.lock("chat-1"):
+            started.set()
+            release.wait(2)
+
+    worker = threading.Thread(target=slow_turn)
+    worker.start()
+    started.wait(2)
+
+    assert store.is_busy("chat-1")
+    try:
+        with store.lock("chat-1"):
+            assert False, "Il turno concorrente doveva essere rifiutato"
+    except ChatBusyError as e:
+        assert e.chat_id == "chat-1" and not e.waited
+
+    # Le altre chat non sono bloccate
+    with store.lock("chat-2"):
+        pass
+
+    release.set()
+    worker.join()
+    assert store.get_stats()["rejected"] == 1
+
+    print("Test 2 completato con successo: turno concorrente rifiutato con reject.")
+
+
+def test_wait_timeout():
+    store = SessionStore(busy_policy="wait", lock_timeout=0.05)
+    with store.lock("chat-1"):
+        result = []
+        worker = threading.Thread(target=lambda: result.append(_try_lock(store, "chat-1")))
+        worker.start()
+        worker.join()
+    assert result == ["busy"]
+
+    print("Test 3 completato con successo: attesa scaduta segnalata come chat occupata.")
+
+
+def _try_lock(store, chat_id):
+    try:
+        with store.lock(chat_id):
+            return "ok"
+    except ChatBusyError:
+        return "busy"
+
+
+def test_locks_are_released():
+    store = SessionStore()
+    for i in range(100):
+        with store.lock(f"chat-{i}"):
+            pass
+    try:
+        with store.lock("chat-x"):
+            raise RuntimeError("errore nel turno")
+    except RuntimeError:
+        pass
+
+    # Nessun lock resta in memoria dopo la fine dei turni (anche in caso di errore)
+    assert store._locks == {}
+    assert not store.is_busy("chat-x")
+
+    try:
+        SessionStore(busy_policy="coalesce")
+        assert False, "Politica non valida accettata"
+    except ValueError:
+        pass
+
+    print("Test 4 completato con successo: lock rilasciati e mappa non crescente.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test lock per chat...")
+    test_wait_policy_serializes_turns()
+    test_reject_policy()
+    test_wait_timeout()
+    test_locks_are_released()
+    print("Tutti i test completati con successo!")
@@ -0,0 +1,106 @@
+"""
+File:	/tests/utils/test_stt.py
+-----
+Test riconoscimento del formato per la trascrizione in streaming
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:41:54 am
+-----
+Last Modified: 	October 19th 2026 4:41:54 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+
+import sys
+import os
+import io
+import wave
+
+# Aggiunge la root del progetto al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from web_api.utils.stt import _is_pcm16_mono_wav, _read_up_to, WAV_HEADER_PROBE_BYTES
+
+
+def wav_bytes(channels=1, sampwidth=2, framerate=16000, frames=160):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(sampwidth)
+        wf.setframerate(framerate)
+        wf.writeframes(b"\x00" * frames * channels * sampwidth)
+    return buffer.getvalue()
+
+
+class SlowStream:
+    """Stream che restituisce al massimo 5 byte per read (come un body a pezzi)"""
+
+    def __init__(self, data):
+        self._data = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self._data.read(min(size, 5) if size and size > 0 else 5)
+
+
+def test_wav_format_probe():
+    assert _is_pcm16_mono_wav(wav_bytes())
+    # Stereo, 8bit e 24bit vanno convertiti con ffmpeg
+    assert not _is_pcm16_mono_wav(wav_bytes(channels=2))
+    assert not _is_pcm16_mono_wav(wav_bytes(sampwidth=1))
+    assert not _is_pcm16_mono_wav(wav_bytes(sampwidth=3))
+    # Non WAV o intestazione troncata prima del chunk "fmt "
+    assert not _is_pcm16_mono_wav(b"OggS" + b"\x00" * 40)
+    assert not _is_pcm16_mono_wav(wav_bytes()[:20])
+
+    print("Test 1 completato con successo: solo il WAV PCM mono 16bit va diretto a Vosk.")
+
+
+def test_fmt_chunk_after_other_chunks():
+    data = wav_bytes()
+    # Chunk LIST di lunghezza dispari (con padding) prima di "fmt "
+    extra = b"LIST" + (7).to_bytes(4, "little") + b"INFOabc" + b"\x00"
+    riff_size = int.from_bytes(data[4:8], "little") + len(extra)
+    data = data[:4] + riff_size.to_bytes(4, "little") + data[8:12] + extra + data[12:]
+    assert _is_pcm16_mono_wav(data)
+
+    stereo = wav_bytes(channels=2)
+    stereo = stereo[:12] + extra + stereo[12:]
+    assert not _is_pcm16_mono_wav(stereo)
+
+    print("Test 2 completato con successo: chunk \"fmt \" trovato dopo altri chunk.")
+
+
+def test_read_up_to_partial_reads():
+    data = wav_bytes(frames=4000)
+    stream = SlowStream(data)
+    head = _read_up_to(stream, WAV_HEADER_PROBE_BYTES)
+    assert head == data[:WAV_HEADER_PROBE_BYTES]
+    # Stream più corto: restituisce quanto disponibile
+    assert _read_up_to(SlowStream(b"RIFF"), 100) == b"RIFF"
+
+    print("Test 3 completato con successo: intestazione letta anche con read parziali.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test formato audio STT...")
+    test_wav_format_probe()
+    test_fmt_chunk_after_other_chunks()
+    test_read_up_to_partial_reads()
+    print("Tutti i test completati con successo!")
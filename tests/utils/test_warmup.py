@@ -0,0 +1,105 @@
+"""
+File:	/tests/utils/test_warmup.py
+-----
+Test warm-up in background dei componenti
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 3:55:09 am
+-----
+Last Modified: 	October 19th 2026 4:55:58 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+------------------------------------------------------------------------------
+"""
+
+import sys
+import os
+import threading
+
+# Aggiunge la root del progetto al path per importare i moduli in modo corretto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from web_api.utils.warmup import WarmupManager
+
+
+def test_wait_until_ready():
+    release = threading.Event()
+    warmup = WarmupManager()
+    warmup.add("llm", lambda: release.wait(5))
+    warmup.start()
+
+    # Il componente è ancora in caricamento: l'attesa scade
+    assert not warmup.wait("llm", timeout=0.05)
+    assert warmup.get_status()["llm"]["status"] == "running"
+
+    release.set()
+    assert warmup.wait("llm", timeout=5)
+    assert warmup.is_ready("llm")
+
+    print("Test 1 completato con successo: attesa del componente in warm-up.")
+
+
+def test_failed_components():
+    def broken():
+        raise ImportError("No module named 'vosk'")
+
+    warmup = WarmupManager()
+    warmup.add("stt", broken)
+    warmup.add("tts", lambda: False)
+    warmup.add("llm", lambda: None)
+    warmup.run()
+
+    status = warmup.get_status()
+    assert status["stt"]["status"] == "failed"
+    assert "vosk" in status["stt"]["error"]
+    assert status["tts"]["status"] == "failed"
+    assert status["llm"]["status"] == "ready"
+    # Un componente fallito non blocca le richieste: il warm-up è comunque terminato
+    assert warmup.wait("stt", timeout=0)
+    assert not warmup.is_ready()
+
+    print("Test 2 completato con successo: componenti falliti.")
+
+
+def test_components_are_independent():
+    release = threading.Event()
+    warmup = WarmupManager()
+    # Il primo componente registrato resta bloccato (es. un provider LLM lento)
+    warmup.add("llm", lambda: release.wait(5))
+    warmup.add("stt", lambda: None)
+    warmup.start()
+
+    try:
+        # Ogni componente ha il proprio thread: l'attesa di stt non dipende da llm
+        assert warmup.wait("stt", timeout=2)
+        assert warmup.is_ready("stt")
+        assert warmup.get_status()["llm"]["status"] == "running"
+    finally:
+        release.set()
+    assert warmup.wait("llm", timeout=5)
+    assert warmup.is_ready()
+
+    print("Test 3 completato con successo: componenti indipendenti.")
+
+
+if __name__ == "__main__":
+    print("Esecuzione test warm-up...")
+    test_wait_until_ready()
+    test_failed_components()
+    test_components_are_independent()
+    print("Tutti i test completati con successo!")
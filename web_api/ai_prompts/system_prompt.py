@@ -39,7 +39,6 @@ The following attribution requirements apply to this work:
 For full Additional Terms see the LICENSE file.
 ------------------------------------------------------------------------------
 """
-from google import genai
 
 # AGPL Section 7(b) Protected Attribution - DO NOT MODIFY
 PROTECTED_ATTRIBUTION = {
@@ -73,40 +72,110 @@ GENERATION_CONFIG_BASE = {
     "response_mime_type": "application/json",
 }
 
+# Istruzioni per la richiesta di correzione di un JSON malformato (singolo tentativo)
+JSON_REPAIR_PROMPT = """
+Il testo seguente doveva essere un oggetto JSON con le chiavi "action" (stringa) e
+"chunks" (lista di oggetti con "text" stringa e "movements" lista di stringhe), ma non è valido.
+Restituisci SOLO il JSON corretto, senza commenti, senza markdown e senza testo aggiuntivo.
+Non cambiare il contenuto delle frasi: correggi solo la sintassi.
+"""
+
 # Funzione helper per creare lo schema
 def create_response_schema(movements_list, actions_list):
+    """
+    Crea lo schema di risposta in forma neutra rispetto al backend: un dizionario
+    JSON Schema (type, description, enum, items, properties, required).
+    Gli adattatori to_gemini_schema e schema_to_json_schema lo convertono per
+    google-genai (types.Schema) e per response_format json_schema (LiteLLM/OpenAI).
+    """
     # Aggiungi NO_ACTION alla lista delle opzioni valide
     full_actions_enum = actions_list + ["NO_ACTION"]
-    
-    return genai.types.Schema(
-            type = genai.types.Type.OBJECT,
-            description = "Schema di risposta per il robot NAO",
-            required = ["action", "chunks"], 
-            properties = {
-                "action": genai.types.Schema(
-                    type = genai.types.Type.STRING,
-                    description = "L'azione complessa da eseguire o NO_ACTION",
-                    enum = full_actions_enum,
-                ),
-                "chunks": genai.types.Schema(
-                    type = genai.types.Type.ARRAY,
-                    description = "Lista di frasi e movimenti associati",
-                    items = genai.types.Schema(
-                        type = genai.types.Type.OBJECT,
-                        required = ["text", "movements"],
-                        properties = {
-                            "text": genai.types.Schema(
-                                type = genai.types.Type.STRING,
-                            ),
-                            "movements": genai.types.Schema(
-                                type = genai.types.Type.ARRAY,
-                                items = genai.types.Schema(
-                                    type = genai.types.Type.STRING,
-                                    enum = movements_list,
-                                ),
-                            ),
+
+    return {
+        "type": "object",
+        "description": "Schema di risposta per il robot NAO",
+        "required": ["action", "chunks"],
+        "properties": {
+            "action": {
+                "type": "string",
+                "description": "L'azione complessa da eseguire o NO_ACTION",
+                "enum": full_actions_enum,
+            },
+            "chunks": {
+                "type": "array",
+                "description": "Lista di frasi e movimenti associati",
+                "items": {
+                    "type": "object",
+                    "required": ["text", "movements"],
+                    "properties": {
+                        "text": {
+                            "type": "string",
+                        },
+                        "movements": {
+                            "type": "array",
+                            "items": {
+                                "type": "string",
+                                "enum": movements_list,
+                            },
                         },
-                    ),
-                ),
+                    },
+                },
             },
-        )
\ No newline at end of file
+        },
+    }
+
+
+# Adattatore per il backend Gemini (google-genai): importato solo se usato
+def to_gemini_schema(schema):
+    """Converte lo schema neutro in genai.types.Schema (backend GeminiChatAPI)"""
+    from google.genai import types
+
+    return types.Schema(
+        type=types.Type[schema["type"].upper()],
+        description=schema.get("description"),
+        enum=schema.get("enum"),
+        required=schema.get("required"),
+        items=to_gemini_schema(schema["items"]) if "items" in schema else None,
+        properties={
+            name: to_gemini_schema(prop) for name, prop in schema["properties"].items()
+        } if "properties" in schema else None,
+    )
+
+
+# Adattatore per response_format json_schema (LiteLLM, OpenAI, Gemini via LiteLLM, ecc.)
+def schema_to_json_schema(schema):
+    """
+    Converte lo schema neutro in un dizionario JSON Schema per la modalità strict:
+    gli oggetti sono chiusi (additionalProperties = False) e le liste enum vuote
+    vengono omesse perché non valide.
+    """
+    json_schema = {}
+
+    if schema.get("type"):
+        json_schema["type"] = schema["type"]
+    if schema.get("description"):
+        json_schema["description"] = schema["description"]
+    if schema.get("enum"):
+        json_schema["enum"] = list(schema["enum"])
+    if schema.get("items") is not None:
+        json_schema["items"] = schema_to_json_schema(schema["items"])
+    if schema.get("properties"):
+        json_schema["properties"] = {
+            name: schema_to_json_schema(prop) for name, prop in schema["properties"].items()
+        }
+        json_schema["required"] = list(schema.get("required") or [])
+        json_schema["additionalProperties"] = False
+
+    return json_schema
+
+
+def create_response_format(json_schema, name="nao_response"):
+    """Costruisce il parametro response_format (json_schema, strict) per LiteLLM"""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": name,
+            "schema": json_schema,
+            "strict": True,
+        },
+    }
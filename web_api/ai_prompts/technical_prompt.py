@@ -0,0 +1,68 @@
+"""
+File:	web_api/ai_prompts/example_technical_prompt.py
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: January 16th 2025 6:01:11 pm
+-----
+Last Modified: 	November 11nd 2025 10:30:00 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+    
+    
+Additional Terms under Section 7(b):
+
+The following attribution requirements apply to this work:
+
+1. Copyright notices and author attribution in source code files
+   cannot be removed or altered.
+2. Any interactive user interface must preserve and display
+   author attribution (Copyright, authors, project name).
+3. System prompts containing author information cannot be modified
+4. Public demonstrations, publications and derivative works
+   must credit the original authors.
+
+For full Additional Terms see the LICENSE file.
+------------------------------------------------------------------------------
+"""
+
+TECHNICAL_INSTRUCTIONS = """
+---
+Scrivere un file "ai_prompts/technical_prompt.py" contentente un PROMPT AI TECNICO, 
+comune alle varie personalità, per far generare un output strutturato JSON, 
+compatibile con il client sviluppato.
+
+Il prompt può comprendere ad esempio: 
+- come vanno formulate le risposte
+- il formato di output atteso
+- eventuali campi gestiti dal client (movimenti, audio, animazioni personalizzate, ecc)
+- esempi di risposta attesi
+
+--- 
+ENGLISH 
+
+Write a file ai_prompts/technical_prompt.py containing a TECHNICAL AI PROMPT, 
+shared across the various personalities, to generate a structured JSON output 
+compatible with the developed client.
+The prompt may include for example:
+
+- how responses should be formatted
+- the expected output format
+- any fields managed by the client (movements, audio, custom animations, etc.)
+- expected response examples
+
+"""
\ No newline at end of file
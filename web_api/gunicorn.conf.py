@@ -0,0 +1,66 @@
+"""
+File:	/web_api/gunicorn.conf.py
+-----
+Configurazione gunicorn: indice stabile per worker (shard dei chat_id e journal
+delle sessioni)
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:37:08 am
+-----
+Last Modified: 	October 19th 2026 4:37:08 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Additional Terms under Section 7(b):
+
+The following attribution requirements apply to this work:
+
+1. Copyright notices and author attribution in source code files
+   cannot be removed or altered.
+2. Any interactive user interface must preserve and display
+   author attribution (Copyright, authors, project name).
+3. System prompts containing author information cannot be modified
+4. Public demonstrations, publications and derivative works
+   must credit the original authors.
+
+For full Additional Terms see the LICENSE file.
+------------------------------------------------------------------------------
+
+Caricato automaticamente da gunicorn avviato nella directory web_api
+(es. gunicorn -w 4 -k gthread --threads 8 main:app).
+Ogni worker riceve in WORKER_INDEX un indice da 0 a N-1: un worker riavviato
+(crash, max_requests) riprende l'indice di quello che sostituisce, quindi lo
+shard dei chat_id (CHAT_ID_SHARD + indice) e il journal delle sessioni restano gli stessi.
+"""
+
+import os
+
+
+def pre_fork(server, worker):
+    """Assegna al nuovo worker il primo indice non usato dai worker attivi"""
+    used = {getattr(w, "worker_index", None) for w in server.WORKERS.values()}
+    index = 0
+    while index in used:
+        index += 1
+    worker.worker_index = index
+
+
+def post_fork(server, worker):
+    """Nel processo del worker, prima del caricamento dell'app"""
+    os.environ["WORKER_INDEX"] = str(worker.worker_index)
+    server.log.info(f"Worker {worker.pid}: WORKER_INDEX={worker.worker_index}")
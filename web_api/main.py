@@ -5,7 +5,7 @@ REST API - gestisce le rotte di GeminiChatAPI per una caht con NAO Robot e Gemin
 Usa due endpoint con metodo POST per tutte le operazioni.
 Le diverse azioni sono specificate nel campo action del JSON inviato.
 /gemini/chat  azioni: talk, end, hystory
-/gemini/admin azioni: list-chats, delete-chats
+/gemini/admin azioni: list-chats, export-chats, delete-chats, history, stats, search
 -----
 @author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
 @copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
@@ -51,7 +51,10 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 # from utils.gemini_chat_api import GeminiChatAPI
 from utils.llm_chat_api import LLMChatAPI
-from utils.stt import STT
+from utils.admission import AdmissionRejected
+from utils.stt import STT, RAW_AUDIO_MIMETYPES
+from utils.warmup import WarmupManager
+from utils.response_encoding import ResponseEncoder
 
 
 
@@ -79,17 +82,126 @@ def create_app():
     """
     app = Flask(__name__)
     CORS(app)  # Abilita CORS per tutte le routes
+    # JSON compatto e UTF-8 (le lettere accentate non diventano sequenze \uXXXX)
+    app.json.compact = True
+    app.json.ensure_ascii = False
+
+    # Compressione gzip/brotli delle risposte grandi e MessagePack per il robot (Accept: application/msgpack)
+    encoder = ResponseEncoder(
+        min_bytes=int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024")),
+        gzip_level=int(os.getenv("RESPONSE_GZIP_LEVEL", "6")),
+        brotli_quality=int(os.getenv("RESPONSE_BROTLI_QUALITY", "5")),
+        compression=os.getenv("RESPONSE_COMPRESSION", "true").lower() == "true",
+        msgpack_enabled=os.getenv("RESPONSE_MSGPACK", "true").lower() == "true",
+    )
+
+    @app.after_request
+    def encode_response(response):
+        return encoder.apply(
+            response,
+            accept_encoding=request.headers.get("Accept-Encoding", ""),
+            accept=request.headers.get("Accept", ""),
+        )
 
     # Crea l'istanza del gestore API
     # chat_api = GeminiChatAPI()
     chat_api = LLMChatAPI()
-
-    # Inizializza sistema STT Vosk
-    stt = STT(logger=chat_api.logger)
-    
-    # Stampa messaggio di errore se Vosk non è disponibile
-    if not stt.is_available and stt.error_message:
-        print(stt.error_message)
+    app.extensions["chat_api"] = chat_api
+
+    # Inizializza sistema STT Vosk (il modello viene caricato nel warm-up)
+    stt = STT(logger=chat_api.logger, lazy=True)
+
+    def load_stt():
+        # Stampa messaggio di errore se Vosk non è disponibile
+        if not stt.load():
+            if stt.error_message:
+                print(stt.error_message)
+            return False
+        # Decodifica di una clip di silenzio: la prima trascrizione non paga il caricamento a freddo
+        return stt.warm_up()
+
+    # Warm-up in background, un thread per componente: il server risponde subito, le richieste che arrivano
+    # prima che il componente necessario sia pronto attendono fino a WARMUP_WAIT_TIMEOUT
+    warmup = WarmupManager(logger=chat_api.logger)
+    warmup.add("stt", load_stt)
+    warmup.add("llm", chat_api.warm_up)
+    # Indice di ricerca delle chat ripristinate dallo snapshot (lettura del journal dopo l'avvio)
+    warmup.add("search", chat_api.index_restored_chats)
+    warmup.start()
+    app.extensions["warmup"] = warmup
+    warmup_timeout = float(os.getenv("WARMUP_WAIT_TIMEOUT", "60"))
+    # Componenti che devono essere pronti perché /ready risponda 200
+    ready_required = [c.strip() for c in os.getenv("READY_REQUIRED", "llm,stt").split(",") if c.strip()]
+
+    def wait_ready(*components):
+        """Attende il warm-up dei componenti; risposta 503 se non terminato in tempo"""
+        for component in components:
+            if not warmup.wait(component, warmup_timeout):
+                return jsonify({
+                    "error": f"Server in avvio: componente '{component}' non ancora pronto",
+                    "stage": "warmup",
+                    "success": False
+                }), 503
+        return None
+
+    def raw_audio_upload():
+        """True se il body è l'audio grezzo (application/octet-stream, audio/ogg, audio/wav...) e non multipart"""
+        return request.mimetype in RAW_AUDIO_MIMETYPES
+
+    def upload_fields():
+        """
+        Campi della richiesta audio: form per multipart/form-data; con l'audio grezzo
+        query string (?chat_id=...) o header X-<Campo> (X-Chat-Id, X-Recording-Start...).
+        Con l'audio grezzo request.form non viene letto: il body resta allo stream del decoder
+        """
+        if not raw_audio_upload():
+            return request.form
+        fields = {}
+        for name in ("chat_id", "request_id", "robot_id", "recording_start", "speech_detected"):
+            value = request.args.get(name) or request.headers.get("X-" + name.replace("_", "-").title())
+            if value:
+                fields[name] = value
+        return fields
+
+    def audio_source():
+        """
+        Audio della richiesta: (stream, None, None) per il body grezzo, (None, file, None)
+        per multipart, (None, None, risposta 400) se il file manca
+        """
+        if raw_audio_upload():
+            return request.stream, None, None
+        if 'audio' not in request.files:
+            return None, None, (jsonify({'success': False, 'error': 'Nessun file audio fornito'}), 400)
+        audio_file = request.files['audio']
+        if audio_file.filename == '':
+            return None, None, (jsonify({'success': False, 'error': 'Nome file non valido'}), 400)
+        return None, audio_file, None
+
+    def transcribe_upload(stream, audio_file, timing_metadata):
+        """Trascrive il body grezzo direttamente dallo stream, oppure il file multipart"""
+        if stream is not None:
+            return stt.transcribe_stream(stream, timing_metadata)
+        return stt.transcribe_ogg(audio_file, timing_metadata)
+
+    def robot_id_of(fields):
+        """Robot che invia la richiesta: campo robot_id (JSON o form) o header X-Robot-Id"""
+        return (fields or {}).get("robot_id") or request.headers.get("X-Robot-Id") or None
+
+    def stt_shed(rejected):
+        """Risposta 503 immediata per le rotte solo STT quando il budget STT è esaurito"""
+        chat_api.logger.log_warning(f"[ADMISSION] {rejected}")
+        chat_api.logger.log_event("shed", budget=rejected.budget, reason=rejected.reason,
+                                  retry_after_s=rejected.retry_after)
+        response = jsonify({
+            "success": False,
+            "error": "Server occupato, riprova tra poco",
+            "stage": "admission",
+            "budget": rejected.budget,
+            "shed": True,
+            "retry_after_s": rejected.retry_after
+        })
+        response.headers["Retry-After"] = rejected.retry_after_header
+        return response, 503
 
 
     @app.route("/chat", methods=["POST"])
@@ -101,6 +213,12 @@ def create_app():
 
         action = data["action"]
 
+        if action == "talk":
+            data["robot_id"] = robot_id_of(data)
+            not_ready = wait_ready("llm")
+            if not_ready:
+                return not_ready
+
         try:
             if action == "talk":
                 return chat_api.handle_talk_action(data)
@@ -125,11 +243,21 @@ def create_app():
 
         try:
             if action == "list-chats":
-                return chat_api.handle_admin_list_chats()
+                return chat_api.handle_admin_list_chats(data)
+            elif action == "export-chats":
+                return chat_api.handle_admin_export_chats()
             elif action == "delete-chats":
                 return chat_api.handle_admin_delete_chats()
             elif action == "history":
                 return chat_api.handle_history_action(data)
+            elif action == "stats":
+                return chat_api.handle_admin_stats()
+            elif action == "search":
+                # I messaggi delle chat ripristinate vengono indicizzati nel warm-up
+                not_ready = wait_ready("search")
+                if not_ready:
+                    return not_ready
+                return chat_api.handle_admin_search(data)
             else:
                 return jsonify({"error": f"Azione sconosciuta: {action}"}), 400
 
@@ -144,31 +272,46 @@ def create_app():
         Endpoint per Speech-to-Text con Vosk (offline)
         Richiede un file audio WAV mono 16bit come 'audio' in multipart/form-data
         """
-        return stt.handle_stt_request()
+        not_ready = wait_ready("stt")
+        if not_ready:
+            return not_ready
+        try:
+            with chat_api.admission["stt"].admit(robot_id_of(request.form)):
+                return stt.handle_stt_request()
+        except AdmissionRejected as e:
+            return stt_shed(e)
 
     @app.route("/stt/vosk/fast", methods=["POST"])
     def speech_to_text_vosk_fast():
         """
         Endpoint per Speech-to-Text con Vosk (offline) ottimizzato
         Accetta OGG (o altri formati), converte lato server e trascrive.
+        Il file può arrivare in multipart/form-data (campo 'audio') o come body grezzo
+        (application/octet-stream, audio/ogg, audio/wav) con i metadati in query string o header
         """
         # Verifica presenza file audio
-        if 'audio' not in request.files:
-            return jsonify({'success': False, 'error': 'Nessun file audio fornito'}), 400
-        
-        audio_file = request.files['audio']
-        if audio_file.filename == '':
-            return jsonify({'success': False, 'error': 'Nome file non valido'}), 400
+        stream, audio_file, missing = audio_source()
+        if missing:
+            return missing
 
         # Estrai metadata opzionali per Smart Trim
+        fields = upload_fields()
         timing_metadata = {}
-        if 'recording_start' in request.form:
-            timing_metadata['recording_start'] = request.form['recording_start']
-        if 'speech_detected' in request.form:
-             timing_metadata['speech_detected'] = request.form['speech_detected']
+        if 'recording_start' in fields:
+            timing_metadata['recording_start'] = fields['recording_start']
+        if 'speech_detected' in fields:
+            timing_metadata['speech_detected'] = fields['speech_detected']
+
+        not_ready = wait_ready("stt")
+        if not_ready:
+            return not_ready
 
-        # Usa la nuova funzione transcribe_ogg
-        success, result = stt.transcribe_ogg(audio_file, timing_metadata)
+        # Usa transcribe_ogg o, per il body grezzo, transcribe_stream (nel budget STT)
+        try:
+            with chat_api.admission["stt"].admit(robot_id_of(fields)):
+                success, result = transcribe_upload(stream, audio_file, timing_metadata)
+        except AdmissionRejected as e:
+            return stt_shed(e)
         
         if success:
             return jsonify({'success': True, **result}), 200
@@ -180,63 +323,99 @@ def create_app():
     def chat_voice():
         """
         Endpoint combinato: STT + Chat LLM in una singola chiamata.
-        Input: audio (file OGG/WAV), chat_id (opzionale)
+        Input: audio (file OGG/WAV), chat_id (opzionale); in multipart/form-data o come
+               body grezzo con chat_id e metadati in query string o header (vedi /stt/vosk/fast)
         Output: Risposta LLM con trascrizione inclusa
         Include timing statistics se TIMING_ENABLED
         """
         # 1. Verifica presenza file audio (stesso controllo di /stt/vosk/fast)
-        if 'audio' not in request.files:
-            return jsonify({'success': False, 'error': 'Nessun file audio fornito'}), 400
-        
-        audio_file = request.files['audio']
-        if audio_file.filename == '':
-            return jsonify({'success': False, 'error': 'Nome file non valido'}), 400
+        stream, audio_file, missing = audio_source()
+        if missing:
+            return missing
 
         # 2. Estrai metadata opzionali per Smart Trim
+        fields = upload_fields()
         timing_metadata = {}
-        if 'recording_start' in request.form:
-            timing_metadata['recording_start'] = request.form['recording_start']
-        if 'speech_detected' in request.form:
-            timing_metadata['speech_detected'] = request.form['speech_detected']
-
-        # Trascrizione audio -> testo (usa transcribe_ogg come /stt/vosk/fast)
-        success, stt_result = stt.transcribe_ogg(audio_file, timing_metadata)
-               
-        if not success:
-            status_code = 503 if 'instructions' in stt_result else 400
-            return jsonify({'success': False, 'stage': 'stt', **stt_result}), status_code
-        
-        transcribed_text = stt_result.get('text', '').strip()
-        if not transcribed_text:
-            return jsonify({'success': False, 'error': 'Trascrizione vuota', 'stage': 'stt'}), 400
-
-        # 3. Prepara i dati per handle_talk_action
-        chat_data = {
-            "action": "talk",
-            "chat_id": request.form.get("chat_id"),  # Può essere None per nuove chat
-            "message": transcribed_text
-        }
-
-        # 4. Chiama handle_talk_action e ottieni la risposta
-        try:
-
-            response, status_code = chat_api.handle_talk_action(chat_data)
+        if 'recording_start' in fields:
+            timing_metadata['recording_start'] = fields['recording_start']
+        if 'speech_detected' in fields:
+            timing_metadata['speech_detected'] = fields['speech_detected']
+
+        not_ready = wait_ready("stt", "llm")
+        if not_ready:
+            return not_ready
+
+        chat_id = fields.get("chat_id")  # Può essere None per nuove chat
+        robot_id = robot_id_of(fields)
+
+        def process_voice():
+            # Trascrizione audio -> testo (come /stt/vosk/fast) nel budget STT;
+            # se rifiutata il robot riceve subito la risposta "un attimo" (il turno LLM ha il suo budget)
+            try:
+                with chat_api.admission["stt"].admit(robot_id):
+                    success, stt_result = transcribe_upload(stream, audio_file, timing_metadata)
+            except AdmissionRejected as e:
+                return chat_api.shed_response(chat_id, e, robot_id)
+                   
+            if not success:
+                status_code = 503 if 'instructions' in stt_result else 400
+                return jsonify({'success': False, 'stage': 'stt', **stt_result}), status_code
             
-            # 5. Arricchisci la risposta con i dati della trascrizione
-            response_data = response.get_json()
-            response_data['transcription'] = transcribed_text         
-            return jsonify(response_data), status_code
-        except Exception as e:
-            chat_api.logger.log_error(f"Errore in chat/voice LLM: {str(e)}")
-            return jsonify({
-                'success': False, 
-                'stage': 'llm',
-                'error': str(e),
-                 'transcription': transcribed_text
-            }), 500
+            transcribed_text = stt_result.get('text', '').strip()
+            if not transcribed_text:
+                return jsonify({'success': False, 'error': 'Trascrizione vuota', 'stage': 'stt'}), 400
+
+            # 3. Prepara i dati per handle_talk_action
+            chat_data = {
+                "action": "talk",
+                "chat_id": chat_id,
+                "message": transcribed_text,
+                "robot_id": robot_id
+            }
+
+            # 4. Chiama handle_talk_action e ottieni la risposta
+            try:
+
+                response, status_code = chat_api.handle_talk_action(chat_data)
+                
+                # 5. Arricchisci la risposta con i dati della trascrizione
+                response_data = response.get_json()
+                response_data['transcription'] = transcribed_text         
+                # Con TIMING_ENABLED unisce i tempi delle due fasi (audio_prep_ms, stt_ms, llm_ms, total_ms)
+                if 'timing' in stt_result or 'timing' in response_data:
+                    response_data['timing'] = {**stt_result.get('timing', {}), **response_data.get('timing', {})}
+                return jsonify(response_data), status_code
+            except Exception as e:
+                chat_api.logger.log_error(f"Errore in chat/voice LLM: {str(e)}")
+                return jsonify({
+                    'success': False, 
+                    'stage': 'llm',
+                    'error': str(e),
+                     'transcription': transcribed_text
+                }), 500
+
+        # Retry dello stesso audio (stesso request_id): né STT né LLM vengono ripetuti
+        request_id = fields.get("request_id")
+        if request_id:
+            return chat_api.run_deduplicated(f"voice:{robot_id or ''}:{chat_id or ''}:{request_id}", process_voice)
+        return process_voice()
     
 
     
+    @app.route("/ready", methods=["GET"])
+    def ready():
+        """
+        Endpoint di readiness per load balancer e health check:
+        200 se i componenti in READY_REQUIRED hanno completato il warm-up, 503 altrimenti
+        """
+        components = warmup.get_status()
+        is_ready = all(components.get(c, {}).get("status") == "ready" for c in ready_required)
+        return jsonify({
+            "ready": is_ready,
+            "required": ready_required,
+            "components": components
+        }), 200 if is_ready else 503
+
     @app.route("/stt/status", methods=["GET"])
     def stt_status():
         """
@@ -0,0 +1,325 @@
+"""
+File:	/web_api/utils/admission.py
+-----
+Class AdmissionController - Controllo di ammissione con limite di concorrenza,
+coda con scadenza e rifiuto anticipato (load shedding) per STT e LLM, con
+ripartizione equa tra i robot e classi di priorità
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:15:26 am
+-----
+Last Modified: 	October 19th 2026 4:40:54 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Additional Terms under Section 7(b):
+
+The following attribution requirements apply to this work:
+
+1. Copyright notices and author attribution in source code files
+   cannot be removed or altered.
+2. Any interactive user interface must preserve and display
+   author attribution (Copyright, authors, project name).
+3. System prompts containing author information cannot be modified
+4. Public demonstrations, publications and derivative works
+   must credit the original authors.
+
+For full Additional Terms see the LICENSE file.
+------------------------------------------------------------------------------
+"""
+
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from utils.model_router import percentile
+
+# Attese in coda conservate per il calcolo dei percentili
+WAIT_SAMPLES = 200
+# Motivi di rifiuto
+SHED_REASONS = ("queue_full", "predicted_wait", "timeout")
+# Classi di priorità predefinite e relativo peso (quota di posti in caso di contesa)
+DEFAULT_CLASS_WEIGHTS = {"high": 4.0, "normal": 2.0, "low": 1.0}
+DEFAULT_CLASS = "normal"
+# Robot che non inviano robot_id: condividono un'unica quota
+ANONYMOUS_ROBOT = "anonymous"
+# Robot con statistiche separate; gli altri sono raggruppati in "other"
+MAX_TRACKED_ROBOTS = 256
+
+
+def parse_mapping(spec):
+    """Converte "a:x,b:y" in {"a": "x", "b": "y"} (voci senza ':' ignorate)"""
+    mapping = {}
+    for item in (spec or "").split(","):
+        name, sep, value = item.partition(":")
+        if sep and name.strip():
+            mapping[name.strip()] = value.strip()
+    return mapping
+
+
+class AdmissionRejected(Exception):
+    """Richiesta rifiutata dal controllo di ammissione (coda piena o attesa troppo lunga)"""
+
+    def __init__(self, budget, reason, retry_after):
+        self.budget = budget
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"Budget {budget} esaurito ({reason}): riprovare tra {retry_after}s")
+
+    @property
+    def retry_after_header(self):
+        """Valore dell'header HTTP Retry-After (secondi interi, almeno 1)"""
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class _Ticket:
+    """Richiesta in coda: robot, tag di fine virtuale e motivo di un'eventuale espulsione"""
+    __slots__ = ("robot", "tag", "reason")
+
+    def __init__(self, robot, tag):
+        self.robot = robot
+        self.tag = tag
+        self.reason = None
+
+
+class _RobotStats:
+    __slots__ = ("admitted", "queued", "shed", "waits")
+
+    def __init__(self):
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+
+
+class AdmissionController:
+    """
+    Limite di richieste contemporanee per una fase (STT o LLM) con coda equa tra robot.
+
+    Quando il provider rallenta le richieste non devono accumularsi nei thread
+    dei worker fino al timeout di gunicorn: oltre max_concurrent le richieste
+    attendono in coda al massimo max_wait secondi. L'attesa prevista (richieste
+    che la precedono x durata media di una richiesta / max_concurrent) viene
+    calcolata all'arrivo: se supera max_wait la richiesta viene rifiutata
+    subito e il robot riceve una risposta immediata invece di restare bloccato.
+    La durata media è una media mobile esponenziale delle richieste completate.
+
+    La coda non è FIFO: ogni richiesta riceve un tag di fine virtuale
+    (weighted fair queueing), max(tempo virtuale, ultimo tag del robot) + 1/peso,
+    e il posto libero va al tag minore. Un robot molto attivo accumula tag
+    crescenti e non può monopolizzare i posti: gli altri robot passano avanti
+    in proporzione al peso della loro classe di priorità. Con la coda piena
+    viene espulsa la richiesta con il tag maggiore, cioè del robot che ha già
+    la quota più alta.
+    """
+
+    def __init__(self, budget, max_concurrent, max_queue=32, max_wait=5.0,
+                 initial_service_time=1.0, smoothing=0.2,
+                 class_weights=None, robot_classes=None, default_class=DEFAULT_CLASS):
+        """
+        Args:
+            budget: Nome della fase ("llm", "stt"), riportato nei rifiuti e nelle statistiche
+            max_concurrent: Richieste contemporanee ammesse (0 = nessun limite)
+            max_queue: Richieste massime in attesa
+            max_wait: Attesa massima in coda (secondi), prevista o effettiva
+            initial_service_time: Durata media iniziale di una richiesta (secondi)
+            smoothing: Peso dell'ultima durata nella media mobile
+            class_weights: Peso di ogni classe di priorità {classe: peso} (default high/normal/low)
+            robot_classes: Classe di priorità di ogni robot {robot_id: classe}
+            default_class: Classe dei robot non elencati
+        """
+        self.budget = budget
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.smoothing = smoothing
+        self.class_weights = dict(class_weights or DEFAULT_CLASS_WEIGHTS)
+        self.robot_classes = dict(robot_classes or {})
+        self.default_class = default_class
+        self._service_time = initial_service_time
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = []
+        self._vtime = 0.0
+        self._last_tag = {}
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._robots = {}
+        self._stats = {"admitted": 0, "queued": 0, "completed": 0}
+        self._shed = {reason: 0 for reason in SHED_REASONS}
+
+    def robot_class(self, robot_id):
+        """Classe di priorità del robot"""
+        return self.robot_classes.get(robot_id, self.default_class)
+
+    def robot_weight(self, robot_id):
+        """Peso del robot (quello della sua classe; 1 per classi sconosciute)"""
+        weight = self.class_weights.get(self.robot_class(robot_id), 1.0)
+        return weight if weight > 0 else 1.0
+
+    def _robot_stats(self, robot_id):
+        stats = self._robots.get(robot_id)
+        if stats is None:
+            if len(self._robots) >= MAX_TRACKED_ROBOTS:
+                robot_id = "other"
+            stats = self._robots.setdefault(robot_id, _RobotStats())
+        return stats
+
+    def predicted_wait(self, position=None):
+        """Attesa prevista (secondi) per chi entra in coda in posizione position (default: in fondo)"""
+        with self._cond:
+            if position is None:
+                position = len(self._waiting) + 1
+            if self.max_concurrent <= 0:
+                return 0.0
+            return position * self._service_time / self.max_concurrent
+
+    def _reject(self, reason, predicted, robot_id):
+        self._shed[reason] += 1
+        self._robot_stats(robot_id).shed += 1
+        raise AdmissionRejected(self.budget, reason, max(1, math.ceil(predicted)))
+
+    def _next_ticket(self):
+        """Richiesta con il tag di fine virtuale minore (a parità, la prima arrivata)"""
+        return min(self._waiting, key=lambda ticket: ticket.tag) if self._waiting else None
+
+    def _forget_idle_robots(self):
+        """Rimuove i tag dei robot senza richieste in coda già superati dal tempo virtuale"""
+        waiting = {ticket.robot for ticket in self._waiting}
+        for robot_id in [r for r, tag in self._last_tag.items() if tag <= self._vtime and r not in waiting]:
+            del self._last_tag[robot_id]
+
+    def _acquire(self, robot_id):
+        """Ottiene un posto; restituisce i secondi trascorsi in coda"""
+        start = time.monotonic()
+        with self._cond:
+            if self.max_concurrent <= 0 or (self._in_flight < self.max_concurrent and not self._waiting):
+                self._in_flight += 1
+                return 0.0
+
+            tag = max(self._vtime, self._last_tag.get(robot_id, 0.0)) + 1.0 / self.robot_weight(robot_id)
+            ahead = sum(1 for ticket in self._waiting if ticket.tag <= tag)
+            predicted = self.predicted_wait(ahead + 1)
+            if predicted > self.max_wait:
+                self._reject("predicted_wait", predicted, robot_id)
+            if len(self._waiting) >= self.max_queue:
+                worst = max(self._waiting, key=lambda ticket: ticket.tag, default=None)
+                if worst is None or worst.tag <= tag:
+                    self._reject("queue_full", predicted, robot_id)
+                # Coda piena: esce la richiesta del robot con la quota più alta
+                worst.reason = "queue_full"
+                self._waiting.remove(worst)
+                self._cond.notify_all()
+
+            ticket = _Ticket(robot_id, tag)
+            self._waiting.append(ticket)
+            self._last_tag[robot_id] = tag
+            self._stats["queued"] += 1
+            self._robot_stats(robot_id).queued += 1
+            deadline = start + self.max_wait
+            while True:
+                if ticket.reason:
+                    self._reject(ticket.reason, self.predicted_wait(), robot_id)
+                if self._in_flight < self.max_concurrent and self._next_ticket() is ticket:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(ticket)
+                    self._cond.notify_all()
+                    self._reject("timeout", self.predicted_wait(1), robot_id)
+                self._cond.wait(remaining)
+
+            self._waiting.remove(ticket)
+            self._in_flight += 1
+            self._vtime = ticket.tag
+            self._forget_idle_robots()
+            # Il successivo in coda può trovare un altro posto libero
+            self._cond.notify_all()
+            return time.monotonic() - start
+
+    def _release(self, service_time):
+        with self._cond:
+            self._in_flight -= 1
+            self._stats["completed"] += 1
+            self._service_time += self.smoothing * (service_time - self._service_time)
+            self._cond.notify_all()
+
+    @contextmanager
+    def admit(self, robot_id=None):
+        """
+        Esegue il blocco occupando un posto del budget
+        Args:
+            robot_id: Robot che invia la richiesta (None = anonimo)
+        Raises:
+            AdmissionRejected: coda piena, attesa prevista oltre max_wait o attesa scaduta
+        """
+        robot_id = robot_id or ANONYMOUS_ROBOT
+        waited = self._acquire(robot_id)
+        with self._cond:
+            self._stats["admitted"] += 1
+            self._waits.append(waited)
+            robot = self._robot_stats(robot_id)
+            robot.admitted += 1
+            robot.waits.append(waited)
+        start = time.monotonic()
+        try:
+            yield waited
+        finally:
+            self._release(time.monotonic() - start)
+
+    def get_stats(self):
+        """
+        Restituisce limiti, occupazione, attese in coda e richieste rifiutate per motivo,
+        complessive e per robot
+        Returns:
+            dict: Statistiche del budget
+        """
+        with self._cond:
+            waits = list(self._waits)
+            robots = {}
+            for robot_id, robot in self._robots.items():
+                robot_waits = list(robot.waits)
+                robots[robot_id] = {
+                    "class": self.robot_class(robot_id),
+                    "weight": self.robot_weight(robot_id),
+                    "admitted": robot.admitted,
+                    "queued": robot.queued,
+                    "shed": robot.shed,
+                    "waiting": sum(1 for ticket in self._waiting if ticket.robot == robot_id),
+                    "queue_wait_p50_ms": _to_ms(percentile(robot_waits, 50)),
+                    "queue_wait_p95_ms": _to_ms(percentile(robot_waits, 95)),
+                }
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "max_wait_s": self.max_wait,
+                "in_flight": self._in_flight,
+                "waiting": len(self._waiting),
+                **self._stats,
+                "shed": dict(self._shed),
+                "avg_service_ms": round(self._service_time * 1000),
+                "queue_wait_p50_ms": _to_ms(percentile(waits, 50)),
+                "queue_wait_p95_ms": _to_ms(percentile(waits, 95)),
+                "robots": robots,
+            }
+
+
+def _to_ms(seconds):
+    return round(seconds * 1000) if seconds is not None else None
@@ -0,0 +1,209 @@
+"""
+File:	/web_api/utils/chat_history.py
+-----
+Class ChatHistory - Cronologia compatta di una chat: record con __slots__,
+ruoli internati, risposte del modello in JSON minificato (compresso se lungo)
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:09:50 am
+-----
+Last Modified: 	October 19th 2026 4:56:58 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Additional Terms under Section 7(b):
+
+The following attribution requirements apply to this work:
+
+1. Copyright notices and author attribution in source code files
+   cannot be removed or altered.
+2. Any interactive user interface must preserve and display
+   author attribution (Copyright, authors, project name).
+3. System prompts containing author information cannot be modified
+4. Public demonstrations, publications and derivative works
+   must credit the original authors.
+
+For full Additional Terms see the LICENSE file.
+------------------------------------------------------------------------------
+"""
+
+import json
+import sys
+import threading
+import zlib
+
+# Ruoli ammessi: stringhe internate, condivise da tutti i messaggi
+ROLES = tuple(sys.intern(role) for role in ("system", "user", "assistant"))
+_ROLE_BY_NAME = {role: role for role in ROLES}
+
+
+def minify_json(data):
+    """JSON canonico minificato (senza spazi, caratteri non ASCII leggibili)"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+class Message:
+    """
+    Messaggio della cronologia. Il contenuto è una str oppure, oltre la soglia
+    di compressione, bytes zlib decompressi solo quando servono.
+    """
+    __slots__ = ("role", "_content")
+
+    def __init__(self, role, content, compress_min_bytes=0):
+        role = _ROLE_BY_NAME.get(role)
+        if role is None:
+            raise ValueError(f"Ruolo non valido (ammessi: {', '.join(ROLES)})")
+        self.role = role
+        if compress_min_bytes and len(content) >= compress_min_bytes:
+            packed = zlib.compress(content.encode("utf-8"), 6)
+            # Compressione mantenuta solo se fa risparmiare memoria
+            if len(packed) < len(content):
+                content = packed
+        self._content = content
+
+    @property
+    def content(self):
+        content = self._content
+        return zlib.decompress(content).decode("utf-8") if isinstance(content, bytes) else content
+
+    @property
+    def stored_size(self):
+        """Byte occupati dal contenuto memorizzato (compresso o no)"""
+        content = self._content
+        return len(content) if isinstance(content, bytes) else len(content.encode("utf-8"))
+
+    def to_dict(self, parsed=False):
+        """
+        Messaggio nel formato del provider; con parsed=True la risposta JSON del modello
+        viene restituita come oggetto (non come stringa JSON da decodificare una seconda volta)
+        """
+        content = self.content
+        if parsed and self.role == "assistant" and content.startswith("{"):
+            try:
+                content = json.loads(content)
+            except ValueError:
+                pass  # testo grezzo (fallback): resta stringa
+        return {"role": self.role, "content": content}
+
+
+class ChatHistory:
+    """
+    Cronologia di una chat.
+
+    Sostituisce la lista di dizionari {"role", "content"}: un dizionario per
+    messaggio occupa diverse volte un record con __slots__, e le risposte del
+    modello erano memorizzate come testo grezzo (spazi, a capo, blocchi
+    markdown). Le risposte vengono salvate come JSON canonico minificato e,
+    oltre compress_min_bytes, compresse con zlib. La lista di messaggi per il
+    provider viene ricostruita solo quando serve (ultimi N messaggi del turno).
+    """
+    __slots__ = ("_messages", "compress_min_bytes", "_loader", "_pending", "_load_lock")
+
+    def __init__(self, messages=None, compress_min_bytes=0, loader=None, length=0):
+        """
+        Args:
+            messages: Messaggi iniziali come dizionari {"role", "content"} (opzionale)
+            compress_min_bytes: Lunghezza minima per comprimere un contenuto (0 = mai)
+            loader: Funzione () -> [(ruolo, contenuto), ...] che fornisce i messaggi
+                    precedenti, chiamata solo al primo accesso (chat ripristinate da snapshot)
+            length: Numero di messaggi forniti da loader (per len() senza caricarli)
+        """
+        self.compress_min_bytes = compress_min_bytes
+        self._messages = []
+        self._loader = loader
+        self._pending = length if loader else 0
+        # Solo le cronologie da caricare hanno un lock: il primo accesso può arrivare
+        # insieme da /talk e dalle rotte admin, che non usano il lock della chat
+        self._load_lock = threading.Lock() if loader else None
+        for message in messages or ():
+            self.append(message["role"], message["content"])
+
+    def _load(self):
+        """Carica i messaggi forniti da loader, prima di quelli già presenti.
+        Thread-safe: chi arriva durante il caricamento attende che sia completo"""
+        lock = self._load_lock
+        if lock is None:
+            return
+        with lock:
+            if self._loader is None:
+                return
+            try:
+                restored = [Message(role, content, self.compress_min_bytes) for role, content in self._loader()]
+                self._messages[:0] = restored
+            finally:
+                # loaded diventa True solo a messaggi inseriti
+                self._pending = 0
+                self._loader = None
+        self._load_lock = None
+
+    @property
+    def loaded(self):
+        """False finché i messaggi ripristinati non sono stati letti"""
+        return self._loader is None
+
+    def append(self, role, content):
+        """
+        Aggiunge un messaggio; un contenuto dict/list (risposta JSON del modello)
+        viene memorizzato come JSON minificato
+        Returns:
+            dict: Il messaggio aggiunto nel formato del provider
+        """
+        if not isinstance(content, str):
+            content = minify_json(content)
+        if self._loader is not None:
+            self._load()
+        self._messages.append(Message(role, content, self.compress_min_bytes))
+        return {"role": role, "content": content}
+
+    def provider_messages(self, limit=None):
+        """Ultimi limit messaggi (tutti se None) nel formato del provider [{"role", "content"}]"""
+        if self._loader is not None:
+            self._load()
+        messages = self._messages[-limit:] if limit else self._messages
+        return [message.to_dict() for message in messages]
+
+    def to_list(self, parsed=False):
+        """
+        Copia completa della cronologia come lista di dizionari (rotte history ed export);
+        con parsed=True le risposte del modello sono oggetti JSON, non stringhe
+        """
+        if self._loader is not None:
+            self._load()
+        return [message.to_dict(parsed) for message in self._messages]
+
+    def stored_bytes(self):
+        """Byte di contenuto memorizzati"""
+        if self._loader is not None:
+            self._load()
+        return sum(message.stored_size for message in self._messages)
+
+    def __len__(self):
+        return len(self._messages) + self._pending
+
+    def __iter__(self):
+        if self._loader is not None:
+            self._load()
+        for message in list(self._messages):
+            yield message.to_dict()
+
+    def __getitem__(self, index):
+        if self._loader is not None:
+            self._load()
+        if isinstance(index, slice):
+            return [message.to_dict() for message in self._messages[index]]
+        return self._messages[index].to_dict()
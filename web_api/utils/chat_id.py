@@ -0,0 +1,138 @@
+"""
+File:	/web_api/utils/chat_id.py
+-----
+Class ChatIdGenerator - chat_id brevi, URL-safe, ordinati nel tempo e con il
+prefisso del worker/shard che li ha creati (routing sticky senza lookup condiviso)
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:08:07 am
+-----
+Last Modified: 	October 19th 2026 4:37:08 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Additional Terms under Section 7(b):
+
+The following attribution requirements apply to this work:
+
+1. Copyright notices and author attribution in source code files
+   cannot be removed or altered.
+2. Any interactive user interface must preserve and display
+   author attribution (Copyright, authors, project name).
+3. System prompts containing author information cannot be modified
+4. Public demonstrations, publications and derivative works
+   must credit the original authors.
+
+For full Additional Terms see the LICENSE file.
+------------------------------------------------------------------------------
+"""
+
+import os
+import re
+import secrets
+import threading
+import time
+
+ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyz"
+SEPARATOR = "-"
+# Larghezze fisse: l'ordine alfabetico degli id di uno shard è l'ordine di creazione
+TIME_WIDTH = 9      # millisecondi in base 36 (fino all'anno 5188)
+COUNTER_WIDTH = 2   # id nello stesso millisecondo (36^2 = 1296)
+RANDOM_WIDTH = 4    # suffisso casuale: nessuna collisione dopo un riavvio con lo stesso shard
+
+SHARD_RE = re.compile(r"^[a-z0-9]{1,16}$")
+# Prefisso dello shard se CHAT_ID_SHARD è vuoto
+DEFAULT_SHARD_PREFIX = "w"
+
+
+def to_base36(value, width):
+    digits = []
+    while value:
+        value, remainder = divmod(value, 36)
+        digits.append(ALPHABET[remainder])
+    return "".join(reversed(digits)).rjust(width, "0")
+
+
+def worker_shard(prefix=None, index=None):
+    """
+    Shard stabile del processo: <prefisso><indice del worker>, es. "w0", "w1".
+    Il prefisso è CHAT_ID_SHARD (diverso per ogni istanza del server), l'indice è
+    WORKER_INDEX, assegnato da gunicorn.conf.py (0..N-1, lo stesso dopo il riavvio
+    del worker); senza gunicorn l'indice è 0
+    """
+    if prefix is None:
+        prefix = os.getenv("CHAT_ID_SHARD", "")
+    if index is None:
+        index = os.getenv("WORKER_INDEX", "0")
+    return f"{prefix.strip().lower() or DEFAULT_SHARD_PREFIX}{index}"
+
+
+def parse_shard(chat_id):
+    """
+    Restituisce lo shard di un chat_id (None per gli id nel vecchio formato numerico),
+    ad esempio per instradare le richieste al worker che possiede la chat
+    """
+    shard, separator, _ = (chat_id or "").rpartition(SEPARATOR)
+    return shard if separator and SHARD_RE.match(shard) else None
+
+
+class ChatIdGenerator:
+    """
+    Genera chat_id nel formato <shard>-<tempo><contatore><casuale>, es. "w1-mgx3k9a2q00f7za".
+
+    Sostituisce str(id(chat_history)): l'indirizzo di memoria di una lista viene
+    riusato dopo la garbage collection (una nuova chat poteva ricevere l'id di una
+    chat chiusa ancora in mano a un robot) e coincide facilmente tra worker diversi.
+    Lo shard (worker_shard: CHAT_ID_SHARD più l'indice del worker) è stabile tra i
+    riavvii e permette a un proxy di inviare ogni richiesta al processo proprietario
+    leggendo solo il prefisso.
+    """
+
+    def __init__(self, shard=None, clock=time.time):
+        """
+        Args:
+            shard: Prefisso del worker/shard ([a-z0-9], al massimo 16 caratteri);
+                   se assente worker_shard()
+            clock: Funzione che restituisce il tempo corrente in secondi (sostituibile nei test)
+        """
+        shard = (shard or worker_shard()).lower()
+        if not SHARD_RE.match(shard):
+            raise ValueError(f"Shard non valido: '{shard}' (ammessi a-z e 0-9, al massimo 16 caratteri)")
+        self.shard = shard
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._counter = 0
+
+    def new_id(self):
+        """Restituisce un nuovo chat_id, crescente rispetto ai precedenti dello stesso generatore"""
+        with self._lock:
+            now_ms = int(self._clock() * 1000)
+            if now_ms > self._last_ms:
+                self._last_ms, self._counter = now_ms, 0
+            else:
+                # Stesso millisecondo (o orologio tornato indietro): si prosegue dall'ultimo
+                self._counter += 1
+                if self._counter >= 36 ** COUNTER_WIDTH:
+                    self._last_ms, self._counter = self._last_ms + 1, 0
+            timestamp, counter = self._last_ms, self._counter
+
+        return (
+            f"{self.shard}{SEPARATOR}{to_base36(timestamp, TIME_WIDTH)}"
+            f"{to_base36(counter, COUNTER_WIDTH)}{to_base36(secrets.randbelow(36 ** RANDOM_WIDTH), RANDOM_WIDTH)}"
+        )
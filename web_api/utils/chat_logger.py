@@ -1,13 +1,13 @@
 """
 File:	/web_api/utils/chat_logger.py
 -----
-Class ChatLogger - Log per le Chat AI
+Class ChatLogger - Log per le Chat AI (testo + eventi strutturati JSONL)
 -----
 @author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
 @copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
 Created Date: Wednesday, November 19th 2024, 6:37:29 pm
 -----
-Last Modified: 	November 19th 2024 7:01:11 pm
+Last Modified: 	October 19th 2026 4:33:58 am
 Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
 -----
 @license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
@@ -42,18 +42,216 @@ For full Additional Terms see the LICENSE file.
 """
 
 import os
+import re
+import gzip
+import json
+import queue
+import atexit
+import shutil
 import logging
-from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows: nessun lock tra processi (un solo processo per directory)
+    fcntl = None
+
+
+class DailyRotatingFileHandler(logging.FileHandler):
+    """
+    " File handler con un file al giorno (<prefix>YYYYMMDD<suffix>), rotazione a mezzanotte
+    " e al superamento di una dimensione massima. I file ruotati vengono compressi (.gz)
+    " e quelli più vecchi della retention, o oltre lo spazio massimo, eliminati.
+    " Il giorno è quello del record: un processo avviato da giorni scrive nel file corretto.
+    "
+    " Più processi (worker gunicorn) possono scrivere nella stessa directory: scrittura,
+    " rotazione e compressione avvengono sotto un lock esclusivo (flock) sulla directory
+    " e prima di scrivere ogni processo riapre il file se nel frattempo un altro lo ha
+    " ruotato, così nessun record finisce in un file già compresso o eliminato.
+    """
+
+    def __init__(self, log_directory, prefix="chat_log_", suffix=".txt", max_bytes=0,
+                 retention_days=0, max_total_bytes=0, compress=True, encoding="utf-8"):
+        """
+        " Args:
+        "    log_directory (str): Directory dei file di log
+        "    prefix (str), suffix (str): Nome dei file: <prefix>YYYYMMDD<suffix>
+        "    max_bytes (int): Dimensione massima del file del giorno (0 = nessun limite).
+        "        Superata, il file diventa <prefix>YYYYMMDD_<n><suffix> e se ne apre uno nuovo
+        "    retention_days (int): Giorni di log conservati (0 = nessun limite)
+        "    max_total_bytes (int): Spazio massimo dei file ruotati (0 = nessun limite)
+        "    compress (bool): Comprime con gzip i file ruotati
+        """
+        self.log_directory = log_directory
+        self.prefix = prefix
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self.retention_days = retention_days
+        self.max_total_bytes = max_total_bytes
+        self.compress = compress
+        self._day = datetime.now().strftime("%Y%m%d")
+        self._file_re = re.compile(
+            rf"^{re.escape(prefix)}(\d{{8}})(?:_(\d+))?{re.escape(suffix)}(\.gz)?$"
+        )
+        # La pulizia dei file precedenti viene fatta alla prima scrittura, non all'avvio
+        self._housekeeping_pending = True
+        self._dir_fd = None
+        super().__init__(self._path_for(self._day), encoding=encoding, delay=True)
+
+    def _path_for(self, day, part=None):
+        name = f"{self.prefix}{day}_{part}{self.suffix}" if part else f"{self.prefix}{day}{self.suffix}"
+        return os.path.join(self.log_directory, name)
+
+    def _current_size(self):
+        # Dimensione del file su disco: include quanto scritto dagli altri processi
+        try:
+            return os.path.getsize(self.baseFilename)
+        except OSError:
+            return 0
+
+    def _lock(self):
+        """Lock esclusivo tra processi sulla directory dei log"""
+        if fcntl is None:
+            return
+        if self._dir_fd is None:
+            self._dir_fd = os.open(self.log_directory, os.O_RDONLY)
+        fcntl.flock(self._dir_fd, fcntl.LOCK_EX)
+
+    def _unlock(self):
+        if fcntl is not None and self._dir_fd is not None:
+            fcntl.flock(self._dir_fd, fcntl.LOCK_UN)
+
+    def _reopen_if_moved(self):
+        """Chiude il file se un altro processo lo ha ruotato, compresso o eliminato"""
+        if self.stream is None:
+            return
+        try:
+            moved = os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except OSError:
+            moved = True
+        if moved:
+            self.stream.close()
+            self.stream = None
+
+    def emit(self, record):
+        self._lock()
+        try:
+            try:
+                day = datetime.fromtimestamp(record.created).strftime("%Y%m%d")
+                self._reopen_if_moved()
+                if day != self._day:
+                    self.rollover(day)
+                elif self.max_bytes and self._current_size() >= self.max_bytes:
+                    self.rollover(day)
+                elif self._housekeeping_pending:
+                    self._housekeeping()
+            except Exception:
+                self.handleError(record)
+            super().emit(record)
+        finally:
+            self._unlock()
+
+    def close(self):
+        super().close()
+        if self._dir_fd is not None:
+            os.close(self._dir_fd)
+            self._dir_fd = None
+
+    def rollover(self, day):
+        """Chiude il file corrente, lo archivia e passa al file del giorno indicato"""
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+        if day == self._day and os.path.exists(self.baseFilename):
+            # Rotazione per dimensione: il file corrente diventa la parte <n> del giorno
+            part = 1
+            while any(os.path.exists(self._path_for(day, part) + ext) for ext in ("", ".gz")):
+                part += 1
+            os.replace(self.baseFilename, self._path_for(day, part))
+
+        self._day = day
+        self.baseFilename = self._path_for(day)
+        self._housekeeping()
+
+    def _log_files(self):
+        """Restituisce i file di log gestiti dall'handler come (percorso, giorno)"""
+        files = []
+        for name in os.listdir(self.log_directory):
+            match = self._file_re.match(name)
+            if match:
+                files.append((os.path.join(self.log_directory, name), match.group(1)))
+        return files
+
+    def _housekeeping(self):
+        """Comprime i file ruotati ed elimina quelli oltre la retention o lo spazio massimo"""
+        self._housekeeping_pending = False
+        current = os.path.abspath(self.baseFilename)
+
+        if self.compress:
+            for path, _ in self._log_files():
+                if not path.endswith(".gz") and os.path.abspath(path) != current:
+                    _gzip_file(path)
+
+        archived = [(path, day) for path, day in self._log_files() if os.path.abspath(path) != current]
+
+        if self.retention_days:
+            oldest_day = (datetime.strptime(self._day, "%Y%m%d")
+                          - timedelta(days=self.retention_days)).strftime("%Y%m%d")
+            for path, day in archived:
+                if day < oldest_day:
+                    os.remove(path)
+            archived = [(path, day) for path, day in archived if day >= oldest_day]
+
+        if self.max_total_bytes:
+            archived.sort(key=lambda item: os.path.getmtime(item[0]))
+            total = sum(os.path.getsize(path) for path, _ in archived)
+            while archived and total > self.max_total_bytes:
+                path, _ = archived.pop(0)
+                total -= os.path.getsize(path)
+                os.remove(path)
+
+
+def _gzip_file(path):
+    """
+    Comprime un file in <path>.gz ed elimina l'originale. Se <path>.gz esiste già
+    (record ritardatari di un altro processo) il contenuto viene accodato come nuovo membro gzip
+    """
+    with open(path, "rb") as f_in, gzip.open(path + ".gz", "ab") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(path)
+
+
+class _EventFilter(logging.Filter):
+    """Separa i record degli eventi JSONL da quelli del log testuale"""
+
+    def __init__(self, events):
+        super().__init__()
+        self.events = events
+
+    def filter(self, record):
+        return record.name.endswith(".events") == self.events
 
 
 class ChatLogger:
-    def __init__(self, log_directory=None, log_level=logging.INFO):
+    # Listener attivo: il logger è condiviso tra le istanze, come gli handler
+    _listener = None
+
+    def __init__(self, log_directory=None, log_level=logging.INFO, max_bytes=20 * 1024 * 1024,
+                 retention_days=30, max_total_bytes=0, compress=True, events_enabled=True):
         """
         " Inizializza il logger per la chat
         " Args:
         "    log_directory (str, optional): Directory per i file di log.
         "        Se None, usa una sottocartella 'logs' nella directory corrente.
         "    log_level (int, optional): Livello di logging. Default è logging.INFO.
+        "    max_bytes (int, optional): Dimensione massima del file giornaliero (0 = nessun limite)
+        "    retention_days (int, optional): Giorni di log conservati (0 = nessun limite)
+        "    max_total_bytes (int, optional): Spazio massimo dei log archiviati (0 = nessun limite)
+        "    compress (bool, optional): Comprime con gzip i file ruotati
+        "    events_enabled (bool, optional): Scrive anche gli eventi strutturati
+        "        in chat_events_YYYYMMDD.jsonl (un oggetto JSON per riga)
         """
         # Imposta la directory dei log
         if log_directory is None:
@@ -63,24 +261,64 @@ class ChatLogger:
 
         # Crea la directory se non esiste
         os.makedirs(log_directory, exist_ok=True)
-
-        # Genera il nome del file di log con timestamp
-        timestamp = datetime.now().strftime("%Y%m%d")
-        log_file = os.path.join(log_directory, f"chat_log_{timestamp}.txt")
+        self.log_directory = log_directory
 
         # Configura il logger
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(log_level)
 
         # Rimuove eventuali handler esistenti per evitare duplicazioni
+        # (fermando il listener dell'istanza precedente)
+        ChatLogger._stop_listener()
         self.logger.handlers.clear()
 
-        # Aggiungi un file handler
-        file_handler = logging.FileHandler(log_file)
+        rotation = dict(
+            max_bytes=max_bytes,
+            retention_days=retention_days,
+            max_total_bytes=max_total_bytes,
+            compress=compress,
+        )
+
+        # File giornaliero chat_log_YYYYMMDD.txt con rotazione e compressione
+        file_handler = DailyRotatingFileHandler(log_directory, prefix="chat_log_", suffix=".txt", **rotation)
         file_handler.setFormatter(
             logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
         )
-        self.logger.addHandler(file_handler)
+        file_handler.addFilter(_EventFilter(events=False))
+        handlers = [file_handler]
+
+        # Eventi strutturati: chat_events_YYYYMMDD.jsonl (interrogabili con tests/utils/query_events.py)
+        self.events_logger = logging.getLogger(__name__ + ".events")
+        self.events_logger.setLevel(logging.INFO)
+        self.events_logger.propagate = False
+        self.events_logger.handlers.clear()
+        self.events_logger.disabled = not events_enabled
+        if events_enabled:
+            events_handler = DailyRotatingFileHandler(log_directory, prefix="chat_events_", suffix=".jsonl", **rotation)
+            events_handler.setFormatter(logging.Formatter("%(message)s"))
+            events_handler.addFilter(_EventFilter(events=True))
+            handlers.append(events_handler)
+
+        # Scrittura asincrona: il thread della richiesta accoda soltanto il record,
+        # la scrittura su disco (e la rotazione) avviene nel thread del listener
+        log_queue = queue.SimpleQueue()
+        self.logger.addHandler(QueueHandler(log_queue))
+        self.events_logger.addHandler(QueueHandler(log_queue))
+        ChatLogger._listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        ChatLogger._listener.start()
+
+    @classmethod
+    def _stop_listener(cls):
+        """Svuota la coda e ferma il listener attivo"""
+        if cls._listener is not None:
+            cls._listener.stop()
+            for handler in cls._listener.handlers:
+                handler.close()
+            cls._listener = None
+
+    def close(self):
+        """Scrive i log ancora in coda e chiude i file"""
+        ChatLogger._stop_listener()
 
     def log_chat_message(self, chat_id, role, content):
         """
@@ -94,6 +332,21 @@ class ChatLogger:
         content_str = str(content)[:2000]
         log_entry = f"CHAT_ID: {chat_id} | ROLE: {role} | MSG: {content_str}"
         self.logger.info(log_entry)
+        # Nell'evento strutturato il contenuto è completo
+        self.log_event("message", chat_id=chat_id, role=role, content=str(content))
+
+    def log_event(self, event, **fields):
+        """
+        " Registra un evento strutturato nel file chat_events_YYYYMMDD.jsonl
+        "  Args:
+        "    event (str): Tipo di evento (es. 'message', 'turn', 'error')
+        "    fields: Campi dell'evento (chat_id, role, latenze, token, ...)
+        """
+        if self.events_logger.disabled:
+            return
+        entry = {"ts": datetime.now().isoformat(timespec="milliseconds"), "event": event}
+        entry.update(fields)
+        self.events_logger.info(json.dumps(entry, ensure_ascii=False, default=str))
 
     def log_info(self, info_message):
         """Registra un messaggio di informazione"""
@@ -108,6 +361,10 @@ class ChatLogger:
         self.logger.warning(warning_message)
 
 
+# Alla chiusura del processo vengono scritti i log ancora in coda
+atexit.register(ChatLogger._stop_listener)
+
+
 # Esempio di utilizzo
 if __name__ == "__main__":
     # Crea un'istanza del logger personalizzabile
@@ -118,3 +375,6 @@ if __name__ == "__main__":
 
     # Registra un errore
     chat_logger.log_error("Errore di connessione")
+
+    # Registra un evento strutturato
+    chat_logger.log_event("turn", chat_id="chat_001", model="gemini/gemini-2.5-flash", llm_ms=1840)
@@ -0,0 +1,267 @@
+"""
+File:	/web_api/utils/chat_search.py
+-----
+Class ChatSearchIndex - Indice invertito in memoria per la ricerca full-text
+nelle conversazioni attive (rotta /admin, azione search)
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 3:53:27 am
+-----
+Last Modified: 	October 19th 2026 4:55:25 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Additional Terms under Section 7(b):
+
+The following attribution requirements apply to this work:
+
+1. Copyright notices and author attribution in source code files
+   cannot be removed or altered.
+2. Any interactive user interface must preserve and display
+   author attribution (Copyright, authors, project name).
+3. System prompts containing author information cannot be modified
+4. Public demonstrations, publications and derivative works
+   must credit the original authors.
+
+For full Additional Terms see the LICENSE file.
+------------------------------------------------------------------------------
+"""
+
+import re
+import sys
+import math
+import heapq
+import threading
+import unicodedata
+from collections import defaultdict
+
+# Parametri del ranking BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Caratteri di contesto attorno al primo termine trovato nello snippet
+SNIPPET_CONTEXT = 60
+
+# Parole troppo frequenti per essere utili nella ricerca
+STOPWORDS = frozenset("""
+a ad al alla alle allo agli ai anche che chi ci come con da dal dalla dalle dei del della delle
+di e ed gli ha hai ho i il in io la le lo ma mi ne nel nella nelle non o per piu se si sono su
+sul sulla ti tu un una uno
+""".split())
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _fold_char(char):
+    """Minuscolo senza accento, un carattere per carattere (gli indici restano allineati al testo)"""
+    decomposed = unicodedata.normalize("NFKD", char.lower())
+    return decomposed[0] if decomposed else char
+
+
+def fold_text(text):
+    """Testo in minuscolo e senza accenti, della stessa lunghezza dell'originale"""
+    if text.isascii():
+        return text.lower()
+    return "".join(_fold_char(c) for c in text)
+
+
+def tokenize(text):
+    """Restituisce i termini indicizzabili (minuscoli, senza accenti e stopword)"""
+    return [t for t in _TOKEN_RE.findall(fold_text(text)) if len(t) > 1 and t not in STOPWORDS]
+
+
+class ChatSearchIndex:
+    """
+    Indice invertito dei messaggi delle chat attive, aggiornato a ogni messaggio.
+
+    Ogni messaggio è un documento (chat_id, posizione nella cronologia); per ogni
+    termine l'indice conserva i documenti che lo contengono con la frequenza.
+    Una ricerca legge solo le liste dei termini cercati (nessuna scansione delle
+    cronologie) e ordina i risultati con BM25. Il testo dei messaggi non viene
+    copiato nell'indice: gli snippet dei soli risultati sono costruiti leggendo
+    il messaggio dalla cronologia tramite text_source. Thread-safe.
+    """
+
+    def __init__(self, text_source=None):
+        """
+        Args:
+            text_source: Funzione (chat_id, indice) -> testo indicizzato del messaggio,
+                         None se non più disponibile (per gli snippet dei risultati)
+        """
+        self.text_source = text_source
+        self._lock = threading.Lock()
+        self._postings = defaultdict(dict)     # termine -> {(chat_id, indice): frequenza}
+        self._docs = {}                        # (chat_id, indice) -> (ruolo, n. termini)
+        self._chat_docs = defaultdict(list)    # chat_id -> indici dei messaggi indicizzati
+        # chat_id -> termini distinti di ogni suo messaggio, in sequenza (per la rimozione).
+        # Una lista di riferimenti ai termini internati costa meno di un set o del testo
+        self._chat_terms = defaultdict(list)
+        self._total_terms = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add_message(self, chat_id, index, role, text):
+        """
+        Indicizza un messaggio
+        Args:
+            chat_id: ID della chat
+            index: Posizione del messaggio nella cronologia della chat
+            role: Ruolo del mittente ('user', 'assistant')
+            text: Testo del messaggio (per l'assistente, il testo dei chunk)
+        """
+        # Termini internati: un solo oggetto stringa per termine, condiviso da tutti i riferimenti
+        terms = [sys.intern(term) for term in tokenize(text)]
+        frequencies = defaultdict(int)
+        for term in terms:
+            frequencies[term] += 1
+
+        doc_key = (chat_id, index)
+        with self._lock:
+            if doc_key in self._docs:
+                self._remove_doc(doc_key)
+            else:
+                self._chat_docs[chat_id].append(index)
+            self._docs[doc_key] = (role, len(terms))
+            self._total_terms += len(terms)
+            for term, count in frequencies.items():
+                self._postings[term][doc_key] = count
+            self._chat_terms[chat_id].extend(frequencies)
+
+    def _remove_doc(self, doc_key):
+        _, length = self._docs.pop(doc_key)
+        self._total_terms -= length
+        # I termini del documento sono tra quelli della sua chat
+        for term in self._chat_terms.get(doc_key[0], ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_key, None)
+                if not postings:
+                    del self._postings[term]
+
+    def remove_chat(self, chat_id):
+        """Rimuove dall'indice tutti i messaggi di una chat"""
+        with self._lock:
+            indexes = self._chat_docs.pop(chat_id, [])
+            terms = self._chat_terms.pop(chat_id, ())
+            for index in indexes:
+                _, length = self._docs.pop((chat_id, index))
+                self._total_terms -= length
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                for index in indexes:
+                    postings.pop((chat_id, index), None)
+                if not postings:
+                    del self._postings[term]
+
+    def clear(self):
+        """Svuota l'indice"""
+        with self._lock:
+            self._postings.clear()
+            self._docs.clear()
+            self._chat_docs.clear()
+            self._chat_terms.clear()
+            self._total_terms = 0
+
+    def search(self, query, limit=20, role=None, chat_id=None):
+        """
+        Cerca i messaggi che contengono i termini della query
+        Args:
+            query: Testo da cercare
+            limit: Numero massimo di risultati
+            role: Solo i messaggi di questo ruolo (opzionale)
+            chat_id: Solo i messaggi di questa chat (opzionale)
+        Returns:
+            tuple: (risultati ordinati per rilevanza, numero totale di messaggi trovati)
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return [], 0
+
+        with self._lock:
+            n_docs = len(self._docs)
+            if not n_docs:
+                return [], 0
+            avg_length = self._total_terms / n_docs or 1.0
+
+            scores = defaultdict(float)
+            matched = defaultdict(int)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_key, tf in postings.items():
+                    if chat_id is not None and doc_key[0] != chat_id:
+                        continue
+                    doc_role, length = self._docs[doc_key]
+                    if role is not None and doc_role != role:
+                        continue
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[doc_key] += idf * tf * (BM25_K1 + 1) / norm
+                    matched[doc_key] += 1
+
+            # A parità di punteggio prevalgono i messaggi che contengono più termini
+            best = heapq.nlargest(limit, scores, key=lambda k: (matched[k], scores[k]))
+            roles = {doc_key: self._docs[doc_key][0] for doc_key in best}
+
+        # Snippet fuori dal lock: il testo viene letto dalla cronologia della chat
+        results = []
+        for doc_key in best:
+            text = self.text_source(*doc_key) if self.text_source else None
+            snippet, highlights = make_snippet(text, terms) if text else ("", [])
+            results.append({
+                "chat_id": doc_key[0],
+                "message_index": doc_key[1],
+                "role": roles[doc_key],
+                "score": round(scores[doc_key], 4),
+                "matched_terms": matched[doc_key],
+                "snippet": snippet,
+                "highlights": highlights,
+            })
+        return results, len(scores)
+
+
+def make_snippet(text, terms, context=SNIPPET_CONTEXT):
+    """
+    Estrae il frammento di testo attorno al primo termine trovato
+    Returns:
+        tuple: (snippet, lista di [inizio, fine] dei termini evidenziati nello snippet)
+    """
+    folded = fold_text(text)
+    spans = [(m.start(), m.end()) for m in _TOKEN_RE.finditer(folded) if m.group() in terms]
+    if not spans:
+        return text[:2 * context], []
+
+    start = max(0, spans[0][0] - context)
+    end = min(len(text), spans[0][1] + context)
+    # Evita di tagliare le parole ai bordi
+    if start > 0:
+        space = text.find(" ", start)
+        start = space + 1 if 0 <= space < spans[0][0] else start
+    if end < len(text):
+        space = text.rfind(" ", spans[0][1], end)
+        end = space if space > 0 else end
+
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if end < len(text) else ""
+    offset = len(prefix) - start
+    highlights = [[s + offset, e + offset] for s, e in spans if s >= start and e <= end]
+    return prefix + text[start:end] + suffix, highlights
@@ -42,46 +42,70 @@ Pulisce il testo rimuovendo emoji, caratteri speciali e normalizzando la puntegg
 
 import re
 
-"""
-"    Pulisce il testo rimuovendo emoji, caratteri speciali e normalizzando la punteggiatura.    
-"    Args:  text (str): Testo da pulire
-"    Returns:      str: Testo pulito e ottimizzato
-"""
 
+# Emoji Unicode e altri simboli speciali (questo intervallo copre la maggior parte degli emoji)
+_EMOJI = (
+    "\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F700-\U0001F77F"
+    "\U0001F780-\U0001F7FF\U0001F800-\U0001F8FF\U0001F900-\U0001F9FF\U0001FA00-\U0001FA6F"
+    "\U0001FA70-\U0001FAFF\U00002702-\U000027B0\U000024C2-\U0001F251"
+)
+# Carattere più basso degli intervalli emoji: i testi senza caratteri >= di questo non contengono emoji
+_EMOJI_MIN_CHAR = "\u24c2"
 
-def clean_text(text):
-    # Rimuove emoji e caratteri speciali
-    # Questo pattern copre la maggior parte degli emoji Unicode e altri simboli speciali
-    text = re.sub(
-        r"[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F700-\U0001F77F\U0001F780-\U0001F7FF\U0001F800-\U0001F8FF\U0001F900-\U0001F9FF\U0001FA00-\U0001FA6F\U0001FA70-\U0001FAFF\U00002702-\U000027B0\U000024C2-\U0001F251]+",
-        "",
-        text,
-    )
+# Emoticon testuali comuni (es. :) :( ;) :D :P)
+_EMOTICON_RE = re.compile(r"[:;=]-?[)(/\\|dpDP]")
 
-    # Rimuove emoticon testuali comuni
-    text = re.sub(r"[:;=]-?[)(/\\|dpDP]", "", text)  # e.g., :) :( ;) :D :P
+# Emoji ed emoticon in un'unica passata. Un emoticon interrotto da emoji (es. ":🌞)")
+# viene rimosso come se gli emoji fossero già stati eliminati (come nelle passate separate)
+_EMOJI_EMOTICON_RE = re.compile(
+    f"[{_EMOJI}]+|[:;=][{_EMOJI}]*(?:-[{_EMOJI}]*)?[)(/\\\\|dpDP]"
+)
 
-    # Rimuove spazi multipli e va a capo
-    text = re.sub(r"\s+", " ", text)
+# Punteggiatura ripetuta (!!! ??? ... ---) ridotta a un solo carattere
+_REPEATED_PUNCTUATION = ("!!", "??", "..", "--")
+_REPEATED_PUNCTUATION_RE = re.compile(r"!!+|\?\?+|\.\.+|--+")
+
+# Spazi prima della punteggiatura
+_SPACE_BEFORE_PUNCTUATION_RE = re.compile(r"\s+(?=[.,!?;:])")
+
+# Caratteri da eliminare: asterischi, parentesi, slash, backslash e doppie virgolette.
+# str.replace (memchr in C) è più veloce di str.translate, che sui testi non ASCII
+# (lettere accentate) passa per una ricerca nel dizionario carattere per carattere
+_DELETE_CHARS = '*[](){}/\\"'
+
+
+def _first_char(match):
+    return match.group()[0]
 
-    # Normalizza la punteggiatura
-    text = re.sub(r"(!+)", "!", text)  # Normalizza esclamazioni multiple
-    text = re.sub(r"(\?+)", "?", text)  # Normalizza punti interrogativi multipli
-    text = re.sub(r"(\.+)", ".", text)  # Normalizza punti multipli
-    text = re.sub(r"(-+)", "-", text)  # Normalizza trattini multipli
-    text = re.sub(r"(\*+)", "", text)  # Rimuove gli asterischi
-    text = re.sub(r"[\[\]\(\)\{\}]", "", text)  # Rimuove le parentesi
-    text = re.sub(r"[/\\]", "", text)  # Rimuove slash e backslash
-    text = re.sub(r'"', '', text)      # Rimuove le doppie virgolette
 
-    # Rimuove spazi prima della punteggiatura
-    text = re.sub(r"\s+([.,!?;:])", r"\1", text)
+def clean_text(text):
+    """
+    Pulisce il testo rimuovendo emoji, caratteri speciali e normalizzando la punteggiatura.
+    Le regex sono precompilate e i passaggi non necessari vengono saltati con controlli
+    veloci; l'output è identico alla versione a passate re.sub successive.
+    Args:  text (str): Testo da pulire
+    Returns:      str: Testo pulito e ottimizzato
+    """
+    # Rimuove emoji ed emoticon testuali (la regex completa solo se ci sono caratteri emoji)
+    if text and max(text) >= _EMOJI_MIN_CHAR:
+        text = _EMOJI_EMOTICON_RE.sub("", text)
+    elif ":" in text or ";" in text or "=" in text:
+        text = _EMOTICON_RE.sub("", text)
+
+    # Rimuove spazi multipli e va a capo
+    text = " ".join(text.split())
+
+    # Normalizza la punteggiatura ripetuta (esclamazioni, interrogativi, punti, trattini)
+    if any(rep in text for rep in _REPEATED_PUNCTUATION):
+        text = _REPEATED_PUNCTUATION_RE.sub(_first_char, text)
 
-    # Rimuove spazi extra
-    text = text.strip()
+    # Rimuove asterischi, parentesi, slash, backslash e doppie virgolette
+    for char in _DELETE_CHARS:
+        if char in text:
+            text = text.replace(char, "")
 
-    # Converte in ascii e restituisce
-    return text
+    # Rimuove spazi prima della punteggiatura e spazi extra
+    return _SPACE_BEFORE_PUNCTUATION_RE.sub("", text).strip()
 
 def clean_markdown(text):
     # Rimuove gli eventuali blocchi di codice Markdown e spazi bianchi extra
@@ -96,23 +120,29 @@ def clean_markdown(text):
     cleaned = cleaned.strip()  # Rimuove eventuali spazi rimasti
     return cleaned
 
+import ast
 import json
 
-def extract_and_parse_llm_json(response_text):
-    """
-    Estrae il primo blocco JSON valido dalla risposta di un LLM.
-    
-    1. Cerca i blocchi racchiusi tra ```json e ``` o anche solo parentesi graffe.
-    2. Pulisce eventuali stringhe contenenti commenti (// o /* */) inseriti erroneamente dall'LLM.
-    3. Tenta di fare il parsing JSON e, appena trova un blocco con la chiave "chunks", lo restituisce scartando il resto.
-    4. Se nessun blocco JSON è valido, restituisce un JSON strutturato di fallback (System Confused).
-    
-    Args:
-        response_text (str): La risposta testuale generata dall'LLM, che può contenere Markdown extra, commenti, o multipli JSON.
-        
-    Returns:
-        dict: Il primo oggetto JSON che rispetta la struttura di base, oppure un JSON di "Confusione" e "NO_ACTION".
-    """
+# Risposta di fallback quando dalla risposta dell'LLM non si ottiene un JSON valido
+FALLBACK_TEXT = "Adesso non posso rispondere: sono confuso!"
+FALLBACK_MOVEMENT = "animations/Stand/Emotions/Neutral/Confused_1"
+
+
+def get_fallback_response():
+    """Restituisce un nuovo JSON strutturato di fallback (System Confused)"""
+    return {
+        "action": "NO_ACTION",
+        "chunks": [
+            {
+                "text": FALLBACK_TEXT,
+                "movements": [FALLBACK_MOVEMENT]
+            }
+        ]
+    }
+
+
+def _find_json_blocks(response_text):
+    """Trova i blocchi candidati a contenere JSON (markdown, parentesi graffe o testo intero)"""
     # 1. Trova i blocchi JSON racchiusi da codifica Markdown
     blocks = re.findall(r'```(?:json)?\s*(.*?)\s*```', response_text, re.DOTALL)
     
@@ -131,44 +161,247 @@ def extract_and_parse_llm_json(response_text):
         else:
             # Se ancora vuoto, tenta di testare l'intera stringa come potenziale blocco JSON malformato
             blocks = [response_text]
-            
-    # Variabile per immagazzinare il primo JSON semanticamente valido
-    first_valid_json = None
+
+    return blocks
+
+
+def _clean_json_block(block):
+    """Rimuove commenti C-style e virgole finali extra da un blocco JSON"""
+    # Rimuove in sicurezza commenti C-style (// o /* */)
+    # Usiamo un lookbehind per evitare di tagliare "http://"
+    block_cleaned = re.sub(r'(?<![:"a-zA-Z])//.*?\n|/\*.*?\*/', '\n', block + '\n', flags=re.DOTALL)
     
+    # Rimuove le virgole finali extra (trailing commas) prima di parentesi quadre o graffe di chiusura
+    return re.sub(r',\s*([}\]])', r'\1', block_cleaned)
+
+
+def _parse_json_blocks(blocks):
+    """Restituisce il primo blocco che è un JSON valido con la chiave "chunks", altrimenti None"""
     for block in blocks:
         try:
-            # Rimuove in sicurezza commenti C-style (// o /* */)
-            # Usiamo un lookbehind per evitare di tagliare "http://"
-            block_cleaned = re.sub(r'(?<![:"a-zA-Z])//.*?\n|/\*.*?\*/', '\n', block + '\n', flags=re.DOTALL)
-            
-            # Rimuove le virgole finali extra (trailing commas) prima di parentesi quadre o graffe di chiusura
-            block_cleaned = re.sub(r',\s*([}\]])', r'\1', block_cleaned)
-            
-            obj = json.loads(block_cleaned)
+            obj = json.loads(_clean_json_block(block))
             
             # Controlla la struttura coerente minima
             if isinstance(obj, dict) and "chunks" in obj:
-                first_valid_json = obj
-                break # Fermati al primo JSON valido trovato, scartando il resto
+                return obj # Fermati al primo JSON valido trovato, scartando il resto
                 
         except json.JSONDecodeError:
             # Ignora i blocchi che non sono formattabili in JSON
             continue
-            
+
+    return None
+
+
+def extract_and_parse_llm_json(response_text):
+    """
+    Estrae il primo blocco JSON valido dalla risposta di un LLM.
+    
+    1. Cerca i blocchi racchiusi tra ```json e ``` o anche solo parentesi graffe.
+    2. Pulisce eventuali stringhe contenenti commenti (// o /* */) inseriti erroneamente dall'LLM.
+    3. Tenta di fare il parsing JSON e, appena trova un blocco con la chiave "chunks", lo restituisce scartando il resto.
+    4. Se nessun blocco JSON è valido, restituisce un JSON strutturato di fallback (System Confused).
+    
+    Args:
+        response_text (str): La risposta testuale generata dall'LLM, che può contenere Markdown extra, commenti, o multipli JSON.
+        
+    Returns:
+        dict: Il primo oggetto JSON che rispetta la struttura di base, oppure un JSON di "Confusione" e "NO_ACTION".
+    """
+    first_valid_json = _parse_json_blocks(_find_json_blocks(response_text))
+
     if first_valid_json:
         return first_valid_json
     
     # Ritorna JSON di Fallback in caso di mancanza di risposte JSON esatte
-    fallback_response = {
-        "action": "NO_ACTION",
-        "chunks": [
-            {
-                "text": "Adesso non posso rispondere: sono confuso!",
-                "movements": ["animations/Stand/Emotions/Neutral/Confused_1"]
-            }
-        ]
-    }
-    return fallback_response
+    return get_fallback_response()
+
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _scan_json(text):
+    """
+    Scansiona un JSON malformato correggendo al volo i difetti più comuni:
+    stringhe tra apici singoli, a capo non escapati nelle stringhe e parentesi
+    di chiusura sbilanciate (mancanti o in eccesso).
+    Returns:
+        tuple: (testo corretto, pila delle parentesi aperte, stringa aperta,
+                punti di taglio sicuri [(lunghezza, pila)])
+    """
+    out = []
+    stack = []
+    cuts = []
+    in_string = False
+    quote = '"'
+    escape = False
+
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+                if quote == "'" and ch == "'":
+                    out[-1] = "'"       # \' non è un escape valido in JSON
+                    continue
+                out.append(ch)
+            elif ch == "\\":
+                escape = True
+                out.append(ch)
+            elif ch == quote:
+                in_string = False
+                out.append('"')
+            elif ch == '"':
+                out.append('\\"')      # doppi apici dentro una stringa tra apici singoli
+            elif ch == "\n":
+                out.append("\\n")
+            elif ch == "\r":
+                out.append("\\r")
+            elif ch == "\t":
+                out.append("\\t")
+            else:
+                out.append(ch)
+            continue
+
+        if ch in ('"', "'"):
+            in_string = True
+            quote = ch
+            out.append('"')
+        elif ch in _CLOSERS:
+            stack.append(ch)
+            out.append(ch)
+            cuts.append((len(out), tuple(stack)))
+        elif ch in ("}", "]"):
+            opener = "{" if ch == "}" else "["
+            if opener not in stack:
+                continue                # parentesi di chiusura in eccesso: scartata
+            while stack[-1] != opener:
+                out.append(_CLOSERS[stack.pop()])
+            stack.pop()
+            out.append(ch)
+            if not stack:
+                break                   # oggetto principale chiuso: ignora il resto
+            cuts.append((len(out), tuple(stack)))
+        elif ch == "," and stack:
+            cuts.append((len(out), tuple(stack)))
+            out.append(ch)
+        else:
+            out.append(ch)
+
+    return "".join(out), stack, in_string, cuts
+
+
+def _close_json(text, stack):
+    """Chiude un JSON troncato aggiungendo le parentesi mancanti"""
+    text = text.rstrip()
+    if text.endswith(","):
+        text = text[:-1]
+    elif text.endswith(":"):
+        text += " null"
+    return text + "".join(_CLOSERS[opener] for opener in reversed(stack))
+
+
+def _normalize_llm_response(obj):
+    """
+    Verifica che l'oggetto riparato sia una risposta utilizzabile:
+    almeno un chunk con testo non vuoto. Scarta i chunk incompleti.
+    """
+    if not isinstance(obj, dict) or not isinstance(obj.get("chunks"), list):
+        return None
+
+    chunks = []
+    for chunk in obj["chunks"]:
+        if isinstance(chunk, dict) and isinstance(chunk.get("text"), str) and chunk["text"].strip():
+            movements = chunk.get("movements")
+            chunks.append({
+                "text": chunk["text"],
+                "movements": movements if isinstance(movements, list) else []
+            })
+
+    if not chunks:
+        return None
+
+    obj["chunks"] = chunks
+    if not isinstance(obj.get("action"), str):
+        obj["action"] = "NO_ACTION"
+    return obj
+
+
+def repair_llm_json(response_text):
+    """
+    Tenta di riparare localmente una risposta LLM con JSON malformato.
+    
+    Corregge parentesi sbilanciate, stringhe tra apici singoli (dict Python),
+    a capo non escapati nelle stringhe e risposte troncate (che vengono chiuse,
+    preferendo l'ultimo punto sicuro prima del troncamento).
+    
+    Args:
+        response_text (str): La risposta testuale generata dall'LLM
+        
+    Returns:
+        dict: La risposta riparata con almeno un chunk valido, oppure None
+    """
+    blocks = _find_json_blocks(response_text)
+    start = response_text.find("{")
+    if start >= 0:
+        # Prima prova dalla prima graffa fino alla fine del testo (copre le risposte troncate,
+        # la scansione si ferma comunque alla chiusura dell'oggetto principale)
+        blocks = [response_text[start:]] + blocks
+
+    for block in blocks:
+        cleaned = _clean_json_block(block).strip()
+        if not cleaned.startswith(("{", "[")):
+            brace = cleaned.find("{")
+            if brace < 0:
+                continue
+            cleaned = cleaned[brace:]
+
+        fixed, stack, in_string, cuts = _scan_json(cleaned)
+        if in_string:
+            fixed += '"'
+
+        candidates = [_close_json(fixed, stack)]
+        if cuts:
+            cut_len, cut_stack = cuts[-1]
+            candidates.insert(0, _close_json(fixed[:cut_len], cut_stack))
+
+        for candidate in candidates:
+            try:
+                obj = _normalize_llm_response(json.loads(_clean_json_block(candidate)))
+            except json.JSONDecodeError:
+                continue
+            if obj:
+                return obj
+
+        # Ultimo tentativo: dizionario in sintassi Python (apici singoli, True/False/None)
+        try:
+            obj = _normalize_llm_response(ast.literal_eval(cleaned))
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            obj = None
+        if obj:
+            return obj
+
+    return None
+
+
+def parse_llm_json(response_text):
+    """
+    Estrae il JSON dalla risposta dell'LLM, con riparazione locale se necessario.
+    
+    Args:
+        response_text (str): La risposta testuale generata dall'LLM
+        
+    Returns:
+        tuple: (oggetto, esito) con esito "parsed" o "local_repair";
+               (None, None) se la risposta non è recuperabile localmente
+    """
+    obj = _parse_json_blocks(_find_json_blocks(response_text))
+    if obj:
+        return obj, "parsed"
+
+    obj = repair_llm_json(response_text)
+    if obj:
+        return obj, "local_repair"
+
+    return None, None
 
 # test di utilizzo
 if __name__ == "__main__":
@@ -45,14 +45,23 @@ Es. "Emotions/Positive/Interested(2)" => "animations/Stand/Emotions/Positive/Int
 
 import random
 import re
+import threading
+from collections import defaultdict
+
+# Prefisso delle animazioni di NAO in posizione eretta
+ANIMATION_PREFIX = "animations/Stand/"
+
+# Suffisso delle varianti multiple: _(nn)
+_VARIANTS_RE = re.compile(r'_\((\d+)\)$')
+# Suffisso di una singola variante: _n (es. Happy_3)
+_VARIANT_NUMBER_RE = re.compile(r'_\d+$')
 
 def fix_animation(movimento):
     """ Funzione helper per processare un singolo movimento
     " se a fine stringa c'è un numero tra parentesi
     " genera una stringa casuale da 1 a N
     """
-    pattern = r'_\((\d+)\)$' #verifica se a fine stringa è presente _(nn)
-    match = re.search(pattern, movimento)
+    match = _VARIANTS_RE.search(movimento) #verifica se a fine stringa è presente _(nn)
     
     if match:
         # Estrae il numero tra parentesi
@@ -60,9 +69,150 @@ def fix_animation(movimento):
         # Genera numero casuale tra 1 e num_max
         num_random = random.randint(1, num_max)
         # Sostituisce (numero) con _numero
-        movimento = re.sub(pattern, f'_{num_random}', movimento)
+        movimento = f"{movimento[:match.start()]}_{num_random}"
+    
+    return ANIMATION_PREFIX + movimento
+
+
+def _normalize(movimento):
+    """
+    Chiave di ricerca: minuscolo, senza prefisso animations/Stand/ e senza suffisso _(nn).
+    Il suffisso _n resta: Yes_1 e Yes_2 sono movimenti distinti della libreria
+    """
+    key = movimento.strip().lower()
+    if key.startswith(ANIMATION_PREFIX.lower()):
+        key = key[len(ANIMATION_PREFIX):]
+    return _VARIANTS_RE.sub("", key)
+
+
+def _split_variant(key):
+    """Separa il suffisso _n: ("happy", 3) per "happy_3", (key, None) se assente"""
+    match = _VARIANT_NUMBER_RE.search(key)
+    if not match:
+        return key, None
+    return key[:match.start()], int(match.group(0)[1:])
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class MovementIndex:
+    """
+    Indice dei movimenti di movements_library, costruito una sola volta all'avvio.
     
-    return "animations/Stand/" + movimento
+    Ogni nome canonico è associato al percorso completo animations/Stand/... e al
+    numero di varianti: l'espansione di un movimento è una ricerca nel dizionario
+    più un indice casuale. I movimenti sconosciuti o scritti male vengono corretti
+    tramite un indice di trigrammi, oppure scartati.
+    """
+
+    def __init__(self, movements_library, min_similarity=0.75, cache_size=1024):
+        """
+        Args:
+            movements_library: Lista dei movimenti (es. "Emotions/Positive/Happy_(4)")
+            min_similarity: Similarità minima (coefficiente di Dice sui trigrammi) per la correzione
+            cache_size: Numero massimo di correzioni memorizzate
+        """
+        self.min_similarity = min_similarity
+        self._cache_size = cache_size
+        self._exact = {}                    # nome in libreria -> (percorso, varianti)
+        self._entries = {}                  # chiave normalizzata -> (percorso, varianti)
+        self._bases = {}                    # chiave senza suffisso _n -> (percorso, varianti)
+        self._trigrams = {}                 # chiave normalizzata -> trigrammi
+        self._index = defaultdict(set)      # trigramma -> chiavi normalizzate
+        self._fuzzy_cache = {}
+        self._lock = threading.Lock()
+        self.stats = {"exact": 0, "normalized": 0, "fuzzy": 0, "dropped": 0}
+
+        for movimento in movements_library:
+            match = _VARIANTS_RE.search(movimento)
+            if match:
+                entry = (ANIMATION_PREFIX + movimento[:match.start()], int(match.group(1)))
+            else:
+                entry = (ANIMATION_PREFIX + movimento, 0)
+
+            self._exact[movimento] = entry
+            key = _normalize(movimento)
+            self._bases.setdefault(_split_variant(key)[0], entry)
+            if key not in self._entries:
+                self._entries[key] = entry
+                self._trigrams[key] = _trigrams(key)
+                for gram in self._trigrams[key]:
+                    self._index[gram].add(key)
+
+    def __len__(self):
+        return len(self._exact)
+
+    def __contains__(self, movimento):
+        return movimento in self._exact
+
+    def _count(self, outcome):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def _fuzzy_match(self, key):
+        """Restituisce la chiave più simile (trigrammi in comune), None se sotto soglia"""
+        if key in self._fuzzy_cache:
+            return self._fuzzy_cache[key]
+
+        grams = _trigrams(key)
+        shared = defaultdict(int)
+        for gram in grams:
+            for candidate in self._index.get(gram, ()):
+                shared[candidate] += 1
+
+        best_key, best_score = None, 0.0
+        for candidate, common in shared.items():
+            score = 2.0 * common / (len(grams) + len(self._trigrams[candidate]))
+            if score > best_score:
+                best_key, best_score = candidate, score
+
+        result = best_key if best_score >= self.min_similarity else None
+        with self._lock:
+            if len(self._fuzzy_cache) >= self._cache_size:
+                self._fuzzy_cache.clear()
+            self._fuzzy_cache[key] = result
+        return result
+
+    def resolve(self, movimento):
+        """
+        Converte un movimento restituito dall'LLM nel percorso dell'animazione di NAO
+        Args:
+            movimento: Nome del movimento (es. "Emotions/Positive/Happy_(4)"), anche
+                       come percorso completo (animations/Stand/...)
+        Returns:
+            str: Percorso completo con variante casuale, None se il movimento non esiste
+        """
+        variant = None
+        entry = self._exact.get(movimento)
+        if entry is not None:
+            self._count("exact")
+        else:
+            key = _normalize(movimento)
+            entry = self._entries.get(key)
+            if entry is None:
+                # Variante _n di un movimento della libreria (es. Happy_3 per Happy_(4))
+                base, variant = _split_variant(key)
+                entry = self._bases.get(base) if variant is not None else None
+            if entry is not None:
+                self._count("normalized")
+            else:
+                match_key = self._fuzzy_match(key)
+                if match_key is None:
+                    self._count("dropped")
+                    return None
+                entry = self._entries[match_key]
+                variant = None
+                self._count("fuzzy")
+
+        path, variants = entry
+        if variants:
+            if variant is None or not 1 <= variant <= variants:
+                variant = random.randint(1, variants)
+            return f"{path}_{variant}"
+        return path
 
 # test di utilizzo
 if __name__ == "__main__":
@@ -74,3 +224,7 @@ if __name__ == "__main__":
     print(test_movement)
     print("\nmovimento corretto:")
     print(fixed)
+
+    index = MovementIndex(["Emotions/Positive/Happy_(12)", "Gestures/Hey_(7)", "NAO/Emotions/Negative/Angry_1"])
+    for movimento in ["Emotions/Positive/Happy_(12)", "Emotions/Positive/Happy_3", "Gestures/Hei_(7)", "Dance/Macarena"]:
+        print(f"{movimento} => {index.resolve(movimento)}")
@@ -57,10 +57,11 @@ from utils.cleantext import clean_text
 from utils.cleantext import clean_markdown
 from ai_prompts.system_prompt import SYSTEM_PROMPT_BASE
 from ai_prompts.technical_prompt import TECHNICAL_INSTRUCTIONS
-from ai_prompts.system_prompt import create_response_schema
+from ai_prompts.system_prompt import create_response_schema, to_gemini_schema
 from ai_prompts.system_prompt import GENERATION_CONFIG_BASE
 from utils.chat_logger import ChatLogger
 from utils.fix_movements import fix_animation
+from utils.chat_id import ChatIdGenerator, worker_shard
 from flask import jsonify
 
 #Personalità di default in caso di errori
@@ -96,7 +97,7 @@ class GeminiChatAPI:
         actions_keys_list = list(self.actions_map.keys())
         
         # Crea lo schema usando le chiavi
-        response_schema = create_response_schema(movements_list, actions_keys_list)
+        response_schema = to_gemini_schema(create_response_schema(movements_list, actions_keys_list))
         
         # Configura le SYSTEM_INSTRUCTION 
         # AGPL Section 7(b) Protected Attribution - DO NOT MODIFY
@@ -115,6 +116,10 @@ class GeminiChatAPI:
         # Dizionario per memorizzare le chat attive
         self.active_chats = {}
 
+        # Generatore dei chat_id: brevi, univoci e con il prefisso dello shard del worker
+        # (CHAT_ID_SHARD più l'indice del worker gunicorn, vedi gunicorn.conf.py)
+        self.chat_ids = ChatIdGenerator(worker_shard())
+
         # Dizionario per memorizzare le personalità personalizzate per ogni chat
         # Formato: {chat_id: personality_name}
         self.chat_personalities = {}
@@ -523,7 +528,7 @@ class GeminiChatAPI:
                 self.logger.log_info(f"Continuazione chat esistente: {chat_id}")
             else:
                 chat_history = []
-                chat_id = str(id(chat_history))
+                chat_id = self.chat_ids.new_id()
                 self.active_chats[chat_id] = chat_history
                 self.logger.log_info(f"Nuova chat creata: {chat_id}")
 
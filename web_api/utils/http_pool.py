@@ -0,0 +1,189 @@
+"""
+File:	/web_api/utils/http_pool.py
+-----
+Class HttpPool - Client HTTP condiviso (keep-alive, HTTP/2, limiti del pool e
+ping delle connessioni inattive) iniettato in LiteLLM
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 3:59:57 am
+-----
+Last Modified: 	October 19th 2026 3:59:57 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Additional Terms under Section 7(b):
+
+The following attribution requirements apply to this work:
+
+1. Copyright notices and author attribution in source code files
+   cannot be removed or altered.
+2. Any interactive user interface must preserve and display
+   author attribution (Copyright, authors, project name).
+3. System prompts containing author information cannot be modified
+4. Public demonstrations, publications and derivative works
+   must credit the original authors.
+
+For full Additional Terms see the LICENSE file.
+------------------------------------------------------------------------------
+"""
+
+import importlib.util
+import threading
+import time
+
+# Provider che in LiteLLM usano HTTPHandler: il client viene passato a completion() con client=
+HTTP_HANDLER_PROVIDERS = {"gemini", "vertex_ai", "vertex_ai_beta", "anthropic"}
+
+# URL dei provider, usati per tenere calde le connessioni inattive
+PROVIDER_BASE_URLS = {
+    "gemini": "https://generativelanguage.googleapis.com",
+    "openai": "https://api.openai.com",
+    "openrouter": "https://openrouter.ai",
+    "anthropic": "https://api.anthropic.com",
+}
+
+
+def get_provider(model):
+    """Restituisce il provider LiteLLM di un modello (prefisso prima di '/')"""
+    if "/" in model:
+        return model.split("/", 1)[0]
+    if model.startswith("claude"):
+        return "anthropic"
+    return "openai"
+
+
+class HttpPool:
+    """
+    Client HTTP condiviso da tutte le chiamate LLM.
+
+    Un unico httpx.Client (thread-safe) mantiene un pool di connessioni per
+    ogni host del provider: le richieste successive riusano la connessione TLS
+    già aperta invece di ripetere l'handshake. Viene impostato come
+    litellm.client_session (provider compatibili OpenAI) e passato come
+    HTTPHandler ai provider nativi (Gemini, Anthropic). Un thread opzionale
+    invia una richiesta HEAD quando il pool resta inattivo, così le connessioni
+    non vengono chiuse da provider, NAT o proxy.
+    """
+
+    def __init__(self, max_connections=20, max_keepalive_connections=10, keepalive_expiry=120.0,
+                 http2=True, ping_interval=0.0, connect_timeout=5.0, logger=None):
+        """
+        Args:
+            max_connections: Connessioni massime aperte (tutti gli host)
+            max_keepalive_connections: Connessioni inattive mantenute aperte
+            keepalive_expiry: Secondi dopo cui una connessione inattiva viene chiusa
+            http2: Usa HTTP/2 se il pacchetto h2 è installato
+            ping_interval: Secondi di inattività dopo cui inviare un ping (0 = disattivato)
+            connect_timeout: Timeout di connessione (secondi)
+            logger: Istanza di ChatLogger (opzionale)
+        """
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        self.ping_interval = ping_interval
+        self.connect_timeout = connect_timeout
+        self.logger = logger
+        self.client = None
+        self.ping_urls = []
+        self._handler = None
+        self._last_used = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {"requests": 0, "pings": 0, "ping_errors": 0}
+
+    def install(self, litellm, models, api_base=None):
+        """
+        Crea il client condiviso e lo inietta in LiteLLM
+        Args:
+            litellm: Modulo litellm già importato
+            models: Modelli usati (per ricavare gli host da tenere caldi)
+            api_base: URL base personalizzato del provider (opzionale)
+        """
+        if self.client is not None:
+            return
+        import httpx
+
+        self.client = httpx.Client(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(600.0, connect=self.connect_timeout),
+        )
+        litellm.client_session = self.client
+
+        try:
+            from litellm.llms.custom_httpx.http_handler import HTTPHandler
+            self._handler = HTTPHandler(client=self.client)
+        except Exception as e:
+            self._log_warning(f"[HTTP] HTTPHandler di LiteLLM non disponibile, pool solo per i provider OpenAI: {e}")
+
+        self.ping_urls = sorted({api_base or PROVIDER_BASE_URLS.get(get_provider(m)) for m in models} - {None})
+
+        if self.ping_interval > 0 and self.ping_urls:
+            self._thread = threading.Thread(target=self._ping_loop, name="http-pool-ping", daemon=True)
+            self._thread.start()
+
+    def completion_kwargs(self, model):
+        """Parametri da aggiungere a litellm.completion per usare il pool con il modello indicato"""
+        self._last_used = time.monotonic()
+        self._stats["requests"] += 1
+        if self._handler is not None and get_provider(model) in HTTP_HANDLER_PROVIDERS:
+            return {"client": self._handler}
+        return {}
+
+    def _ping_loop(self):
+        while not self._stop.wait(self.ping_interval):
+            if time.monotonic() - self._last_used < self.ping_interval:
+                continue
+            for url in self.ping_urls:
+                try:
+                    self.client.head(url, timeout=self.connect_timeout)
+                    self._stats["pings"] += 1
+                except Exception:
+                    self._stats["ping_errors"] += 1
+
+    def _log_warning(self, message):
+        if self.logger:
+            self.logger.log_warning(message)
+
+    def close(self):
+        """Ferma il thread di ping e chiude le connessioni"""
+        self._stop.set()
+        if self.client is not None:
+            self.client.close()
+
+    def get_stats(self):
+        """
+        Restituisce configurazione e contatori del pool
+        Returns:
+            dict: Stato del pool
+        """
+        return {
+            "installed": self.client is not None,
+            "http2": self.http2,
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "keepalive_expiry_s": self.keepalive_expiry,
+            "ping_interval_s": self.ping_interval,
+            "ping_urls": self.ping_urls,
+            **self._stats,
+        }
@@ -0,0 +1,277 @@
+"""
+File:	/web_api/utils/key_scheduler.py
+-----
+Class ApiKeyScheduler - Scheduler delle API key con controllo di salute,
+limiti per minuto (richieste e token) e cooldown esponenziale
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 3:39:25 am
+-----
+Last Modified: 	October 19th 2026 4:49:14 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Additional Terms under Section 7(b):
+
+The following attribution requirements apply to this work:
+
+1. Copyright notices and author attribution in source code files
+   cannot be removed or altered.
+2. Any interactive user interface must preserve and display
+   author attribution (Copyright, authors, project name).
+3. System prompts containing author information cannot be modified
+4. Public demonstrations, publications and derivative works
+   must credit the original authors.
+
+For full Additional Terms see the LICENSE file.
+------------------------------------------------------------------------------
+"""
+
+import threading
+import time
+from collections import deque
+
+# Finestra (in secondi) su cui vengono calcolati RPM, TPM ed errori recenti
+WINDOW_SECONDS = 60.0
+
+# Codici HTTP per cui ha senso ritentare la chiamata con un'altra chiave
+RATE_LIMIT_STATUS = {429}
+AUTH_ERROR_STATUS = {401, 403}
+
+# Classi di eccezione LiteLLM (confrontate per nome sull'MRO, senza importare
+# litellm) usate quando l'eccezione non espone il codice HTTP
+RATE_LIMIT_ERRORS = {"RateLimitError"}
+AUTH_ERRORS = {"AuthenticationError", "PermissionDeniedError"}
+
+
+def _get_status_code(error):
+    """Estrae il codice HTTP da un'eccezione (LiteLLM/OpenAI/httpx), se presente"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _error_classes(error):
+    """Nomi delle classi dell'eccezione e delle sue superclassi"""
+    return {cls.__name__ for cls in type(error).__mro__}
+
+
+def is_rate_limit_error(error):
+    """Verifica se l'eccezione indica un rate limit o una quota esaurita (429)"""
+    if _get_status_code(error) in RATE_LIMIT_STATUS:
+        return True
+    return bool(_error_classes(error) & RATE_LIMIT_ERRORS)
+
+
+def is_auth_error(error):
+    """Verifica se l'eccezione indica una chiave non valida o senza permessi (401/403)"""
+    if _get_status_code(error) in AUTH_ERROR_STATUS:
+        return True
+    return bool(_error_classes(error) & AUTH_ERRORS)
+
+
+def is_retryable_error(error):
+    """
+    Verifica se la chiamata fallita può essere ritentata con un'altra chiave:
+    solo gli errori che dipendono dalla chiave (rate limit, quota, chiave non valida).
+    5xx e timeout sono problemi del provider o del modello: li gestisce il router
+    dei modelli (fallback e hedging), non la rotazione delle chiavi
+    """
+    return is_rate_limit_error(error) or is_auth_error(error)
+
+
+def mask_key(key):
+    """Restituisce una versione mascherata della chiave, sicura per log e statistiche"""
+    if not key:
+        return "<none>"
+    return f"...{key[-4:]}" if len(key) > 8 else "****"
+
+
+class _KeyState:
+    """Stato di salute e carico di una singola API key"""
+
+    def __init__(self, key):
+        self.key = key
+        self.in_flight = 0
+        self.requests = deque()         # timestamp delle richieste nell'ultima finestra
+        self.tokens = deque()           # (timestamp, token) nell'ultima finestra
+        self.errors = deque()           # timestamp degli errori nell'ultima finestra
+        self.consecutive_errors = 0
+        self.cooldown_until = 0.0
+        self.last_used = 0.0
+        self.total_requests = 0
+        self.total_errors = 0
+        self.total_tokens = 0
+
+    def prune(self, now):
+        """Elimina gli eventi usciti dalla finestra di osservazione"""
+        limit = now - WINDOW_SECONDS
+        while self.requests and self.requests[0] < limit:
+            self.requests.popleft()
+        while self.tokens and self.tokens[0][0] < limit:
+            self.tokens.popleft()
+        while self.errors and self.errors[0] < limit:
+            self.errors.popleft()
+
+    def tokens_per_minute(self):
+        return sum(count for _, count in self.tokens)
+
+
+class ApiKeyScheduler:
+    """
+    Distribuisce le richieste tra più API key dello stesso provider.
+
+    Per ogni chiave tiene traccia delle richieste in corso, delle richieste e dei
+    token consumati nell'ultimo minuto e degli errori recenti. Le chiavi che
+    ricevono 429/quota esaurita vanno in cooldown esponenziale; a ogni richiesta
+    viene scelta la chiave sana meno carica. Thread-safe.
+    """
+
+    def __init__(self, api_keys, rpm_limit=0, tpm_limit=0, base_cooldown=5.0,
+                 max_cooldown=300.0, clock=time.monotonic):
+        """
+        Args:
+            api_keys: Lista delle API key disponibili
+            rpm_limit: Richieste al minuto consentite per chiave (0 = nessun limite)
+            tpm_limit: Token al minuto consentiti per chiave (0 = nessun limite)
+            base_cooldown: Cooldown iniziale (secondi) dopo un errore di rate limit
+            max_cooldown: Cooldown massimo (secondi)
+            clock: Funzione che restituisce il tempo corrente (per i test)
+        """
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._states = {key: _KeyState(key) for key in api_keys}
+
+    def __len__(self):
+        return len(self._states)
+
+    def _is_healthy(self, state, now):
+        """Una chiave è sana se non è in cooldown e non ha superato i limiti al minuto"""
+        if state.cooldown_until > now:
+            return False
+        if self.rpm_limit and len(state.requests) + state.in_flight >= self.rpm_limit:
+            return False
+        if self.tpm_limit and state.tokens_per_minute() >= self.tpm_limit:
+            return False
+        return True
+
+    def acquire(self, exclude=()):
+        """
+        Seleziona la chiave da usare per la prossima richiesta e la marca come in uso.
+        Args:
+            exclude: Chiavi da non usare (es. già fallite per questa richiesta)
+        Returns:
+            str: API key scelta, None se non ci sono chiavi disponibili
+        """
+        with self._lock:
+            now = self._clock()
+            candidates = [s for k, s in self._states.items() if k not in exclude]
+            if not candidates:
+                return None
+
+            for state in candidates:
+                state.prune(now)
+
+            healthy = [s for s in candidates if self._is_healthy(s, now)]
+            if healthy:
+                # Meno richieste in corso, poi meno richieste recenti, poi meno errori;
+                # a parità vince la chiave usata meno di recente (round robin naturale)
+                state = min(
+                    healthy,
+                    key=lambda s: (s.in_flight, len(s.requests), len(s.errors), s.last_used),
+                )
+            else:
+                # Tutte le chiavi sono sature o in cooldown: usa quella che si libera prima
+                state = min(candidates, key=lambda s: (s.cooldown_until, s.in_flight, s.last_used))
+
+            state.in_flight += 1
+            state.requests.append(now)
+            state.last_used = now
+            state.total_requests += 1
+            return state.key
+
+    def release(self, key, tokens=0, error=None):
+        """
+        Registra l'esito di una richiesta effettuata con la chiave indicata.
+        Args:
+            key: API key restituita da acquire()
+            tokens: Token consumati dalla richiesta (se noti)
+            error: Eccezione sollevata dalla richiesta, None in caso di successo
+        """
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                return
+
+            now = self._clock()
+            state.in_flight = max(0, state.in_flight - 1)
+
+            if tokens:
+                state.tokens.append((now, tokens))
+                state.total_tokens += tokens
+
+            if error is None:
+                state.consecutive_errors = 0
+                return
+
+            state.errors.append(now)
+            state.total_errors += 1
+
+            # Solo 429 e 401/403 dipendono dalla chiave: un 5xx o un timeout è un
+            # problema del provider e non deve escludere la chiave
+            if is_auth_error(error):
+                # Chiave non valida o revocata: la escludiamo per il tempo massimo
+                state.cooldown_until = now + self.max_cooldown
+            elif is_rate_limit_error(error):
+                state.consecutive_errors += 1
+                cooldown = self.base_cooldown * (2 ** (state.consecutive_errors - 1))
+                state.cooldown_until = now + min(cooldown, self.max_cooldown)
+
+    def get_stats(self):
+        """
+        Restituisce le statistiche di ogni chiave (mascherata) per il monitoraggio
+        Returns:
+            list: Un dizionario per chiave
+        """
+        with self._lock:
+            now = self._clock()
+            stats = []
+            for state in self._states.values():
+                state.prune(now)
+                stats.append({
+                    "key": mask_key(state.key),
+                    "healthy": self._is_healthy(state, now),
+                    "in_flight": state.in_flight,
+                    "requests_per_minute": len(state.requests),
+                    "tokens_per_minute": state.tokens_per_minute(),
+                    "errors_per_minute": len(state.errors),
+                    "cooldown_remaining_s": round(max(0.0, state.cooldown_until - now), 1),
+                    "total_requests": state.total_requests,
+                    "total_errors": state.total_errors,
+                    "total_tokens": state.total_tokens,
+                })
+            return stats
@@ -46,26 +46,63 @@ For full Additional Terms see the LICENSE file.
 """
 
 import os
+import atexit
 import json
 import re
+import itertools
 import importlib
 import random
+import threading
+import time
 from dotenv import load_dotenv
-from litellm import completion
-import litellm
 from utils.cleantext import clean_text
 from utils.cleantext import clean_markdown
+from utils.cleantext import parse_llm_json, get_fallback_response
 from ai_prompts.system_prompt import SYSTEM_PROMPT_BASE
 from ai_prompts.technical_prompt import TECHNICAL_INSTRUCTIONS
 from ai_prompts.system_prompt import create_response_schema
 from ai_prompts.system_prompt import GENERATION_CONFIG_BASE
+from ai_prompts.system_prompt import schema_to_json_schema
+from ai_prompts.system_prompt import create_response_format
+from ai_prompts.system_prompt import JSON_REPAIR_PROMPT
 from utils.chat_logger import ChatLogger
-from utils.fix_movements import fix_animation
-from flask import jsonify
+from utils.fix_movements import fix_animation, MovementIndex
+from utils.key_scheduler import ApiKeyScheduler, is_retryable_error, mask_key
+from utils.model_router import ModelRouter
+from utils.chat_search import ChatSearchIndex
+from utils.http_pool import HttpPool
+from utils.session_store import SessionStore, ChatBusyError
+from utils.request_cache import RequestCache, RequestInFlightError
+from utils.chat_id import ChatIdGenerator, worker_shard
+from utils.chat_history import ChatHistory
+from utils.session_snapshot import SessionSnapshot, SnapshotLockedError
+from utils.admission import AdmissionController, AdmissionRejected, parse_mapping
+from flask import jsonify, Response
+from datetime import datetime
 
 #Personalità di default in caso di errori
 ERROR_PERSONALITY = "Sei un robot sociale amichevole"
 
+# LiteLLM richiede alcuni secondi per l'import (metadati di tutti i provider):
+# viene importato al primo utilizzo, normalmente nel thread di warm-up
+_litellm = None
+_litellm_lock = threading.Lock()
+
+
+def get_litellm():
+    """Importa LiteLLM una sola volta (thread-safe) e restituisce il modulo"""
+    global _litellm
+    if _litellm is None:
+        with _litellm_lock:
+            if _litellm is None:
+                import litellm
+                _litellm = litellm
+    return _litellm
+
+# Paginazione dell'azione admin list-chats (chat per pagina: default e massimo)
+ADMIN_PAGE_SIZE = 50
+ADMIN_MAX_PAGE_SIZE = 500
+
 class LLMChatAPI:
     """
     Classe per gestire le interazioni API con vari LLM tramite LiteLLM
@@ -75,18 +112,71 @@ class LLMChatAPI:
         """Inizializza l'API per la gestione delle chat con LLM
         Args: logs_dir -> Directory per i log delle chat
         """
-        # Logger interno alla classe
-        self.logger = ChatLogger(logs_dir)
-
         # Carica le variabili d'ambiente
         self._load_environment()
 
-        # Configura il modello LLM
+        # Logger interno alla classe (asincrono, con rotazione giornaliera e per dimensione)
+        self.logger = ChatLogger(
+            logs_dir,
+            max_bytes=int(float(os.getenv("LOG_MAX_MB", "20")) * 1024 * 1024),
+            retention_days=int(os.getenv("LOG_RETENTION_DAYS", "30")),
+            max_total_bytes=int(float(os.getenv("LOG_MAX_TOTAL_MB", "0")) * 1024 * 1024),
+            compress=os.getenv("LOG_COMPRESS", "true").lower() == "true",
+        )
+
+        # Configura il modello LLM principale e la catena di fallback (in ordine)
         self.llm_model = os.getenv("LLM_MODEL", "gemini/gemini-2.0-flash")
+        fallback_models = [m.strip() for m in os.getenv("LLM_FALLBACK_MODELS", "").split(",") if m.strip()]
+        self.llm_models = [self.llm_model] + [m for m in fallback_models if m != self.llm_model]
+        # URL base alternativo del provider (es. server compatibile OpenAI locale per i benchmark)
+        self.api_base = os.getenv("LLM_API_BASE", "").strip() or None
+        # Tempi per fase (llm_ms, total_ms) inclusi nella risposta di talk
+        self.timing_enabled = os.getenv("TIMING_ENABLED", "false").lower() == "true"
+
+        # Gestione API Key: uno scheduler per provider con limiti per chiave, cooldown e retry su altra chiave
+        self.key_schedulers = {}
+        for model in self.llm_models:
+            env_var = self._get_api_key_env_var(model)
+            if env_var not in self.key_schedulers:
+                self.key_schedulers[env_var] = ApiKeyScheduler(
+                    self._load_api_keys(env_var),
+                    rpm_limit=int(os.getenv("LLM_KEY_RPM_LIMIT", "0")),
+                    tpm_limit=int(os.getenv("LLM_KEY_TPM_LIMIT", "0")),
+                    base_cooldown=float(os.getenv("LLM_KEY_COOLDOWN", "5")),
+                    max_cooldown=float(os.getenv("LLM_KEY_MAX_COOLDOWN", "300")),
+                )
+        # Numero massimo di chiavi provate per una singola richiesta
+        self.key_max_attempts = int(os.getenv("LLM_KEY_MAX_ATTEMPTS", "3"))
+
+        # Chiamate LLM contemporanee ammesse (vedi controllo di ammissione): con l'hedging
+        # ogni chiamata può avere due tentativi in corso. Pool dei tentativi e connessioni
+        # HTTP sono dimensionati su questo numero
+        self.llm_concurrency = int(os.getenv("ADMISSION_LLM_CONCURRENCY", "16"))
+        hedging = os.getenv("LLM_HEDGING", "false").lower() == "true"
+        max_llm_attempts = self.llm_concurrency * (2 if hedging else 1)
+
+        # Router dei modelli: deadline per tentativo, fallback e richieste hedged
+        self.model_router = ModelRouter(
+            self.llm_models,
+            attempt_timeout=float(os.getenv("LLM_ATTEMPT_TIMEOUT", "20")),
+            hedging=hedging,
+            hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+            hedge_min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0")),
+            max_workers=max_llm_attempts,
+            logger=self.logger,
+        )
         
-        # Gestione API Key Rotation
-        self.api_keys = self._load_api_keys()
-        self.current_key_index = 0
+        # Client HTTP condiviso con LiteLLM: keep-alive, HTTP/2 e ping delle connessioni inattive
+        # (creato nel warm-up, dopo l'import di LiteLLM)
+        self.http_pool_enabled = os.getenv("LLM_HTTP_POOL", "true").lower() == "true"
+        self.http_pool = HttpPool(
+            max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS") or max_llm_attempts),
+            max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "10")),
+            keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "120")),
+            http2=os.getenv("LLM_HTTP2", "true").lower() == "true",
+            ping_interval=float(os.getenv("LLM_HTTP_PING_INTERVAL", "45")),
+            logger=self.logger,
+        )
         
         # Recupera i movimenti e le azioni del robot dai file movements.json e actions.json
         movements_list = self._get_movements_from_file()
@@ -95,8 +185,27 @@ class LLMChatAPI:
         # Estrae solo le CHIAVI (es. ACT_DANCE_MACARENA_FLOOR) per lo schema dell'AI
         actions_keys_list = list(self.actions_map.keys())
         
-        # Crea lo schema usando le chiavi (utile per il prompt di sistema)
+        # Crea lo schema usando le chiavi (dizionario JSON Schema, senza importare google-genai)
         self.response_schema = create_response_schema(movements_list, actions_keys_list)
+
+        # Indice dei movimenti ammessi: espansione delle varianti e correzione dei nomi errati;
+        # quelli restituiti dal modello fuori libreria vengono scartati
+        self.movement_index = MovementIndex(movements_list)
+
+        # Decoding vincolato: lo schema (con gli enum di movimenti e azioni) viene inviato
+        # come response_format json_schema ai provider che lo supportano
+        # LLM_STRUCTURED_OUTPUT: auto (verifica il supporto del modello), on, off (solo json_object)
+        self.response_format_schema = create_response_format(schema_to_json_schema(self.response_schema))
+        self.structured_output_mode = os.getenv("LLM_STRUCTURED_OUTPUT", "auto").lower()
+        self._structured_output_support = {}
+
+        # Riparazione JSON malformato: prima correzioni locali, poi un'unica richiesta
+        # di correzione al modello con limite stretto di token
+        self.json_reask_enabled = os.getenv("LLM_JSON_REASK", "true").lower() == "true"
+        self.json_reask_max_tokens = int(os.getenv("LLM_JSON_REASK_MAX_TOKENS", "1024"))
+        # Contatori degli esiti del parsing: quale passaggio ha recuperato la risposta
+        self.json_outcomes = {"parsed": 0, "local_repair": 0, "reask": 0, "fallback": 0}
+        self._stats_lock = threading.Lock()
         
         # Configura le SYSTEM_INSTRUCTION 
         # AGPL Section 7(b) Protected Attribution - DO NOT MODIFY
@@ -104,13 +213,230 @@ class LLMChatAPI:
         self.system_instruction = SYSTEM_PROMPT_BASE + personality
         
         # Dizionario per memorizzare le chat attive
-        # Struttura: {chat_id: [{"role": "user", "content": "..."}, ...]}
+        # Struttura: {chat_id: ChatHistory} (messaggi compatti, vedi utils/chat_history.py)
         self.active_chats = {}
+        # Risposte del modello più lunghe di HISTORY_COMPRESS_MIN_BYTES compresse con zlib (0 = mai)
+        self.history_compress_min_bytes = int(os.getenv("HISTORY_COMPRESS_MIN_BYTES", "256"))
+
+        # Generatore dei chat_id: brevi, univoci e con il prefisso dello shard del worker
+        # (CHAT_ID_SHARD più l'indice del worker gunicorn, vedi gunicorn.conf.py)
+        self.chat_ids = ChatIdGenerator(worker_shard())
 
         # Dizionario per memorizzare le personalità personalizzate per ogni chat
         # Formato: {chat_id: personality_name}
         self.chat_personalities = {}
 
+        # Metadati di ogni chat, aggiornati a ogni messaggio: i riepiloghi admin
+        # non devono scorrere la cronologia. "seq" è il cursore della paginazione
+        # Formato: {chat_id: {"seq": n, "created_at": ts, "last_activity": ts, "bytes": n}}
+        self.chat_meta = {}
+        self._chat_seq = itertools.count(1)
+
+        # Indice full-text dei messaggi delle chat attive (azione admin search);
+        # il testo degli snippet viene letto dalla cronologia, non copiato nell'indice
+        self.search_index = ChatSearchIndex(text_source=self._search_text)
+
+        # Lock per chat: i turni concorrenti sulla stessa chat vengono serializzati (wait)
+        # o rifiutati con 409 (reject)
+        self.sessions = SessionStore(
+            busy_policy=os.getenv("CHAT_BUSY_POLICY", "wait").lower(),
+            lock_timeout=float(os.getenv("CHAT_LOCK_TIMEOUT", "30")),
+        )
+
+        # Deduplicazione dei retry del robot (campo opzionale request_id di /chat e /chat/voice)
+        self.request_cache = RequestCache(
+            ttl=float(os.getenv("REQUEST_DEDUP_TTL", "120")),
+            max_entries=int(os.getenv("REQUEST_DEDUP_MAX", "5000")),
+            wait_timeout=float(os.getenv("REQUEST_DEDUP_WAIT", "60")),
+        )
+
+        # Controllo di ammissione con budget separati per STT e LLM: oltre il limite di
+        # richieste contemporanee si attende in coda; se l'attesa prevista è troppo lunga
+        # il robot riceve subito la risposta "un attimo" (ADMISSION_SHED_TEXT).
+        # La coda ripartisce i posti tra i robot (robot_id) in base al peso della loro classe
+        # di priorità (ROBOT_PRIORITY_CLASSES, ROBOT_PRIORITIES)
+        class_weights = {
+            name: float(weight)
+            for name, weight in parse_mapping(os.getenv("ROBOT_PRIORITY_CLASSES", "high:4,normal:2,low:1")).items()
+        }
+        robot_classes = parse_mapping(os.getenv("ROBOT_PRIORITIES", ""))
+        default_class = os.getenv("ROBOT_DEFAULT_CLASS", "normal")
+        self.admission = {
+            "llm": AdmissionController(
+                "llm",
+                max_concurrent=self.llm_concurrency,
+                max_queue=int(os.getenv("ADMISSION_LLM_QUEUE", "32")),
+                max_wait=float(os.getenv("ADMISSION_LLM_MAX_WAIT", "8")),
+                initial_service_time=2.0,
+                class_weights=class_weights,
+                robot_classes=robot_classes,
+                default_class=default_class,
+            ),
+            "stt": AdmissionController(
+                "stt",
+                max_concurrent=int(os.getenv("ADMISSION_STT_CONCURRENCY") or os.cpu_count() or 2),
+                max_queue=int(os.getenv("ADMISSION_STT_QUEUE", "16")),
+                max_wait=float(os.getenv("ADMISSION_STT_MAX_WAIT", "3")),
+                initial_service_time=0.5,
+                class_weights=class_weights,
+                robot_classes=robot_classes,
+                default_class=default_class,
+            ),
+        }
+        self.shed_text = os.getenv(
+            "ADMISSION_SHED_TEXT", "Un attimo, sto ascoltando tante persone. Puoi ripetere tra poco?"
+        )
+
+        # Snapshot delle sessioni su file locale: le chat sopravvivono a deploy e crash
+        self.snapshot = None
+        # Chat ripristinate non ancora indicizzate per la ricerca (warm-up "search")
+        # Formato: {chat_id: ChatHistory ripristinata}
+        self._restored_chats = {}
+        # Serializza l'indicizzazione in background con chiusura, reset e cancellazione delle chat
+        self._search_lock = threading.Lock()
+        if os.getenv("SESSION_SNAPSHOT", "false").lower() == "true":
+            self._restore_sessions()
+
+    def warm_up(self):
+        """Warm-up del backend LLM: import di LiteLLM, verifica del supporto allo structured
+        output e, se WARMUP_LLM_CALL=true, una chiamata minima al modello principale
+        (inizializzazione del client, handshake TLS e prima connessione al provider)
+        """
+        litellm = get_litellm()
+        if self.http_pool_enabled:
+            self.http_pool.install(litellm, self.llm_models, api_base=self.api_base)
+        for model in self.llm_models:
+            self._get_response_format(model)
+
+        if os.getenv("WARMUP_LLM_CALL", "false").lower() == "true":
+            start = time.monotonic()
+            # Un solo tentativo, senza cambio di chiave: il warm-up non deve
+            # consumare la quota né mettere in cooldown le chiavi delle richieste reali
+            self._completion_with_key_retry(
+                self.llm_model,
+                deadline=start + self.model_router.attempt_timeout,
+                max_attempts=1,
+                messages=[{"role": "user", "content": "ok"}],
+                max_tokens=1,
+            )
+            self.logger.log_info(
+                f"[WARMUP] Chiamata di warm-up a {self.llm_model} completata in {time.monotonic() - start:.2f}s"
+            )
+        return True
+
+    def _new_history(self):
+        """Crea la cronologia (compatta) di una nuova chat"""
+        return ChatHistory(compress_min_bytes=self.history_compress_min_bytes)
+
+    def _restore_sessions(self):
+        """Apre lo snapshot delle sessioni e ripristina chat, personalità e metadati.
+        Viene letto solo l'indice: le cronologie sono caricate dal journal al primo accesso
+        e i messaggi vengono indicizzati per la ricerca in background (index_restored_chats).
+        Il journal è quello dello shard del worker: ogni worker gunicorn ha il proprio
+        """
+        try:
+            self.snapshot = SessionSnapshot(
+                os.getenv("SESSION_SNAPSHOT_DIR", "sessions"),
+                shard=self.chat_ids.shard,
+                flush_interval=float(os.getenv("SESSION_SNAPSHOT_INTERVAL", "1")),
+                checkpoint_interval=float(os.getenv("SESSION_CHECKPOINT_INTERVAL", "60")),
+                compact_min_bytes=int(float(os.getenv("SESSION_COMPACT_MIN_MB", "8")) * 1024 * 1024),
+                fsync=os.getenv("SESSION_SNAPSHOT_FSYNC", "false").lower() == "true",
+                logger=self.logger,
+            )
+        except SnapshotLockedError as e:
+            self.logger.log_warning(f"[SNAPSHOT] {e}: snapshot disabilitato in questo processo")
+            return
+
+        for chat_id, info in self.snapshot.restore().items():
+            self.active_chats[chat_id] = ChatHistory(
+                compress_min_bytes=self.history_compress_min_bytes,
+                loader=self._snapshot_loader(chat_id, info["count"]),
+                length=info["count"],
+            )
+            if info["count"]:
+                self._restored_chats[chat_id] = self.active_chats[chat_id]
+            if info["personality"]:
+                self.chat_personalities[chat_id] = info["personality"]
+            self.chat_meta[chat_id] = {
+                "seq": next(self._chat_seq),
+                "created_at": info["created_at"],
+                "last_activity": info["last_activity"],
+                "bytes": info["bytes"],
+            }
+
+        self.snapshot.start()
+        atexit.register(self.snapshot.close)
+
+    def index_restored_chats(self):
+        """Warm-up "search": indicizza i messaggi delle chat ripristinate dallo snapshot con
+        una lettura sequenziale del journal, in background dopo l'avvio. Le chat chiuse,
+        azzerate o cancellate nel frattempo vengono saltate
+        """
+        restored = dict(self._restored_chats)
+        if not restored:
+            return True
+        counts = {chat_id: len(history) for chat_id, history in restored.items()}
+        indexed = 0
+        for chat_id, position, role, content in self.snapshot.iter_messages(counts):
+            text = content if role == "user" else self._spoken_text(content)
+            if not text:
+                continue
+            with self._search_lock:
+                if self.active_chats.get(chat_id) is restored[chat_id]:
+                    self.search_index.add_message(chat_id, position, role, text)
+                    indexed += 1
+        self._restored_chats.clear()
+        self.logger.log_info(f"[SNAPSHOT] Indicizzati {indexed} messaggi di {len(restored)} chat ripristinate")
+        return True
+
+    def _snapshot_loader(self, chat_id, count):
+        """Caricamento pigro di una chat ripristinata: legge i messaggi dal journal"""
+        def load():
+            return self.snapshot.load_history(chat_id, count)
+        return load
+
+    @staticmethod
+    def _spoken_text(content):
+        """Testo pronunciato di una risposta del modello memorizzata come JSON ("" se non interpretabile)"""
+        try:
+            data = json.loads(content)
+        except ValueError:
+            return ""
+        chunks = data.get("chunks", []) if isinstance(data, dict) else []
+        return " ".join(chunk.get("text", "") for chunk in chunks if isinstance(chunk, dict))
+
+    def _search_text(self, chat_id, index):
+        """Testo indicizzato del messaggio index della chat (snippet della ricerca); None se non disponibile"""
+        chat_history = self.active_chats.get(chat_id)
+        if chat_history is None or index >= len(chat_history):
+            return None
+        message = chat_history[index]
+        return message["content"] if message["role"] == "user" else self._spoken_text(message["content"])
+
+    def _record_chat_activity(self, chat_id, *messages):
+        """Aggiorna i metadati della chat (ultima attività e dimensione) dopo nuovi messaggi"""
+        now = datetime.now().timestamp()
+        meta = self.chat_meta.get(chat_id)
+        if meta is None:
+            meta = {"seq": next(self._chat_seq), "created_at": now, "last_activity": now, "bytes": 0}
+            self.chat_meta[chat_id] = meta
+        meta["last_activity"] = now
+        meta["bytes"] += sum(len(str(m["content"]).encode("utf-8")) for m in messages)
+        return meta
+
+    def _chat_summary(self, chat_id, chat_history):
+        """Riepilogo di una chat per le rotte admin"""
+        meta = self.chat_meta.get(chat_id) or self._record_chat_activity(chat_id, *chat_history)
+        return {
+            "chat_id": chat_id,
+            "messages": len(chat_history),
+            "personality": self.chat_personalities.get(chat_id, "default"),
+            "created_at": datetime.fromtimestamp(meta["created_at"]).isoformat(timespec="seconds"),
+            "last_activity": datetime.fromtimestamp(meta["last_activity"]).isoformat(timespec="seconds"),
+            "bytes": meta["bytes"],
+        }
+
     def _get_movements_from_file(self):
         """Legge i movements dal file movements.json"""
         try:
@@ -245,23 +571,25 @@ class LLMChatAPI:
             self.logger.log_error(f"Errore nel caricamento personalità '{personality_name}': {e}")
             return None
 
-    def _load_api_keys(self):
+    def _get_api_key_env_var(self, model):
+        """Determina la variabile d'ambiente delle API key in base al modello"""
+        if "openrouter" in model:
+            return "OPENROUTER_API_KEY"
+        elif "gemini" in model:
+            return "GOOGLE_API_KEY" # o GEMINI_API_KEY
+        elif "gpt" in model:
+            return "OPENAI_API_KEY"
+        elif "claude" in model:
+            return "ANTHROPIC_API_KEY"
+        # Default fallback
+        return "OPENROUTER_API_KEY"
+
+    def _load_api_keys(self, env_var):
         """
         Carica le API keys dal file .env supportando chiavi multiple separate da virgola
+        Args:
+            env_var -> Nome della variabile d'ambiente con le chiavi
         """
-        # Determina quale variabile cercare in base al modello
-        if "openrouter" in self.llm_model:
-            env_var = "OPENROUTER_API_KEY"
-        elif "gemini" in self.llm_model:
-            env_var = "GOOGLE_API_KEY" # o GEMINI_API_KEY
-        elif "gpt" in self.llm_model:
-            env_var = "OPENAI_API_KEY"
-        elif "claude" in self.llm_model:
-            env_var = "ANTHROPIC_API_KEY"
-        else:
-            # Default fallback
-            env_var = "OPENROUTER_API_KEY"
-            
         keys_string = os.getenv(env_var, "")
         if not keys_string:
             self.logger.log_warning(f"Nessuna API Key trovata per {env_var}")
@@ -272,15 +600,122 @@ class LLMChatAPI:
         self.logger.log_info(f"Caricate {len(keys)} API keys per {env_var}")
         return keys
 
-    def _get_next_api_key(self):
-        """Restituisce la prossima API key disponibile (Round Robin)"""
-        if not self.api_keys:
-            return None
-            
-        key = self.api_keys[self.current_key_index]
-        # Aggiorna l'indice per la prossima chiamata
-        self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
-        return key
+    def _completion_with_key_retry(self, model, deadline=None, max_attempts=None, **kwargs):
+        """
+        Esegue litellm.completion scegliendo la chiave tramite lo scheduler del provider.
+        Se il provider risponde con rate limit, quota esaurita o chiave non valida,
+        la chiave va in cooldown e la chiamata viene ritentata con un'altra chiave
+        entro la deadline del tentativo: il timeout di ogni chiamata è il tempo residuo.
+        Args:
+            model        -> Modello LiteLLM da usare
+            deadline     -> Istante (time.monotonic) entro cui concludere tutti i tentativi (opzionale)
+            max_attempts -> Numero massimo di chiavi da provare (default LLM_KEY_MAX_ATTEMPTS)
+            kwargs       -> Parametri di completion (escluso api_key)
+        Returns:
+            La risposta di LiteLLM
+        Raises:
+            TimeoutError: se la deadline scade prima di un nuovo tentativo
+        """
+        key_scheduler = self.key_schedulers[self._get_api_key_env_var(model)]
+        max_attempts = max(1, min(max_attempts or self.key_max_attempts, len(key_scheduler)))
+        tried_keys = set()
+
+        if self.api_base:
+            kwargs.setdefault("api_base", self.api_base)
+
+        for attempt in range(1, max_attempts + 1):
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"Tempo del tentativo esaurito per {model} dopo {attempt - 1} chiavi")
+                kwargs["timeout"] = min(kwargs.get("timeout") or remaining, remaining)
+            api_key = key_scheduler.acquire(exclude=tried_keys)
+            try:
+                response = get_litellm().completion(
+                    model=model, api_key=api_key, **self.http_pool.completion_kwargs(model), **kwargs
+                )
+            except Exception as e:
+                key_scheduler.release(api_key, error=e)
+                if api_key is None or attempt == max_attempts or not is_retryable_error(e):
+                    raise
+                tried_keys.add(api_key)
+                self.logger.log_warning(
+                    f"[KEYS] Chiave {mask_key(api_key)} in errore ({e.__class__.__name__}), "
+                    f"nuovo tentativo {attempt + 1}/{max_attempts} con un'altra chiave"
+                )
+                continue
+
+            usage = getattr(response, "usage", None)
+            tokens = getattr(usage, "total_tokens", 0) or 0
+            key_scheduler.release(api_key, tokens=tokens)
+            return response
+
+    def _get_response_format(self, model):
+        """
+        Restituisce il response_format da usare per il modello:
+        json_schema (decoding vincolato) se supportato, altrimenti json_object
+        """
+        json_object = {"type": "json_object"}
+        if self.structured_output_mode == "off":
+            return json_object
+        if self.structured_output_mode == "on":
+            return self.response_format_schema
+
+        if model not in self._structured_output_support:
+            try:
+                supported = bool(get_litellm().supports_response_schema(model=model))
+            except Exception:
+                supported = False
+            self._structured_output_support[model] = supported
+            self.logger.log_info(
+                f"[SCHEMA] Modello {model}: structured output {'supportato' if supported else 'non supportato (json_object)'}"
+            )
+
+        return self.response_format_schema if self._structured_output_support[model] else json_object
+
+    def _call_llm(self, messages, structured_output=False, **kwargs):
+        """
+        Invia i messaggi al modello lungo la catena di fallback (con hedging se abilitato)
+        Args:
+            messages          -> Lista dei messaggi in formato LiteLLM
+            structured_output -> Se True usa il response_format adatto al modello (schema o json_object)
+            kwargs            -> Parametri aggiuntivi di completion (temperature, max_tokens, ...)
+        Returns:
+            Tuple (model, response) con il modello che ha risposto e la risposta di LiteLLM
+        """
+        def attempt(model, timeout):
+            # Il tentativo (con gli eventuali cambi di chiave) dura al massimo timeout secondi
+            deadline = time.monotonic() + timeout
+            params = dict(kwargs)
+            if structured_output:
+                params["response_format"] = self._get_response_format(model)
+            return self._completion_with_key_retry(
+                model, deadline=deadline, messages=messages, timeout=timeout, **params
+            )
+
+        return self.model_router.call(attempt)
+
+    def _filter_movements(self, movements):
+        """
+        Espande i movimenti tramite l'indice di movements_library, correggendo i nomi
+        scritti male e scartando quelli inesistenti.
+        Anche i percorsi completi (animations/Stand/...) scritti dal modello vengono
+        verificati sulla libreria
+        """
+        valid_movements = []
+        for mov in movements:
+            if not isinstance(mov, str):
+                continue
+            if not len(self.movement_index):
+                # Libreria non configurata: nessuna validazione possibile
+                valid_movements.append(mov if mov.startswith("animations/") else fix_animation(mov))
+            else:
+                resolved = self.movement_index.resolve(mov)
+                if resolved:
+                    valid_movements.append(resolved)
+                else:
+                    self.logger.log_warning(f"Movimento non presente in libreria scartato: {mov}")
+        return valid_movements
 
     def _load_environment(self):
         """Carica le variabili d'ambiente dai file .env"""
@@ -293,19 +728,67 @@ class LLMChatAPI:
             # Prova a caricare dal percorso corrente
             load_dotenv()
 
-    def _process_model_response(self, response_text, chat_id):
+    def _count_json_outcome(self, outcome):
+        with self._stats_lock:
+            self.json_outcomes[outcome] += 1
+
+    def _reask_for_json(self, response_text):
+        """
+        Chiede al modello (una sola volta, con pochi token) di correggere il JSON malformato
+        Returns:
+            Il JSON corretto come dizionario, None se anche la correzione fallisce
+        """
+        messages = [
+            {"role": "system", "content": JSON_REPAIR_PROMPT},
+            {"role": "user", "content": response_text},
+        ]
+        try:
+            _, response = self._call_llm(
+                messages,
+                structured_output=True,
+                temperature=0,
+                max_tokens=self.json_reask_max_tokens
+            )
+        except Exception as e:
+            self.logger.log_warning(f"[JSON] Richiesta di correzione fallita: {e}")
+            return None
+
+        obj, _ = parse_llm_json(response.choices[0].message.content or "")
+        return obj
+
+    def _parse_model_json(self, response_text):
+        """
+        Estrae il JSON dalla risposta del modello con riparazione a due passaggi
+        Args:
+            response_text -> La risposta testuale dal modello
+        Returns:
+            Tuple (response_data, outcome) con outcome tra parsed, local_repair, reask, fallback
+        """
+        response_data, outcome = parse_llm_json(response_text or "")
+
+        if response_data is None and self.json_reask_enabled:
+            response_data = self._reask_for_json(response_text or "")
+            if response_data is not None:
+                outcome = "reask"
+
+        if response_data is None:
+            self.logger.log_error(f"Testo ricevuto: {response_text}")
+            response_data, outcome = get_fallback_response(), "fallback"
+        elif outcome != "parsed":
+            self.logger.log_info(f"[JSON] Risposta malformata recuperata con {outcome}")
+
+        self._count_json_outcome(outcome)
+        return response_data, outcome
+
+    def _process_model_response(self, response_data, chat_id):
         """Processa la risposta del modello estraendo e processando i chunks
         Args: 
-            response_text -> La risposta testuale dal modello (stringa JSON)
+            response_data -> La risposta del modello già convertita in dizionario
             chat_id  -> ID della chat corrente
         Returns: 
             Tuple (success, result) dove result è il dizionario con i chunks o il messaggio di errore
         """
         try:
-            from utils.cleantext import extract_and_parse_llm_json
-            # Estrae e parsa il primo JSON valido dalla risposta, oppure ottiene il fallback
-            response_data = extract_and_parse_llm_json(response_text)
-            
             chunks = response_data.get("chunks", [])
             
             # --- TRADUZIONE AZIONE ---
@@ -329,7 +812,7 @@ class LLMChatAPI:
                 cleaned_response = clean_text(text_content)
                 self.logger.log_chat_message(chat_id, "model", cleaned_response)
                 chunk["text"] = cleaned_response
-                chunk["movements"] = [fix_animation(mov) for mov in chunk.get("movements", [])]
+                chunk["movements"] = self._filter_movements(chunk.get("movements", []))
             
             # Costruisce il risultato finale includendo l'azione se esiste
             result = {"chunks": chunks}
@@ -401,11 +884,18 @@ class LLMChatAPI:
 
         # Salva la personalità per questa chat
         self.chat_personalities[chat_id] = personality_name
+        if self.snapshot:
+            self.snapshot.record_personality(chat_id, personality_name)
 
         # RESET DELLO STORICO: Cancella la cronologia conversazione per evitare conflitti
         if chat_id in self.active_chats:
             old_history_length = len(self.active_chats[chat_id])
-            self.active_chats[chat_id] = []
+            with self._search_lock:
+                self.active_chats[chat_id] = self._new_history()
+                self.search_index.remove_chat(chat_id)
+            self._record_chat_activity(chat_id)["bytes"] = 0
+            if self.snapshot:
+                self.snapshot.record_reset(chat_id)
             self.logger.log_info(
                 f"[PERSONALITY] Chat {chat_id}: Storico resettato ({old_history_length} messaggi cancellati)"
             )
@@ -433,14 +923,24 @@ class LLMChatAPI:
     def handle_talk_action(self, data):
         """Gestisce l'azione di conversazione (talk)
         Args:
-            data -> Dizionario contenente chat_id e message
+            data -> Dizionario contenente chat_id, message, request_id (opzionale, per i retry)
+                    e robot_id (opzionale, per la ripartizione equa tra robot)
         Returns:
-            Tuple (response_json, status_code, timing_ms) se TIMING_ENABLED
-            Tuple (response_json, status_code) altrimenti
+            Tuple (response_json, status_code); con TIMING_ENABLED la risposta
+            include 'timing' con llm_ms e total_ms
         """
+        # Retry dello stesso turno (stesso request_id): risposta calcolata una sola volta
+        request_id = data.get("request_id")
+        if request_id:
+            return self.run_deduplicated(
+                f"talk:{data.get('robot_id') or ''}:{data.get('chat_id') or ''}:{request_id}",
+                lambda: self.handle_talk_action({k: v for k, v in data.items() if k != "request_id"})
+            )
+
         # Estrai e valida input
         chat_id = data.get("chat_id")
         message = data.get("message", "").strip()
+        robot_id = data.get("robot_id")
 
         if not message:
             # ORIGINALE: ), 400
@@ -448,15 +948,110 @@ class LLMChatAPI:
                 {"error": "Un messaggio è necessario per avviare la chat", "success": False}
             ), 400
 
+        if not (chat_id and chat_id in self.active_chats):
+            # Nuova chat: l'id non è ancora noto al client, nessun turno concorrente possibile
+            return self._admitted_turn(None, message, robot_id)
+
+        # Chat esistente: un solo turno alla volta (CHAT_BUSY_POLICY)
+        try:
+            with self.sessions.lock(chat_id):
+                return self._admitted_turn(chat_id, message, robot_id)
+        except ChatBusyError as e:
+            self.logger.log_warning(f"[SESSION] {e} ({'attesa scaduta' if e.waited else 'turno rifiutato'})")
+            self.logger.log_event("busy", chat_id=chat_id, waited=e.waited)
+            return jsonify({
+                "error": "La chat ha già una richiesta in corso, riprova tra poco",
+                "stage": "busy",
+                "chat_id": chat_id,
+                "success": False
+            }), 409
+
+    def _admitted_turn(self, chat_id, message, robot_id=None):
+        """Esegue il turno nel budget LLM (quota del robot); se rifiutato risponde subito con "un attimo" """
+        try:
+            with self.admission["llm"].admit(robot_id):
+                return self._talk_turn(chat_id, message, robot_id)
+        except AdmissionRejected as e:
+            return self.shed_response(chat_id, e, robot_id)
+
+    def shed_response(self, chat_id, rejected, robot_id=None):
+        """
+        Risposta 503 immediata per una richiesta rifiutata dal controllo di ammissione,
+        con la frase "un attimo" nel formato a chunk di talk così il robot la pronuncia
+        Args:
+            chat_id  -> ID della chat (None per una nuova chat)
+            rejected -> AdmissionRejected con budget, motivo e retry_after
+            robot_id -> Robot che ha inviato la richiesta (opzionale)
+        Returns:
+            Tuple (response_json, 503); "shed": true, "retry_after_s" e l'header Retry-After
+            indicano al client di riprovare
+        """
+        self.logger.log_warning(f"[ADMISSION] Chat {chat_id}: {rejected}")
+        self.logger.log_event(
+            "shed", chat_id=chat_id, robot_id=robot_id, budget=rejected.budget, reason=rejected.reason,
+            retry_after_s=rejected.retry_after,
+        )
+        response = jsonify({
+            "chat_id": chat_id,
+            "response": {"chunks": [{"text": self.shed_text, "movements": []}]},
+            "success": False,
+            "shed": True,
+            "stage": "admission",
+            "budget": rejected.budget,
+            "retry_after_s": rejected.retry_after
+        })
+        response.headers["Retry-After"] = rejected.retry_after_header
+        return response, 503
+
+    def run_deduplicated(self, key, handler):
+        """
+        Esegue handler una sola volta per chiave (request_id): i duplicati in arrivo
+        durante l'elaborazione ne attendono il risultato, quelli successivi ricevono
+        la risposta memorizzata (per REQUEST_DEDUP_TTL secondi) con "replayed": true
+        Args:
+            key     -> Chiave della richiesta (rotta, robot_id, chat_id e request_id)
+            handler -> Funzione senza argomenti che restituisce (risposta Flask, status)
+        Returns:
+            Tuple (response_json, status_code)
+        """
+        def compute():
+            response, status_code = handler()
+            return response.get_json(), status_code, response.headers.get("Retry-After")
+
+        try:
+            (payload, status_code, retry_after), source = self.request_cache.run(
+                key, compute,
+                # Errori del server, chat occupata e richieste rifiutate non vengono riproposti ai retry
+                cacheable=lambda result: result[1] < 500 and result[1] != 409 and not result[0].get("shed")
+            )
+        except RequestInFlightError:
+            return jsonify({
+                "error": "Richiesta già in elaborazione, riprova tra poco",
+                "stage": "duplicate",
+                "success": False
+            }), 409
+
+        if source != "computed":
+            self.logger.log_info(f"[DEDUP] Richiesta {key}: risposta {'memorizzata' if source == 'replayed' else 'condivisa'}")
+            payload = {**payload, "replayed": True}
+        response = jsonify(payload)
+        if retry_after:
+            response.headers["Retry-After"] = retry_after
+        return response, status_code
+
+    def _talk_turn(self, chat_id, message, robot_id=None):
+        """Esegue un turno di conversazione; per una chat esistente il chiamante detiene già il lock della chat"""
+        start_time = time.monotonic()
         try:
-            # Gestisce la chat (nuova o esistente)
+            # Gestisce la chat (nuova o esistente; può essere stata chiusa mentre il turno attendeva il lock)
             if chat_id and chat_id in self.active_chats:
                 chat_history = self.active_chats[chat_id]
                 self.logger.log_info(f"Continuazione chat esistente: {chat_id}")
             else:
-                chat_history = []
-                chat_id = str(id(chat_history))
+                chat_history = self._new_history()
+                chat_id = self.chat_ids.new_id()
                 self.active_chats[chat_id] = chat_history
+                self._record_chat_activity(chat_id)
                 self.logger.log_info(f"Nuova chat creata: {chat_id}")
 
             # Log del messaggio in arrivo
@@ -504,24 +1099,26 @@ class LLMChatAPI:
             # Limita la history PASSATA agli ultimi 20 messaggi (10 scambi)
             # Facciamo lo slice PRIMA per garantire che il messaggio corrente sia sempre incluso
             max_past_messages = 20
-            past_history_limited = chat_history[-max_past_messages:]
+            # (ricostruita dal formato compatto solo per i messaggi inviati al modello)
+            past_history_limited = chat_history.provider_messages(max_past_messages)
             
             # Prepara i messaggi per LiteLLM (System + Past History + Current Message)
             messages = [{"role": "system", "content": system_instruction}] + past_history_limited + [current_user_message]
 
             # Aggiungi il messaggio dell'utente alla cronologia COMPLETA (persistenza)
-            chat_history.append(current_user_message)
+            chat_history.append("user", message)
+            self._record_chat_activity(chat_id, current_user_message)
+            self.search_index.add_message(chat_id, len(chat_history) - 1, "user", message)
+            if self.snapshot:
+                self.snapshot.record_message(chat_id, "user", message)
             
             # Invia il messaggio usando LiteLLM
+            llm_start = time.monotonic()
             try:
-                # Ottieni la chiave per questa richiesta
-                current_api_key = self._get_next_api_key()
-                
-                response = completion(
-                    model=self.llm_model,
-                    messages=messages,
-                    api_key=current_api_key, # Passa esplicitamente la chiave ruotata
-                    response_format={"type": "json_object"}, # Forza output JSON
+                # Modello scelto dal router (fallback/hedging), chiave scelta dallo scheduler
+                model_used, response = self._call_llm(
+                    messages,
+                    structured_output=True, # Forza output JSON (con schema dove supportato)
                     temperature=GENERATION_CONFIG_BASE["temperature"],
                     top_p=GENERATION_CONFIG_BASE["top_p"],
                     max_tokens=GENERATION_CONFIG_BASE["max_output_tokens"]
@@ -531,21 +1128,68 @@ class LLMChatAPI:
                 import traceback
                 traceback.print_exc()
                 raise e                      
+            llm_ms = round((time.monotonic() - llm_start) * 1000)
+            if model_used != self.llm_model:
+                self.logger.log_info(f"[ROUTER] Chat {chat_id}: risposta dal modello di fallback {model_used}")
             response_text = response.choices[0].message.content
+
+            raw_response_text = response_text
+
+            # Estrae il JSON (con riparazione locale o richiesta di correzione se malformato)
+            response_data, json_outcome = self._parse_model_json(response_text)
             
-            # Aggiunge la risposta del modello alla cronologia
-            chat_history.append({"role": "assistant", "content": response_text})
+            # Aggiunge la risposta del modello alla cronologia come JSON minificato (la versione
+            # corretta se riparata; il testo ricevuto solo se non interpretabile).
+            # Se durante la chiamata la chat è stata chiusa o cancellata dall'admin non viene ricreata
+            still_active = self.active_chats.get(chat_id) is chat_history
+            if still_active:
+                assistant_message = chat_history.append(
+                    "assistant", response_text if json_outcome == "fallback" else response_data
+                )
+                self._record_chat_activity(chat_id, assistant_message)
+                if self.snapshot:
+                    self.snapshot.record_message(chat_id, "assistant", assistant_message["content"])
             
             # Processa la risposta
-            success, result = self._process_model_response(response_text, chat_id)
+            success, result = self._process_model_response(response_data, chat_id)
+            if success and still_active:
+                # Nell'indice di ricerca va il testo pronunciato, non il JSON
+                spoken_text = " ".join(chunk.get("text", "") for chunk in result.get("chunks", []))
+                self.search_index.add_message(chat_id, len(chat_history) - 1, "assistant", spoken_text)
+
+            # Evento strutturato del turno: latenze, token, modello ed esito del parsing
+            usage = getattr(response, "usage", None)
+            turn_event = {
+                "chat_id": chat_id,
+                "robot_id": robot_id,
+                "personality": self.chat_personalities.get(chat_id, "default"),
+                "model": model_used,
+                "fallback_model": model_used != self.llm_model,
+                "json_outcome": json_outcome,
+                "fallback": json_outcome == "fallback",
+                "success": success,
+                "llm_ms": llm_ms,
+                "total_ms": round((time.monotonic() - start_time) * 1000),
+                "prompt_tokens": getattr(usage, "prompt_tokens", None),
+                "completion_tokens": getattr(usage, "completion_tokens", None),
+                "total_tokens": getattr(usage, "total_tokens", None),
+                "history_len": len(chat_history),
+            }
+            if json_outcome == "fallback":
+                # Testo non interpretabile, per l'analisi degli errori
+                turn_event["response_text"] = raw_response_text
+            self.logger.log_event("turn", **turn_event)
             
             if success:
                 # ORIGINALE: }), 200
-                return jsonify({
+                response_json = {
                     "chat_id": chat_id,
                     "response": result,
                     "success": True
-                }), 200
+                }
+                if self.timing_enabled:
+                    response_json["timing"] = {"llm_ms": llm_ms, "total_ms": turn_event["total_ms"]}
+                return jsonify(response_json), 200
             else:
                 # ORIGINALE: }), result["status_code"]
                 return jsonify({
@@ -555,6 +1199,14 @@ class LLMChatAPI:
                 
         except Exception as e:
             self.logger.log_error(f"Errore nella gestione della chat: {str(e)}")
+            self.logger.log_event(
+                "error",
+                chat_id=chat_id,
+                stage="talk",
+                error_type=e.__class__.__name__,
+                error=str(e),
+                total_ms=round((time.monotonic() - start_time) * 1000),
+            )
             # ORIGINALE: }), 500
             return jsonify({
                 "error": "Errore durante l'elaborazione della richiesta",
@@ -575,10 +1227,16 @@ class LLMChatAPI:
                 {"error": "chat_id è necessario per terminare una chat", "success": False}
             ), 400
 
-        if chat_id in self.active_chats:
+        with self._search_lock:
+            closed = self.active_chats.pop(chat_id, None) is not None
+            if closed:
+                self.search_index.remove_chat(chat_id)
+        if closed:
             # Log chiusura chat
             self.logger.log_info(f"CHAT_CLOSED: {chat_id}")
-            del self.active_chats[chat_id]
+            self.chat_meta.pop(chat_id, None)
+            if self.snapshot:
+                self.snapshot.record_end(chat_id)
             return jsonify({"message": "Chat chiusa correttamente", "success": True}), 200
         
         return jsonify({"error": "Chat non trovata", "success": False}), 404
@@ -596,35 +1254,121 @@ class LLMChatAPI:
                 {"error": "un chat_id è necessario per accedere alla storia", "success": False}
             ), 400
 
-        if chat_id in self.active_chats:
-            chat_history = self.active_chats[chat_id]
+        chat_history = self.active_chats.get(chat_id)
+        if chat_history is not None:
             # La history è già nel formato corretto [{"role":..., "content":...}]
+            # (copia: un turno in corso può aggiungere messaggi durante la serializzazione);
+            # le risposte del modello come oggetti JSON, non come stringhe JSON annidate
             return jsonify({
                 "chat_id": chat_id,
-                "history": chat_history,
+                "history": chat_history.to_list(parsed=True),
                 "success": True
             }), 200
         
         return jsonify({"error": "Chat non trovata", "success": False}), 404
 
-    def handle_admin_list_chats(self):
-        """Recupera la cronologia completa di tutte le chat attive
-        Returns: 
-            Risposta JSON con la cronologia completa
+    def handle_admin_list_chats(self, data=None):
+        """Elenca le chat attive, una pagina alla volta, con un riepilogo per chat
+        Args:
+            data -> Dizionario con "limit" (chat per pagina) e "cursor" (next_cursor della pagina precedente)
+        Returns:
+            Risposta JSON con i riepiloghi (messaggi, ultima attività, personalità, byte)
+            e il cursore della pagina successiva (None se è l'ultima)
         """
-        full_history = []
-        
-        for chat_id, chat_history in self.active_chats.items():
-            for message in chat_history:
-                full_history.append({
-                    "chat_id": chat_id,
-                    "role": message["role"],
-                    "content": message["content"],
-                })
+        data = data or {}
+        try:
+            limit = min(max(int(data.get("limit", ADMIN_PAGE_SIZE)), 1), ADMIN_MAX_PAGE_SIZE)
+            after = int(data.get("cursor") or 0)
+        except (TypeError, ValueError):
+            return jsonify({"error": "limit e cursor devono essere numerici", "success": False}), 400
+
+        chats = []
+        next_cursor = None
+        last_seq = None
+        # Le chat sono in ordine di creazione, quindi di "seq" crescente
+        for chat_id, chat_history in list(self.active_chats.items()):
+            meta = self.chat_meta.get(chat_id) or self._record_chat_activity(chat_id, *chat_history)
+            if meta["seq"] <= after:
+                continue
+            if len(chats) == limit:
+                next_cursor = str(last_seq)
+                break
+            chats.append(self._chat_summary(chat_id, chat_history))
+            last_seq = meta["seq"]
 
         return jsonify({
-            "full_history": full_history,
+            "chats": chats,
             "total_chats": len(self.active_chats),
+            "next_cursor": next_cursor,
+            "success": True
+        }), 200
+
+    def handle_admin_export_chats(self):
+        """Esporta tutte le chat attive in streaming NDJSON (una riga JSON per chat)
+        Returns:
+            Risposta application/x-ndjson: riepilogo e cronologia di ogni chat,
+            serializzate una alla volta senza costruire l'intero documento in memoria
+        """
+        # Copia delle sole chiavi: le chat possono cambiare durante l'esportazione
+        chat_ids = list(self.active_chats.keys())
+
+        def generate():
+            for chat_id in chat_ids:
+                chat_history = self.active_chats.get(chat_id)
+                if chat_history is None:
+                    continue
+                entry = self._chat_summary(chat_id, chat_history)
+                entry["history"] = chat_history.to_list(parsed=True)
+                yield json.dumps(entry, ensure_ascii=False) + "\n"
+
+        self.logger.log_info(f"EXPORTING ACTIVE CHATS (Total: {len(chat_ids)})")
+        return Response(generate(), mimetype="application/x-ndjson"), 200
+
+    def handle_admin_search(self, data):
+        """Cerca un testo nei messaggi delle chat attive tramite l'indice full-text
+        Args:
+            data -> Dizionario con "query" e, opzionali, "limit", "role" e "chat_id"
+        Returns:
+            Risposta JSON con i messaggi trovati ordinati per rilevanza, con snippet
+        """
+        query = (data.get("query") or "").strip()
+        if not query:
+            return jsonify({"error": "query è necessaria per la ricerca", "success": False}), 400
+        try:
+            limit = min(max(int(data.get("limit", 20)), 1), ADMIN_MAX_PAGE_SIZE)
+        except (TypeError, ValueError):
+            return jsonify({"error": "limit deve essere numerico", "success": False}), 400
+
+        start = time.monotonic()
+        results, total_hits = self.search_index.search(
+            query, limit=limit, role=data.get("role"), chat_id=data.get("chat_id")
+        )
+        return jsonify({
+            "query": query,
+            "results": results,
+            "total_hits": total_hits,
+            "took_ms": round((time.monotonic() - start) * 1000, 2),
+            "success": True
+        }), 200
+
+    def handle_admin_stats(self):
+        """Restituisce le statistiche dei modelli e delle API key
+        Returns:
+            Risposta JSON con lo stato di ogni modello e di ogni chiave (mascherata)
+        """
+        return jsonify({
+            "models": self.model_router.get_stats(),
+            "json_outcomes": dict(self.json_outcomes),
+            "movements": dict(self.movement_index.stats),
+            "http_pool": self.http_pool.get_stats(),
+            "sessions": self.sessions.get_stats(),
+            "request_cache": self.request_cache.get_stats(),
+            "snapshot": self.snapshot.get_stats() if self.snapshot else None,
+            "admission": {budget: controller.get_stats() for budget, controller in self.admission.items()},
+            "api_keys": {
+                env_var: scheduler.get_stats()
+                for env_var, scheduler in self.key_schedulers.items()
+            },
             "success": True
         }), 200
 
@@ -639,7 +1383,12 @@ class LLMChatAPI:
         self.logger.log_info(f"DELETING ALL ACTIVE CHATS (Total: {num_chats})")
 
         # Azzera il dizionario delle chat attive
-        self.active_chats.clear()
+        with self._search_lock:
+            self.active_chats.clear()
+            self.search_index.clear()
+        self.chat_meta.clear()
+        if self.snapshot:
+            self.snapshot.record_clear()
         
         return jsonify({
             "message": f"{num_chats} chat cancellate",
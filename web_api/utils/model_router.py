@@ -0,0 +1,313 @@
+"""
+File:	/web_api/utils/model_router.py
+-----
+Class ModelRouter - Catena di fallback tra modelli LLM con deadline per
+tentativo e richieste "hedged" per ridurre la latenza di coda (p95/p99)
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 3:41:03 am
+-----
+Last Modified: 	October 19th 2026 4:30:10 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Additional Terms under Section 7(b):
+
+The following attribution requirements apply to this work:
+
+1. Copyright notices and author attribution in source code files
+   cannot be removed or altered.
+2. Any interactive user interface must preserve and display
+   author attribution (Copyright, authors, project name).
+3. System prompts containing author information cannot be modified
+4. Public demonstrations, publications and derivative works
+   must credit the original authors.
+
+For full Additional Terms see the LICENSE file.
+------------------------------------------------------------------------------
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Numero di latenze conservate per modello (per il calcolo dei percentili)
+LATENCY_SAMPLES = 200
+# Campioni minimi prima di usare il percentile come ritardo di hedging
+MIN_SAMPLES_FOR_HEDGE = 20
+# Intervallo (secondi) di controllo dei tentativi ancora in coda nel pool
+QUEUED_POLL_INTERVAL = 0.05
+
+
+def percentile(values, pct):
+    """Restituisce il percentile pct (0-100) di una sequenza di valori, None se vuota"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class _ModelStats:
+    """Statistiche di un singolo modello della catena"""
+
+    def __init__(self):
+        self.attempts = 0
+        self.successes = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.wins = 0
+        self.losses = 0
+        self.hedges = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+
+class _Attempt:
+    """Tentativo lanciato nel pool: la deadline parte quando un thread lo esegue"""
+    __slots__ = ("model", "deadline")
+
+    def __init__(self, model):
+        self.model = model
+        self.deadline = None
+
+
+def _is_timeout(error):
+    """Verifica se l'eccezione indica un timeout (TimeoutError, litellm.Timeout, httpx...)"""
+    return isinstance(error, TimeoutError) or any(
+        "Timeout" in cls.__name__ for cls in type(error).__mro__
+    )
+
+
+class ModelRouter:
+    """
+    Esegue una chiamata LLM lungo una catena ordinata di modelli.
+
+    Ogni tentativo ha una propria deadline: se il modello fallisce o non risponde
+    in tempo si passa al successivo. Senza hedging i tentativi vengono eseguiti nel
+    thread chiamante e la deadline è il timeout passato ad attempt_fn. Con l'hedging
+    attivo i tentativi girano in un pool di thread e, se il primo tentativo non
+    risponde entro il p95 delle sue latenze recenti, viene lanciata una seconda
+    richiesta (al modello successivo o, se unico, allo stesso modello) e vince la
+    prima risposta valida. Per ogni modello vengono registrate vittorie e sconfitte.
+    """
+
+    def __init__(self, models, attempt_timeout=20.0, hedging=False, hedge_percentile=95,
+                 hedge_min_delay=1.0, max_workers=16, logger=None):
+        """
+        Args:
+            models: Lista ordinata dei modelli (il primo è il principale)
+            attempt_timeout: Deadline (secondi) di ogni singolo tentativo
+            hedging: Abilita la seconda richiesta "hedged"
+            hedge_percentile: Percentile delle latenze usato come ritardo di hedging
+            hedge_min_delay: Ritardo minimo (e iniziale, senza campioni) prima dell'hedging
+            max_workers: Thread del pool per i tentativi in parallelo (solo con hedging);
+                         almeno le chiamate contemporanee × 2
+            logger: Istanza di ChatLogger (opzionale)
+        """
+        if not models:
+            raise ValueError("È necessario almeno un modello")
+        self.models = list(models)
+        self.attempt_timeout = attempt_timeout
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.logger = logger
+        self._executor = None
+        if hedging:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-attempt")
+        self._lock = threading.Lock()
+        self._stats = {model: _ModelStats() for model in self.models}
+
+    def _record(self, model, **increments):
+        with self._lock:
+            stats = self._stats[model]
+            for name, value in increments.items():
+                setattr(stats, name, getattr(stats, name) + value)
+
+    def _timed_attempt(self, model, attempt_fn, attempt=None):
+        """Esegue un tentativo registrando latenza ed esito"""
+        start = time.monotonic()
+        if attempt is not None:
+            # La deadline parte da qui e non dall'accodamento nel pool
+            attempt.deadline = start + self.attempt_timeout
+        self._record(model, attempts=1)
+        try:
+            result = attempt_fn(model, self.attempt_timeout)
+        except Exception:
+            self._record(model, errors=1)
+            raise
+        with self._lock:
+            stats = self._stats[model]
+            stats.successes += 1
+            stats.latencies.append(time.monotonic() - start)
+        return result
+
+    def hedge_delay(self, model):
+        """Ritardo prima di lanciare la richiesta hedged, basato sul percentile delle latenze"""
+        with self._lock:
+            samples = list(self._stats[model].latencies)
+        delay = self.hedge_min_delay
+        if len(samples) >= MIN_SAMPLES_FOR_HEDGE:
+            delay = max(delay, percentile(samples, self.hedge_percentile))
+        return min(delay, self.attempt_timeout)
+
+    def _log_warning(self, message):
+        if self.logger:
+            self.logger.log_warning(message)
+
+    def call(self, attempt_fn):
+        """
+        Esegue la chiamata lungo la catena di modelli.
+        Args:
+            attempt_fn: Funzione (model, timeout) -> risposta, eseguita per ogni tentativo
+        Returns:
+            tuple: (modello che ha risposto, risposta)
+        Raises:
+            L'ultima eccezione se tutti i modelli falliscono, TimeoutError se scadono le deadline
+        """
+        if self._executor is None:
+            return self._call_inline(attempt_fn)
+        return self._call_hedged(attempt_fn)
+
+    def _call_inline(self, attempt_fn):
+        """Catena senza hedging: i tentativi girano in sequenza nel thread chiamante"""
+        last_error = None
+        for model in self.models:
+            start = time.monotonic()
+            try:
+                result = self._timed_attempt(model, attempt_fn)
+            except Exception as e:
+                last_error = e
+                if _is_timeout(e) or time.monotonic() - start >= self.attempt_timeout:
+                    self._record(model, timeouts=1)
+                self._log_warning(f"[ROUTER] Modello {model} in errore: {e.__class__.__name__}: {e}")
+                continue
+            self._record(model, wins=1)
+            return model, result
+
+        raise last_error if last_error else RuntimeError("Nessun modello disponibile")
+
+    def _call_hedged(self, attempt_fn):
+        """Catena con hedging: i tentativi girano nel pool e il primo valido vince"""
+        pending = {}        # future -> _Attempt
+        next_index = 0
+        hedged = False
+        last_error = None
+        # Modello e istante di partenza del tentativo su cui calcolare il ritardo di hedging
+        hedge_base = {"model": None, "start": 0.0}
+
+        def launch(model):
+            attempt = _Attempt(model)
+            pending[self._executor.submit(self._timed_attempt, model, attempt_fn, attempt)] = attempt
+
+        def launch_next():
+            nonlocal next_index
+            model = self.models[next_index]
+            next_index += 1
+            hedge_base["model"], hedge_base["start"] = model, time.monotonic()
+            launch(model)
+
+        launch_next()
+
+        while pending:
+            now = time.monotonic()
+            deadlines = [a.deadline for a in pending.values() if a.deadline is not None]
+            timeout = min(deadlines) - now if deadlines else QUEUED_POLL_INTERVAL
+            if len(deadlines) < len(pending):
+                # Tentativi ancora in coda: la loro deadline non è ancora partita
+                timeout = min(timeout, QUEUED_POLL_INTERVAL)
+            can_hedge = not hedged and len(pending) == 1
+            if can_hedge:
+                hedge_at = hedge_base["start"] + self.hedge_delay(hedge_base["model"])
+                timeout = min(timeout, hedge_at - now)
+
+            done, _ = wait(pending, timeout=max(0.0, timeout), return_when=FIRST_COMPLETED)
+
+            if not done:
+                now = time.monotonic()
+                expired = [f for f, a in pending.items() if a.deadline is not None and a.deadline <= now]
+                for future in expired:
+                    model = pending.pop(future).model
+                    self._record(model, timeouts=1)
+                    last_error = TimeoutError(f"Il modello {model} non ha risposto entro {self.attempt_timeout}s")
+                    self._log_warning(f"[ROUTER] {last_error}")
+
+                if can_hedge and pending and now >= hedge_at:
+                    # Seconda richiesta: modello successivo della catena, oppure lo stesso se è l'ultimo
+                    hedged = True
+                    if next_index < len(self.models):
+                        model = self.models[next_index]
+                        next_index += 1
+                    else:
+                        model = hedge_base["model"]
+                    self._record(model, hedges=1)
+                    launch(model)
+                elif not pending and next_index < len(self.models):
+                    launch_next()
+                continue
+
+            for future in done:
+                model = pending.pop(future).model
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    self._log_warning(f"[ROUTER] Modello {model} in errore: {e.__class__.__name__}: {e}")
+                    continue
+
+                # Vince la prima risposta valida; i tentativi ancora in corso perdono
+                self._record(model, wins=1)
+                for other in pending.values():
+                    self._record(other.model, losses=1)
+                return model, result
+
+            if not pending and next_index < len(self.models):
+                launch_next()
+
+        raise last_error if last_error else RuntimeError("Nessun modello disponibile")
+
+    def get_stats(self):
+        """
+        Restituisce le statistiche di ogni modello della catena
+        Returns:
+            list: Un dizionario per modello, nell'ordine della catena
+        """
+        with self._lock:
+            stats = []
+            for model in self.models:
+                s = self._stats[model]
+                samples = list(s.latencies)
+                stats.append({
+                    "model": model,
+                    "attempts": s.attempts,
+                    "successes": s.successes,
+                    "errors": s.errors,
+                    "timeouts": s.timeouts,
+                    "hedges": s.hedges,
+                    "wins": s.wins,
+                    "losses": s.losses,
+                    "latency_p50_ms": _to_ms(percentile(samples, 50)),
+                    "latency_p95_ms": _to_ms(percentile(samples, 95)),
+                    "latency_p99_ms": _to_ms(percentile(samples, 99)),
+                })
+            return stats
+
+
+def _to_ms(seconds):
+    return round(seconds * 1000) if seconds is not None else None
@@ -0,0 +1,168 @@
+"""
+File:	/web_api/utils/request_cache.py
+-----
+Class RequestCache - Deduplicazione delle richieste ripetute (request_id):
+la risposta viene calcolata una volta e restituita ai retry del robot
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:07:15 am
+-----
+Last Modified: 	October 19th 2026 4:35:37 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Additional Terms under Section 7(b):
+
+The following attribution requirements apply to this work:
+
+1. Copyright notices and author attribution in source code files
+   cannot be removed or altered.
+2. Any interactive user interface must preserve and display
+   author attribution (Copyright, authors, project name).
+3. System prompts containing author information cannot be modified
+4. Public demonstrations, publications and derivative works
+   must credit the original authors.
+
+For full Additional Terms see the LICENSE file.
+------------------------------------------------------------------------------
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class RequestInFlightError(Exception):
+    """La richiesta originale è ancora in elaborazione oltre il tempo di attesa"""
+
+
+class _Entry:
+    __slots__ = ("event", "result", "expires")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.expires = float("inf")
+
+
+class RequestCache:
+    """
+    Mappa limitata (TTL + numero massimo di voci) request_id -> risposta.
+
+    Quando il WiFi del robot è instabile la stessa richiesta arriva più volte:
+    la prima viene elaborata, i duplicati che arrivano mentre è in corso ne
+    attendono il risultato e quelli successivi ricevono la risposta memorizzata,
+    senza una nuova chiamata al modello né messaggi doppi nella cronologia.
+    """
+
+    def __init__(self, ttl=120.0, max_entries=5000, wait_timeout=60.0, clock=time.monotonic):
+        """
+        Args:
+            ttl: Secondi per cui una risposta resta disponibile ai retry
+            max_entries: Numero massimo di risposte memorizzate (le più vecchie vengono scartate)
+            wait_timeout: Attesa massima (secondi) di un duplicato per la richiesta in corso
+            clock: Funzione che restituisce il tempo corrente (sostituibile nei test)
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()       # risposte memorizzate, in ordine di scadenza
+        self._pending = {}                  # richieste in corso (non scadono)
+        self._stats = {"computed": 0, "replayed": 0, "joined": 0}
+
+    def _expire(self, now):
+        # Solo le voci completate, in ordine di scadenza: una richiesta in corso non blocca le altre
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires > now:
+                break
+            del self._entries[key]
+
+    def run(self, key, compute, cacheable=None):
+        """
+        Restituisce il risultato per la chiave, calcolandolo una sola volta
+        Args:
+            key: Identificativo della richiesta
+            compute: Funzione senza argomenti che produce il risultato
+            cacheable: Funzione risultato -> bool; i risultati non memorizzabili
+                       (es. errori 5xx) vengono consegnati solo ai duplicati già in attesa
+        Returns:
+            tuple: (risultato, origine) con origine "computed", "replayed" o "joined"
+        Raises:
+            RequestInFlightError: se la richiesta originale non termina entro wait_timeout
+        """
+        with self._lock:
+            self._expire(self._clock())
+            entry = self._pending.get(key) or self._entries.get(key)
+            leader = entry is None
+            if leader:
+                entry = self._pending[key] = _Entry()
+
+        if not leader:
+            source = "replayed" if entry.event.is_set() else "joined"
+            if not entry.event.wait(self.wait_timeout):
+                raise RequestInFlightError(f"Richiesta {key} ancora in elaborazione")
+            if entry.result is not None:
+                with self._lock:
+                    self._stats[source] += 1
+                return entry.result, source
+            # La richiesta originale è fallita con un'eccezione: si ricalcola
+            return self.run(key, compute, cacheable)
+
+        try:
+            result = compute()
+        except BaseException:
+            with self._lock:
+                if self._pending.get(key) is entry:
+                    del self._pending[key]
+            entry.event.set()
+            raise
+
+        with self._lock:
+            self._stats["computed"] += 1
+            entry.result = result
+            if self._pending.get(key) is entry:
+                del self._pending[key]
+                if cacheable is None or cacheable(result):
+                    entry.expires = self._clock() + self.ttl
+                    self._entries[key] = entry
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        entry.event.set()
+        return result, "computed"
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries) + len(self._pending)
+
+    def get_stats(self):
+        """
+        Restituisce configurazione e contatori della cache
+        Returns:
+            dict: Risposte calcolate, restituite ai retry (replayed) e condivise con duplicati in corso (joined)
+        """
+        with self._lock:
+            return {
+                "ttl_s": self.ttl,
+                "max_entries": self.max_entries,
+                "entries": len(self._entries),
+                "in_flight": len(self._pending),
+                **self._stats,
+            }
@@ -0,0 +1,215 @@
+"""
+File:	/web_api/utils/response_encoding.py
+-----
+Class ResponseEncoder - Negoziazione della codifica delle risposte: compressione
+gzip/brotli delle risposte grandi e MessagePack opzionale per il robot
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:23:08 am
+-----
+Last Modified: 	October 19th 2026 4:42:30 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Additional Terms under Section 7(b):
+
+The following attribution requirements apply to this work:
+
+1. Copyright notices and author attribution in source code files
+   cannot be removed or altered.
+2. Any interactive user interface must preserve and display
+   author attribution (Copyright, authors, project name).
+3. System prompts containing author information cannot be modified
+4. Public demonstrations, publications and derivative works
+   must credit the original authors.
+
+For full Additional Terms see the LICENSE file.
+------------------------------------------------------------------------------
+"""
+
+
+import gzip
+import json
+import zlib
+
+# brotli e msgpack sono opzionali: senza, si usano gzip e JSON
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MIMETYPE = "application/msgpack"
+# Tipi con cui il client può chiedere MessagePack nell'header Accept
+MSGPACK_ACCEPT = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+
+def parse_accept(header):
+    """
+    Interpreta un header Accept / Accept-Encoding
+    Returns:
+        dict: {valore in minuscolo: q} (q = 1.0 se assente, 0.0 se non valido)
+    """
+    values = {}
+    for item in (header or "").split(","):
+        parts = [p.strip() for p in item.split(";")]
+        if not parts[0]:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        values[parts[0].lower()] = q
+    return values
+
+
+def available_encodings():
+    """Codifiche supportate dal server, in ordine di preferenza"""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encoding, available=None):
+    """
+    Sceglie la codifica di compressione accettata dal client con q più alto
+    (a parità, l'ordine di available: brotli prima di gzip)
+    Returns:
+        str: "br", "gzip" o None (nessuna compressione)
+    """
+    accepted = parse_accept(accept_encoding)
+    best, best_q = None, 0.0
+    for encoding in available or available_encodings():
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def wants_msgpack(accept):
+    """
+    True se il client preferisce MessagePack a JSON (e il modulo msgpack è installato):
+    il q di MessagePack deve essere positivo e non inferiore a quello di application/json
+    (o, se JSON non è elencato, di application/* e */*)
+    """
+    if msgpack is None:
+        return False
+    accepted = parse_accept(accept)
+    msgpack_q = max(accepted.get(mimetype, 0.0) for mimetype in MSGPACK_ACCEPT)
+    json_q = accepted.get("application/json", accepted.get("application/*", accepted.get("*/*", 0.0)))
+    return msgpack_q > 0 and msgpack_q >= json_q
+
+
+def compress(data, encoding, gzip_level=6, brotli_quality=5):
+    """Comprime data (bytes) con la codifica indicata"""
+    if encoding == "br":
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=gzip_level)
+
+
+def compress_stream(chunks, encoding, gzip_level=6, brotli_quality=5):
+    """Comprime una risposta in streaming (es. NDJSON di export-chats) blocco per blocco"""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=brotli_quality)
+        for chunk in chunks:
+            data = compressor.process(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        # wbits 31: formato gzip (header e CRC), come gzip.compress
+        compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+class ResponseEncoder:
+    """
+    Codifica delle risposte negoziata con il client.
+
+    Le risposte JSON possono essere convertite in MessagePack se il client lo
+    chiede (Accept: application/msgpack): stessa struttura (chunks, action...)
+    ma più compatta e più veloce da decodificare sulla CPU del robot. Le
+    risposte oltre min_bytes vengono compresse con brotli o gzip secondo
+    Accept-Encoding; quelle piccole (un turno di talk) no, perché per pochi
+    byte la decompressione costa più del risparmio in rete. Le risposte in
+    streaming vengono compresse blocco per blocco.
+    """
+
+    def __init__(self, min_bytes=1024, gzip_level=6, brotli_quality=5, compression=True, msgpack_enabled=True):
+        """
+        Args:
+            min_bytes: Dimensione minima (byte) di una risposta da comprimere
+            gzip_level: Livello di compressione gzip (1-9)
+            brotli_quality: Qualità brotli (0-11)
+            compression: Abilita la compressione
+            msgpack_enabled: Abilita MessagePack su richiesta del client
+        """
+        self.min_bytes = min_bytes
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.compression = compression
+        self.msgpack_enabled = msgpack_enabled and msgpack is not None
+
+    def apply(self, response, accept_encoding="", accept=""):
+        """
+        Applica alla risposta (Flask/Werkzeug) la codifica negoziata
+        Args:
+            response: Risposta da codificare (modificata in place)
+            accept_encoding: Header Accept-Encoding della richiesta
+            accept: Header Accept della richiesta
+        Returns:
+            La risposta
+        """
+        if response.direct_passthrough or "Content-Encoding" in response.headers:
+            return response
+
+        if response.is_streamed:
+            encoding = self.compression and choose_encoding(accept_encoding)
+            if encoding:
+                response.response = compress_stream(
+                    response.response, encoding, self.gzip_level, self.brotli_quality
+                )
+                response.headers.pop("Content-Length", None)
+                response.headers["Content-Encoding"] = encoding
+                response.vary.add("Accept-Encoding")
+            return response
+
+        if self.msgpack_enabled and response.mimetype == "application/json":
+            response.vary.add("Accept")
+            if wants_msgpack(accept):
+                payload = json.loads(response.get_data())
+                response.set_data(msgpack.packb(payload, use_bin_type=True))
+                response.mimetype = MSGPACK_MIMETYPE
+
+        if self.compression:
+            response.vary.add("Accept-Encoding")
+            body = response.get_data()
+            encoding = choose_encoding(accept_encoding) if len(body) >= self.min_bytes else None
+            if encoding:
+                response.set_data(compress(body, encoding, self.gzip_level, self.brotli_quality))
+                response.headers["Content-Encoding"] = encoding
+        return response
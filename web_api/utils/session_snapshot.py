@@ -0,0 +1,462 @@
+"""
+File:	/web_api/utils/session_snapshot.py
+-----
+Class SessionSnapshot - Snapshot incrementale delle sessioni su file locale
+(journal append-only + indice periodico) e ripristino al riavvio con
+caricamento pigro delle cronologie
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:13:09 am
+-----
+Last Modified: 	October 19th 2026 4:48:45 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Additional Terms under Section 7(b):
+
+The following attribution requirements apply to this work:
+
+1. Copyright notices and author attribution in source code files
+   cannot be removed or altered.
+2. Any interactive user interface must preserve and display
+   author attribution (Copyright, authors, project name).
+3. System prompts containing author information cannot be modified
+4. Public demonstrations, publications and derivative works
+   must credit the original authors.
+
+For full Additional Terms see the LICENSE file.
+------------------------------------------------------------------------------
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+try:
+    import fcntl
+except ImportError:  # Windows: nessun lock tra processi
+    fcntl = None
+
+# Operazioni registrate nel journal (una riga JSON per record)
+OP_MESSAGE = "m"        # {"op": "m", "c": chat_id, "r": ruolo, "t": contenuto, "ts": epoch}
+OP_PERSONALITY = "p"    # {"op": "p", "c": chat_id, "n": personalità}
+OP_RESET = "r"          # {"op": "r", "c": chat_id} (cronologia azzerata dal cambio personalità)
+OP_END = "e"            # {"op": "e", "c": chat_id}
+OP_CLEAR = "x"          # {"op": "x"} (delete-chats)
+
+INDEX_VERSION = 2
+
+
+class SnapshotLockedError(RuntimeError):
+    """Il journal è già in uso da un altro processo (es. più worker gunicorn con lo stesso shard)"""
+
+
+def _new_entry(ts):
+    return {"personality": None, "offsets": [], "created_at": ts, "last_activity": ts, "bytes": 0,
+            "journal_bytes": 0, "personality_bytes": 0}
+
+
+def _live_bytes(entry):
+    """Byte del journal ancora referenziati dalla chat (messaggi e ultimo cambio personalità)"""
+    return entry["journal_bytes"] + entry["personality_bytes"]
+
+
+def apply_record(index, record, offset, length=0):
+    """
+    Applica un record del journal all'indice {chat_id: entry}.
+    L'indice contiene solo gli offset dei messaggi, non il loro contenuto.
+    Args:
+        length: Lunghezza in byte della riga del record nel journal
+    Returns:
+        int: byte del journal diventati inutili (record superati, chat chiuse o azzerate)
+    """
+    op = record.get("op")
+    if op == OP_CLEAR:
+        dead = length + sum(_live_bytes(entry) for entry in index.values())
+        index.clear()
+        return dead
+    chat_id = record.get("c")
+    if not chat_id:
+        return length
+    if op == OP_END:
+        entry = index.pop(chat_id, None)
+        return length + (_live_bytes(entry) if entry is not None else 0)
+    ts = record.get("ts") or time.time()
+    entry = index.get(chat_id)
+    if entry is None:
+        entry = index[chat_id] = _new_entry(ts)
+    if op == OP_MESSAGE:
+        entry["offsets"].append(offset)
+        entry["last_activity"] = ts
+        entry["bytes"] += len(record.get("t", "").encode("utf-8"))
+        entry["journal_bytes"] += length
+        return 0
+    if op == OP_PERSONALITY:
+        # Conta solo l'ultimo cambio di personalità: i precedenti sono superati
+        dead = entry["personality_bytes"]
+        entry["personality"] = record.get("n")
+        entry["personality_bytes"] = length
+        return dead
+    if op == OP_RESET:
+        dead = length + entry["journal_bytes"]
+        entry["offsets"] = []
+        entry["bytes"] = 0
+        entry["journal_bytes"] = 0
+        return dead
+    return length
+
+
+def _encode(record):
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class SessionSnapshot:
+    """
+    Persistenza delle sessioni attraverso deploy e crash.
+
+    Ogni modifica (messaggio, cambio personalità, reset, chiusura) viene
+    accodata in memoria e scritta da un thread in background in un journal
+    append-only: il percorso della richiesta non tocca il disco. Ogni
+    checkpoint_interval secondi viene salvato (in modo atomico) un indice
+    {chat_id: personalità, offset dei messaggi, metadati} con la posizione del
+    journal a cui si riferisce. All'avvio si legge l'indice più la sola coda
+    del journal scritta dopo l'ultimo checkpoint: il costo è proporzionale
+    all'indice, non alla dimensione delle cronologie, che vengono lette dal
+    journal solo al primo accesso alla chat (load_history). L'indice conta i
+    byte dei record non più necessari (chat chiuse o azzerate, personalità
+    sostituite): quando superano la metà del journal, il file viene compattato.
+    """
+
+    JOURNAL_NAME = "sessions_{}.jsonl"
+    INDEX_NAME = "sessions_{}.idx.json"
+
+    def __init__(self, directory, shard="default", flush_interval=1.0, checkpoint_interval=60.0,
+                 compact_min_bytes=8 * 1024 * 1024, fsync=False, logger=None):
+        """
+        Args:
+            directory: Cartella dei file di snapshot
+            shard: Nome dello shard (un journal per shard, CHAT_ID_SHARD)
+            flush_interval: Secondi tra due scritture del journal
+            checkpoint_interval: Secondi tra due salvataggi dell'indice
+            compact_min_bytes: Dimensione minima del journal per la compattazione (0 = mai)
+            fsync: Forza la scrittura su disco a ogni flush (più lento, sopravvive al crash del sistema)
+            logger: Istanza di ChatLogger (opzionale)
+        Raises:
+            SnapshotLockedError: se un altro processo usa lo stesso journal
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.journal_path = os.path.join(directory, self.JOURNAL_NAME.format(shard))
+        self.index_path = os.path.join(directory, self.INDEX_NAME.format(shard))
+        self.flush_interval = flush_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.compact_min_bytes = compact_min_bytes
+        self.fsync = fsync
+        self.logger = logger
+
+        self._pending = deque()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        # Protegge indice e file: il thread di scrittura e i caricamenti pigri
+        self._lock = threading.RLock()
+        self._index = {}
+        # Byte del journal non più referenziati dall'indice (recuperati dalla compattazione)
+        self._dead_bytes = 0
+        self._last_checkpoint = time.monotonic()
+        self._dirty = False
+        self._stats = {"records": 0, "flushes": 0, "checkpoints": 0, "compactions": 0,
+                       "lazy_loads": 0, "errors": 0}
+
+        self._journal = open(self.journal_path, "ab+")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._journal.close()
+                raise SnapshotLockedError(f"Journal {self.journal_path} in uso da un altro processo")
+
+    def _log(self, level, message):
+        if self.logger:
+            getattr(self.logger, f"log_{level}")(message)
+
+    # ------------------------------------------------------------------
+    # Ripristino
+    # ------------------------------------------------------------------
+
+    def _load_index(self):
+        """Legge l'ultimo checkpoint; (indice vuoto, 0, 0) se assente o non valido"""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != INDEX_VERSION:
+                raise ValueError(f"versione {data.get('version')} non supportata")
+            return data["chats"], int(data["journal_offset"]), int(data["dead_bytes"])
+        except FileNotFoundError:
+            return {}, 0, 0
+        except (ValueError, KeyError, TypeError) as e:
+            self._log("warning", f"[SNAPSHOT] Indice non valido ({e}): ricostruzione dal journal")
+            return {}, 0, 0
+
+    def restore(self):
+        """
+        Ricostruisce l'indice (checkpoint + coda del journal) senza leggere le cronologie.
+        Un'ultima riga troncata (crash durante la scrittura) viene scartata.
+        Returns:
+            dict: {chat_id: {"personality", "count", "created_at", "last_activity", "bytes"}}
+                  in ordine di creazione
+        """
+        with self._lock:
+            index, offset, dead = self._load_index()
+            size = os.path.getsize(self.journal_path)
+            if offset > size:
+                # Journal più corto del checkpoint (sostituito o troncato): si riparte da zero
+                index, offset, dead = {}, 0, 0
+
+            tail_records = 0
+            with open(self.journal_path, "rb") as f:
+                f.seek(offset)
+                while True:
+                    line = f.readline()
+                    if not line:
+                        break
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("riga incompleta")
+                        record = json.loads(line)
+                    except ValueError:
+                        self._log("warning", f"[SNAPSHOT] Journal troncato all'offset {offset}: coda scartata")
+                        self._journal.truncate(offset)
+                        break
+                    dead += apply_record(index, record, offset, len(line))
+                    offset += len(line)
+                    tail_records += 1
+
+            self._index = index
+            self._dead_bytes = dead
+            self._dirty = tail_records > 0
+            self._log("info", f"[SNAPSHOT] Ripristinate {len(index)} chat "
+                              f"({tail_records} record dopo l'ultimo checkpoint)")
+            return {
+                chat_id: {
+                    "personality": entry["personality"],
+                    "count": len(entry["offsets"]),
+                    "created_at": entry["created_at"],
+                    "last_activity": entry["last_activity"],
+                    "bytes": entry["bytes"],
+                }
+                for chat_id, entry in index.items()
+            }
+
+    def load_history(self, chat_id, count=None):
+        """
+        Legge dal journal i primi count messaggi della chat (caricamento pigro)
+        Returns:
+            list: [(ruolo, contenuto), ...]
+        """
+        with self._lock:
+            entry = self._index.get(chat_id)
+            if entry is None:
+                return []
+            offsets = entry["offsets"][:count] if count is not None else list(entry["offsets"])
+            self._journal.flush()
+            messages = []
+            with open(self.journal_path, "rb") as f:
+                for offset in offsets:
+                    f.seek(offset)
+                    record = json.loads(f.readline())
+                    messages.append((record["r"], record["t"]))
+            self._stats["lazy_loads"] += 1
+            return messages
+
+    def iter_messages(self, counts):
+        """
+        Scorre i primi count messaggi delle chat indicate con una sola lettura sequenziale
+        del journal (per ricostruire in background l'indice di ricerca dopo il ripristino).
+        Il lock è tenuto solo per leggere gli offset e aprire il file: la compattazione
+        sostituisce il journal con un nuovo file, quello aperto resta valido
+        Args:
+            counts: {chat_id: numero di messaggi} (es. "count" restituito da restore)
+        Yields:
+            tuple: (chat_id, posizione, ruolo, contenuto)
+        """
+        with self._lock:
+            positions = sorted(
+                (offset, chat_id, position)
+                for chat_id, count in counts.items()
+                if chat_id in self._index
+                for position, offset in enumerate(self._index[chat_id]["offsets"][:count])
+            )
+            self._journal.flush()
+            f = open(self.journal_path, "rb")
+        with f:
+            for offset, chat_id, position in positions:
+                f.seek(offset)
+                record = json.loads(f.readline())
+                yield chat_id, position, record["r"], record["t"]
+
+    # ------------------------------------------------------------------
+    # Registrazione (percorso della richiesta: solo accodamento)
+    # ------------------------------------------------------------------
+
+    def _enqueue(self, record):
+        record["ts"] = time.time()
+        self._pending.append(record)
+
+    def record_message(self, chat_id, role, content):
+        self._enqueue({"op": OP_MESSAGE, "c": chat_id, "r": role, "t": content})
+
+    def record_personality(self, chat_id, personality_name):
+        self._enqueue({"op": OP_PERSONALITY, "c": chat_id, "n": personality_name})
+
+    def record_reset(self, chat_id):
+        self._enqueue({"op": OP_RESET, "c": chat_id})
+
+    def record_end(self, chat_id):
+        self._enqueue({"op": OP_END, "c": chat_id})
+
+    def record_clear(self):
+        self._enqueue({"op": OP_CLEAR})
+
+    # ------------------------------------------------------------------
+    # Scrittura in background
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Avvia il thread di scrittura"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="session-snapshot", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                if time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+                    self.checkpoint()
+            except Exception as e:
+                self._stats["errors"] += 1
+                self._log("error", f"[SNAPSHOT] Errore di scrittura: {e.__class__.__name__}: {e}")
+
+    def flush(self):
+        """Scrive nel journal i record accodati e aggiorna l'indice"""
+        with self._lock:
+            if not self._pending:
+                return 0
+            written = 0
+            self._journal.seek(0, os.SEEK_END)
+            while self._pending:
+                record = self._pending.popleft()
+                offset = self._journal.tell()
+                line = _encode(record)
+                self._journal.write(line)
+                self._dead_bytes += apply_record(self._index, record, offset, len(line))
+                written += 1
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            self._dirty = True
+            self._stats["records"] += written
+            self._stats["flushes"] += 1
+            return written
+
+    def checkpoint(self):
+        """Salva l'indice in modo atomico ed eventualmente compatta il journal"""
+        with self._lock:
+            self._last_checkpoint = time.monotonic()
+            if not self._dirty:
+                return False
+            size = self._journal.seek(0, os.SEEK_END)
+            if self.compact_min_bytes and size >= self.compact_min_bytes and self._dead_bytes * 2 > size:
+                self._compact()
+                size = self._journal.seek(0, os.SEEK_END)
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": INDEX_VERSION, "journal_offset": size, "dead_bytes": self._dead_bytes,
+                           "chats": self._index}, f, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.index_path)
+            self._dirty = False
+            self._stats["checkpoints"] += 1
+            return True
+
+    def _compact(self):
+        """Riscrive il journal con le sole chat attive (stesso ordine, nuovi offset)"""
+        before = self._journal.tell()
+        tmp_path = self.journal_path + ".tmp"
+        new_index = {}
+        with open(self.journal_path, "rb") as src, open(tmp_path, "wb") as dst:
+            for chat_id, entry in self._index.items():
+                new_entry = dict(entry, offsets=[], journal_bytes=0, personality_bytes=0)
+                if entry["personality"]:
+                    line = _encode({"op": OP_PERSONALITY, "c": chat_id, "n": entry["personality"]})
+                    dst.write(line)
+                    new_entry["personality_bytes"] = len(line)
+                for offset in entry["offsets"]:
+                    src.seek(offset)
+                    line = src.readline()
+                    new_entry["offsets"].append(dst.tell())
+                    new_entry["journal_bytes"] += len(line)
+                    dst.write(line)
+                new_index[chat_id] = new_entry
+            dst.flush()
+            os.fsync(dst.fileno())
+
+        # Il lock tra processi passa al nuovo file prima della sostituzione
+        journal = open(tmp_path, "ab+")
+        if fcntl is not None:
+            fcntl.flock(journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.replace(tmp_path, self.journal_path)
+        self._journal.close()
+        self._journal = journal
+        self._index = new_index
+        self._dead_bytes = 0
+        self._stats["compactions"] += 1
+        self._log("info", f"[SNAPSHOT] Journal compattato: {before} -> {journal.seek(0, os.SEEK_END)} byte")
+
+    def close(self):
+        """Ferma il thread, scrive i record in coda e salva l'indice"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        with self._lock:
+            if self._journal.closed:
+                return
+            try:
+                self.flush()
+                self.checkpoint()
+            finally:
+                self._journal.close()
+
+    def get_stats(self):
+        """Statistiche del journal per la rotta admin stats"""
+        with self._lock:
+            size = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+            return {
+                "chats": len(self._index),
+                "pending": len(self._pending),
+                "journal_bytes": size,
+                "dead_bytes": self._dead_bytes,
+                **self._stats,
+            }
@@ -0,0 +1,153 @@
+"""
+File:	/web_api/utils/session_store.py
+-----
+Class SessionStore - Lock per chat: i turni concorrenti sulla stessa chat
+(es. un retry del robot durante una chiamata LLM lenta) vengono serializzati o rifiutati
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 4:05:53 am
+-----
+Last Modified: 	October 19th 2026 4:05:53 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Additional Terms under Section 7(b):
+
+The following attribution requirements apply to this work:
+
+1. Copyright notices and author attribution in source code files
+   cannot be removed or altered.
+2. Any interactive user interface must preserve and display
+   author attribution (Copyright, authors, project name).
+3. System prompts containing author information cannot be modified
+4. Public demonstrations, publications and derivative works
+   must credit the original authors.
+
+For full Additional Terms see the LICENSE file.
+------------------------------------------------------------------------------
+"""
+
+import threading
+from contextlib import contextmanager
+
+# Politiche per un turno che arriva mentre un altro turno della stessa chat è in corso
+BUSY_POLICIES = ("wait", "reject")
+
+
+class ChatBusyError(Exception):
+    """La chat ha già un turno in corso (politica reject o attesa scaduta)"""
+
+    def __init__(self, chat_id, waited):
+        self.chat_id = chat_id
+        self.waited = waited
+        super().__init__(f"Chat {chat_id} occupata: un turno è già in corso")
+
+
+class _ChatLock:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = 0
+
+
+class SessionStore:
+    """
+    Lock per chat_id per l'accesso concorrente alla cronologia.
+
+    Con gunicorn multithread due richieste per la stessa chat possono arrivare
+    insieme: senza lock entrambe aggiungono messaggi alla stessa lista e la
+    cronologia alterna domande e risposte di turni diversi (e si paga due volte
+    il modello). Con la politica "wait" il secondo turno attende la fine del
+    primo (al massimo lock_timeout secondi), con "reject" viene rifiutato subito.
+    Un lock esiste solo finché qualcuno lo usa, quindi la mappa non cresce con
+    il numero di chat.
+    """
+
+    def __init__(self, busy_policy="wait", lock_timeout=30.0):
+        """
+        Args:
+            busy_policy: "wait" (serializza i turni) o "reject" (rifiuta il turno concorrente)
+            lock_timeout: Attesa massima (secondi) con la politica wait
+        """
+        if busy_policy not in BUSY_POLICIES:
+            raise ValueError(f"Politica non valida: {busy_policy} (ammesse: {', '.join(BUSY_POLICIES)})")
+        self.busy_policy = busy_policy
+        self.lock_timeout = lock_timeout
+        self._guard = threading.Lock()
+        self._locks = {}
+        self._stats = {"turns": 0, "waited": 0, "rejected": 0}
+
+    def _release_entry(self, chat_id, entry):
+        with self._guard:
+            entry.users -= 1
+            if entry.users == 0 and self._locks.get(chat_id) is entry:
+                del self._locks[chat_id]
+
+    @contextmanager
+    def lock(self, chat_id):
+        """
+        Acquisisce il lock della chat per tutta la durata del turno
+        Raises:
+            ChatBusyError: se la chat è occupata (reject) o l'attesa supera lock_timeout (wait)
+        """
+        with self._guard:
+            entry = self._locks.get(chat_id)
+            if entry is None:
+                entry = self._locks[chat_id] = _ChatLock()
+            entry.users += 1
+
+        acquired = entry.lock.acquire(blocking=False)
+        waited = False
+        if not acquired and self.busy_policy == "wait":
+            waited = True
+            acquired = entry.lock.acquire(timeout=self.lock_timeout)
+
+        with self._guard:
+            self._stats["turns"] += 1
+            self._stats["waited"] += int(waited)
+            self._stats["rejected"] += int(not acquired)
+
+        if not acquired:
+            self._release_entry(chat_id, entry)
+            raise ChatBusyError(chat_id, waited)
+        try:
+            yield
+        finally:
+            entry.lock.release()
+            self._release_entry(chat_id, entry)
+
+    def is_busy(self, chat_id):
+        """True se la chat ha un turno in corso"""
+        with self._guard:
+            entry = self._locks.get(chat_id)
+            return entry is not None and entry.lock.locked()
+
+    def get_stats(self):
+        """
+        Restituisce politica e contatori dei lock
+        Returns:
+            dict: Turni, turni che hanno atteso, turni rifiutati e chat con un turno in corso
+        """
+        with self._guard:
+            return {
+                "busy_policy": self.busy_policy,
+                "lock_timeout_s": self.lock_timeout,
+                "busy_chats": sum(1 for entry in self._locks.values() if entry.lock.locked()),
+                **self._stats,
+            }
@@ -45,52 +45,171 @@ import os
 import io
 import json
 import wave
+import shutil
+import struct
 import tempfile
+import subprocess
+from collections import deque
 from datetime import datetime
 from flask import request, jsonify
-try:
-    from pydub import AudioSegment
-    PYDUB_AVAILABLE = True
-    
-    # Configura path espliciti per ffmpeg/ffprobe
-    # Questo risolve problemi quando il servizio gira con utente daemon
-    # che non ha accesso al PATH completo
-    AudioSegment.converter = "/usr/bin/ffmpeg"
-    AudioSegment.ffprobe = "/usr/bin/ffprobe"
-except ImportError:
-    PYDUB_AVAILABLE = False
-
-# Import Vosk con gestione errori
-try:
-    from vosk import Model, KaldiRecognizer, SetLogLevel
-    VOSK_AVAILABLE = True
-    # Disabilita log verbosi di Vosk
-    SetLogLevel(-1)
-except ImportError:
-    VOSK_AVAILABLE = False
-    Model = None
-    KaldiRecognizer = None
+import threading
+
+# pydub e Vosk vengono importati al primo utilizzo (load_backends), non all'avvio del server:
+# il caricamento avviene nel thread di warm-up
+PYDUB_AVAILABLE = None
+VOSK_AVAILABLE = None
+AudioSegment = None
+Model = None
+KaldiRecognizer = None
+_backends_lock = threading.Lock()
+
+# Content-Type accettati come audio grezzo nel body (senza multipart/form-data)
+RAW_AUDIO_MIMETYPES = (
+    "application/octet-stream", "audio/ogg", "audio/opus", "audio/wav", "audio/x-wav", "audio/wave",
+)
+# Byte letti per volta dallo stream della richiesta
+STREAM_CHUNK_SIZE = 64 * 1024
+# Pre-buffer dello Smart Trim: non taglia l'attacco della parola
+SMART_TRIM_PREBUFFER_SEC = 0.5
+# Byte dell'intestazione WAV letti per trovare il chunk "fmt " (prima possono esserci LIST/JUNK)
+WAV_HEADER_PROBE_BYTES = 4096
+# Secondi concessi a ffmpeg per terminare dopo la fine dell'audio, poi viene terminato
+FFMPEG_EXIT_TIMEOUT = 5
+# Righe finali di stderr di ffmpeg conservate per il messaggio di errore
+FFMPEG_STDERR_LINES = 20
+
+
+def load_backends():
+    """Importa pydub e Vosk (una sola volta, thread-safe)"""
+    global PYDUB_AVAILABLE, VOSK_AVAILABLE, AudioSegment, Model, KaldiRecognizer
+    with _backends_lock:
+        if PYDUB_AVAILABLE is None:
+            try:
+                from pydub import AudioSegment
+                PYDUB_AVAILABLE = True
+
+                # Configura path espliciti per ffmpeg/ffprobe
+                # Questo risolve problemi quando il servizio gira con utente daemon
+                # che non ha accesso al PATH completo
+                AudioSegment.converter = "/usr/bin/ffmpeg"
+                AudioSegment.ffprobe = "/usr/bin/ffprobe"
+            except ImportError:
+                PYDUB_AVAILABLE = False
+
+        # Import Vosk con gestione errori
+        if VOSK_AVAILABLE is None:
+            try:
+                from vosk import Model, KaldiRecognizer, SetLogLevel
+                VOSK_AVAILABLE = True
+                # Disabilita log verbosi di Vosk
+                SetLogLevel(-1)
+            except ImportError:
+                VOSK_AVAILABLE = False
+
+def find_ffmpeg():
+    """Percorso di ffmpeg: /usr/bin/ffmpeg (come pydub, anche con utente daemon senza PATH) o dal PATH"""
+    return "/usr/bin/ffmpeg" if os.path.exists("/usr/bin/ffmpeg") else shutil.which("ffmpeg")
+
+
+def _read_up_to(stream, size):
+    """Legge fino a size byte dallo stream (read può restituirne meno anche prima della fine)"""
+    data = b""
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def _is_pcm16_mono_wav(header):
+    """
+    True se l'intestazione è di un WAV PCM 16bit mono, leggibile direttamente a blocchi;
+    gli altri WAV (stereo, 8/24/32bit, float, extensible) vanno convertiti con ffmpeg
+    """
+    if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return False
+    position = 12
+    while position + 8 <= len(header):
+        chunk_id = header[position:position + 4]
+        (chunk_size,) = struct.unpack("<I", header[position + 4:position + 8])
+        if chunk_id == b"fmt ":
+            if chunk_size < 16 or position + 24 > len(header):
+                return False
+            format_tag, channels, _, _, _, bits = struct.unpack("<HHIIHH", header[position + 8:position + 24])
+            return format_tag == 1 and channels == 1 and bits == 16
+        # I chunk hanno lunghezza pari (byte di padding)
+        position += 8 + chunk_size + (chunk_size & 1)
+    return False
+
+
+class _PrefixedStream:
+    """
+    Stream in sola lettura: restituisce prima i byte già letti (prefix, usati per
+    riconoscere il formato) e poi il resto di stream, fino a max_bytes
+    """
+
+    def __init__(self, prefix, stream, max_bytes=None):
+        self._prefix = prefix
+        self._stream = stream
+        self.max_bytes = max_bytes
+        self.bytes_read = len(prefix)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data, self._prefix = self._prefix, b""
+            extra = self._stream.read()
+        else:
+            data, self._prefix = self._prefix[:size], self._prefix[size:]
+            extra = self._stream.read(size - len(data)) if len(data) < size else b""
+        # Il prefisso è già conteggiato: si contano solo i byte letti ora dallo stream
+        self.bytes_read += len(extra)
+        if self.max_bytes and self.bytes_read > self.max_bytes:
+            raise ValueError(f"Audio oltre il limite di {self.max_bytes} byte")
+        return data + extra
+
 
 class STT:
     """
     Classe per gestire il riconoscimento vocale con Vosk o altri modelli
     """
     
-    def __init__(self, logger=None, model_path=None):
+    def __init__(self, logger=None, model_path=None, lazy=False):
         """
         Inizializza il sistema STT con Vosk
         
         Args:
             logger: Istanza di ChatLogger per logging
             model_path: Percorso personalizzato del modello (opzionale)
+            lazy: Se True il modello non viene caricato subito ma con load()
+                  (es. nel thread di warm-up)
         """
         self.logger = logger
+        self.model_path = model_path
         self.vosk_model = None
         self.error_message = None
         self.is_available = False
+        # Tempi per fase (audio_prep_ms, stt_ms) inclusi nel risultato di transcribe_ogg
+        self.timing_enabled = os.getenv("TIMING_ENABLED", "false").lower() == "true"
+        # Frame passati a Vosk per ogni chiamata di AcceptWaveform
+        self.block_size = int(os.getenv("STT_BLOCK_SIZE", "4000"))
+        # Dimensione massima dell'audio grezzo letto dal body della richiesta (transcribe_stream)
+        self.raw_max_bytes = int(float(os.getenv("STT_RAW_MAX_MB", "10")) * 1024 * 1024)
         
         # Inizializza il modello
-        self._initialize_model(model_path)
+        if not lazy:
+            self.load()
+
+    def load(self):
+        """
+        Importa pydub/Vosk e carica il modello
+        Returns:
+            bool: True se il modello è disponibile
+        """
+        if not self.is_available:
+            load_backends()
+            self._initialize_model(self.model_path)
+        return self.is_available
     
     def _find_vosk_model(self, models_dir):
         """
@@ -256,6 +375,33 @@ class STT:
         
         return True, None
     
+    def warm_up(self, seconds=1.0, framerate=16000):
+        """
+        Decodifica una clip di silenzio generata in memoria (WAV mono 16bit) con
+        _process_audio, così le pagine del modello Vosk e il recognizer sono già
+        caricati quando arriva la prima richiesta del robot
+        Returns:
+            bool: True se il modello è disponibile e la decodifica è riuscita
+        """
+        if not self.is_available or self.vosk_model is None:
+            return False
+
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as silent_clip:
+            silent_clip.setnchannels(1)
+            silent_clip.setsampwidth(2)
+            silent_clip.setframerate(framerate)
+            silent_clip.writeframes(b"\x00\x00" * int(seconds * framerate))
+        buffer.seek(0)
+
+        start_time = datetime.now()
+        with wave.open(buffer, "rb") as wf:
+            self._process_audio(wf, framerate)
+        if self.logger:
+            elapsed = (datetime.now() - start_time).total_seconds()
+            self.logger.log_info(f"[STT] Warm-up completato: clip di silenzio di {seconds:.1f}s decodificata in {elapsed:.2f}s")
+        return True
+
     def _process_audio(self, wf, framerate):
         """
         Processa il file audio con Vosk
@@ -264,6 +410,15 @@ class STT:
             wf: Oggetto wave aperto
             framerate: Sample rate dell'audio
             
+        Returns:
+            str: Testo trascritto
+        """
+        return self._recognize(lambda: wf.readframes(self.block_size), framerate)
+
+    def _recognize(self, read_block, framerate):
+        """
+        Passa a Vosk i blocchi PCM mono 16bit restituiti da read_block() fino a b""
+        (file WAV, buffer in memoria o uscita di ffmpeg)
         Returns:
             str: Testo trascritto
         """
@@ -274,7 +429,7 @@ class STT:
         # Processa audio
         results = []
         while True:
-            data = wf.readframes(4000)
+            data = read_block()
             if len(data) == 0:
                 break
             
@@ -304,6 +459,7 @@ class STT:
         audio_path = None
         
         # Verifica disponibilità Vosk
+        load_backends()
         if not VOSK_AVAILABLE:
             return False, {
                 'error': 'Libreria Vosk non installata',
@@ -374,6 +530,7 @@ class STT:
                 if self.logger:
                     word_count = len(full_text.split())
                     self.logger.log_info(f"[STT] Trascrizione completata: '{full_text}' ({word_count} parole, {elapsed:.2f}s)")
+                    self.logger.log_event("stt", engine="vosk", success=True, stt_ms=round(elapsed * 1000), word_count=word_count)
 
                 return True, {
                     'text': full_text,
@@ -386,6 +543,7 @@ class STT:
             else:
                 if self.logger:
                     self.logger.log_warning(f"[STT] Nessun testo riconosciuto (tempo: {elapsed:.2f}s)")
+                    self.logger.log_event("stt", engine="vosk", success=False, stt_ms=round(elapsed * 1000), word_count=0)
 
                 return False, {
                     'error': 'Nessun testo riconosciuto',
@@ -424,6 +582,7 @@ class STT:
         start_time = datetime.now()
 
         # Verifica disponibilità Vosk e Pydub
+        load_backends()
         if not VOSK_AVAILABLE:
             return False, {
                 'error': 'Libreria Vosk non installata',
@@ -462,31 +621,13 @@ class STT:
                     self.logger.log_info(f"[STT-Fast] Audio Rx - {sound.frame_rate}Hz, {sound.channels}ch, {len(sound)/1000:.2f}s")
                 
                 # --- SMART TRIM LOGIC ---
-                if timing_metadata and 'recording_start' in timing_metadata and 'speech_detected' in timing_metadata:
-                    try:
-                        rec_start = float(timing_metadata['recording_start'])
-                        speech_det = float(timing_metadata['speech_detected'])
-                        
-                        # Calcola il silenzio iniziale (differenza tra start registrazione e speech detection)
-                        silence_duration_sec = speech_det - rec_start
-                        
-                        # Definisci un pre-buffer (es. 0.5s) per non tagliare l'attacco della parola
-                        prebuffer_sec = 0.5
-                        cut_start_sec = max(0, silence_duration_sec - prebuffer_sec)
-                        cut_start_ms = int(cut_start_sec * 1000)
-                        
-                        if cut_start_ms > 0:
-                            original_len = len(sound)
-                            # Esegui il taglio in pydub (lavora in ms)
-                            sound = sound[cut_start_ms:]
-                            if self.logger:
-                                self.logger.log_info(f"[STT-Fast] Smart Trim: tagliati {cut_start_ms}ms iniziali (Orig: {original_len}ms -> New: {len(sound)}ms)")
-                        else:
-                            if self.logger:
-                                self.logger.log_info(f"[STT-Fast] Smart Trim: taglio non necessario (silenzio < prebuffer)")
-                    except Exception as e_trim:
-                         if self.logger:
-                            self.logger.log_warning(f"[STT-Fast] Errore Smart Trim: {e_trim}")
+                cut_start_ms = self._smart_trim_ms(timing_metadata, "STT-Fast")
+                if cut_start_ms > 0:
+                    original_len = len(sound)
+                    # Esegui il taglio in pydub (lavora in ms)
+                    sound = sound[cut_start_ms:]
+                    if self.logger:
+                        self.logger.log_info(f"[STT-Fast] Smart Trim: tagliati {cut_start_ms}ms iniziali (Orig: {original_len}ms -> New: {len(sound)}ms)")
                 
                 # Converti a 16kHz, Mono, 16bit (default di export wav è 16bit)
                 sound = sound.set_frame_rate(16000).set_channels(1)
@@ -495,6 +636,7 @@ class STT:
                 wav_buffer = io.BytesIO()
                 sound.export(wav_buffer, format="wav")
                 wav_buffer.seek(0)
+                prep_time = datetime.now()
                     
             except Exception as e:
                 if self.logger:
@@ -519,6 +661,7 @@ class STT:
                 if self.logger:
                     word_count = len(full_text.split())
                     self.logger.log_info(f"[STT-Fast] Trascrizione completata: '{full_text}' ({word_count} parole, {elapsed:.2f}s)")
+                    self.logger.log_event("stt", engine="vosk-fast", success=True, stt_ms=round(elapsed * 1000), word_count=word_count)
 
                 result = {
                     'text': full_text,
@@ -528,11 +671,17 @@ class STT:
                     'word_count': len(full_text.split()),
                     'offline': True
                 }
+                if self.timing_enabled:
+                    result['timing'] = {
+                        'audio_prep_ms': round((prep_time - start_time).total_seconds() * 1000),
+                        'stt_ms': round(elapsed * 1000)
+                    }
                     
                 return True, result
             else:
                 if self.logger:
                     self.logger.log_warning(f"[STT-Fast] Nessun testo riconosciuto (tempo: {elapsed:.2f}s)")
+                    self.logger.log_event("stt", engine="vosk-fast", success=False, stt_ms=round(elapsed * 1000), word_count=0)
 
                 result = {
                     'error': 'Nessun testo riconosciuto',
@@ -546,6 +695,229 @@ class STT:
                 self.logger.log_error(f"[STT-Fast] Errore generico: {str(e)}")
             return False, {'error': f'Errore server: {str(e)}'}
 
+    def _smart_trim_ms(self, timing_metadata, tag):
+        """
+        Millisecondi di silenzio iniziale da tagliare (Smart Trim): differenza tra
+        speech_detected e recording_start meno il pre-buffer; 0 se i metadati mancano
+        """
+        if not (timing_metadata and 'recording_start' in timing_metadata and 'speech_detected' in timing_metadata):
+            return 0
+        try:
+            rec_start = float(timing_metadata['recording_start'])
+            speech_det = float(timing_metadata['speech_detected'])
+        except (TypeError, ValueError) as e_trim:
+            if self.logger:
+                self.logger.log_warning(f"[{tag}] Errore Smart Trim: {e_trim}")
+            return 0
+
+        # Silenzio iniziale (differenza tra start registrazione e speech detection) meno il pre-buffer
+        cut_start_ms = int(max(0, speech_det - rec_start - SMART_TRIM_PREBUFFER_SEC) * 1000)
+        if cut_start_ms == 0 and self.logger:
+            self.logger.log_info(f"[{tag}] Smart Trim: taglio non necessario (silenzio < prebuffer)")
+        return cut_start_ms
+
+    def transcribe_stream(self, stream, timing_metadata=None):
+        """
+        Trascrive l'audio letto direttamente da uno stream (body grezzo della richiesta,
+        senza multipart): nessun buffer dell'intero file né file temporanei.
+        WAV PCM mono 16bit: i frame vanno dallo stream a Vosk a blocchi.
+        Altri formati (OGG/Opus, WAV stereo o non a 16bit...): lo stream viene passato a ffmpeg su stdin e il PCM
+        16kHz mono in uscita viene trascritto mentre la conversione è ancora in corso.
+        Lo Smart Trim scarta i campioni iniziali invece di tagliare l'audio decodificato.
+
+        Args:
+            stream: Oggetto con read(n) (es. request.stream di Flask)
+            timing_metadata: Dict opzionale con 'recording_start' e 'speech_detected' (timestamp float)
+
+        Returns:
+            tuple: (success, result_dict), come transcribe_ogg (engine "vosk-stream")
+        """
+        start_time = datetime.now()
+
+        load_backends()
+        if not VOSK_AVAILABLE:
+            return False, {
+                'error': 'Libreria Vosk non installata',
+                'instructions': 'Installa con: pip install vosk'
+            }
+
+        if not self.is_available or self.vosk_model is None:
+            return False, {
+                'error': 'Modello Vosk non caricato',
+                'instructions': self.error_message if self.error_message else 'Verifica la configurazione'
+            }
+
+        try:
+            # I primi byte identificano il formato
+            head = stream.read(12)
+            if len(head) < 12:
+                if self.logger:
+                    self.logger.log_warning(f"[STT-Stream] Audio troppo piccolo: {len(head)} bytes")
+                return False, {'error': 'File audio troppo piccolo o vuoto', 'text': ''}
+            if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+                # Intestazione WAV fino al chunk "fmt ": canali e bit per campione decidono il percorso
+                head += _read_up_to(stream, WAV_HEADER_PROBE_BYTES - len(head))
+            source = _PrefixedStream(head, stream, self.raw_max_bytes)
+            cut_start_ms = self._smart_trim_ms(timing_metadata, "STT-Stream")
+
+            if _is_pcm16_mono_wav(head):
+                success, full_text, prep_time = self._transcribe_wav_stream(source, cut_start_ms)
+            else:
+                success, full_text, prep_time = self._transcribe_ffmpeg_stream(source, cut_start_ms)
+            if not success:
+                # full_text contiene il messaggio di errore
+                if self.logger:
+                    self.logger.log_error(f"[STT-Stream] {full_text}")
+                return False, {'error': full_text}
+
+            elapsed = (datetime.now() - start_time).total_seconds()
+            if self.logger and cut_start_ms > 0:
+                self.logger.log_info(f"[STT-Stream] Smart Trim: scartati {cut_start_ms}ms iniziali")
+
+            if full_text:
+                word_count = len(full_text.split())
+                if self.logger:
+                    self.logger.log_info(f"[STT-Stream] Trascrizione completata: '{full_text}' ({word_count} parole, {source.bytes_read} bytes, {elapsed:.2f}s)")
+                    self.logger.log_event("stt", engine="vosk-stream", success=True, stt_ms=round(elapsed * 1000), word_count=word_count)
+
+                result = {
+                    'text': full_text,
+                    'language': 'it-IT',
+                    'processing_time': elapsed,
+                    'engine': 'vosk-stream',
+                    'word_count': word_count,
+                    'offline': True
+                }
+                if self.timing_enabled:
+                    result['timing'] = {
+                        # Avvio del decoder fino al primo blocco PCM (la conversione prosegue in parallelo)
+                        'audio_prep_ms': round(((prep_time or start_time) - start_time).total_seconds() * 1000),
+                        'stt_ms': round(elapsed * 1000)
+                    }
+                return True, result
+
+            if self.logger:
+                self.logger.log_warning(f"[STT-Stream] Nessun testo riconosciuto (tempo: {elapsed:.2f}s)")
+                self.logger.log_event("stt", engine="vosk-stream", success=False, stt_ms=round(elapsed * 1000), word_count=0)
+            return False, {
+                'error': 'Nessun testo riconosciuto',
+                'text': '',
+                'processing_time': elapsed
+            }
+
+        except Exception as e:
+            if self.logger:
+                self.logger.log_error(f"[STT-Stream] Errore generico: {str(e)}")
+            return False, {'error': f'Errore server: {str(e)}'}
+
+    def _transcribe_wav_stream(self, source, cut_start_ms):
+        """WAV letto a blocchi dallo stream; restituisce (success, testo o errore, istante del primo blocco)"""
+        try:
+            wf = wave.open(source, "rb")
+        except (wave.Error, EOFError) as e:
+            return False, f"File WAV non valido: {str(e)}", None
+        is_valid, error_msg = self._validate_audio_format(wf)
+        if not is_valid:
+            return False, error_msg, None
+
+        framerate = wf.getframerate()
+        # Smart Trim: i frame di silenzio iniziale vengono letti e scartati
+        skip_frames = cut_start_ms * framerate // 1000
+        while skip_frames > 0:
+            skipped = wf.readframes(min(skip_frames, self.block_size))
+            if not skipped:
+                break
+            skip_frames -= len(skipped) // wf.getsampwidth()
+        return True, self._recognize(lambda: wf.readframes(self.block_size), framerate), datetime.now()
+
+    def _transcribe_ffmpeg_stream(self, source, cut_start_ms, framerate=16000):
+        """
+        Stream -> ffmpeg (stdin) -> PCM s16le mono -> Vosk, con la scrittura su stdin
+        in un thread: restituisce (success, testo o errore, istante del primo blocco PCM)
+        """
+        ffmpeg = find_ffmpeg()
+        if not ffmpeg:
+            return False, "ffmpeg non trovato: necessario per l'audio non WAV", None
+
+        process = subprocess.Popen(
+            [ffmpeg, "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+             "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(framerate), "pipe:1"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        )
+        feed_error = []
+        # stderr viene letto in un thread: se il buffer della pipe si riempie ffmpeg si bloccherebbe
+        stderr_lines = deque(maxlen=FFMPEG_STDERR_LINES)
+
+        def drain_stderr():
+            for line in process.stderr:
+                stderr_lines.append(line.decode("utf-8", "replace").strip())
+
+        def feed():
+            try:
+                while True:
+                    chunk = source.read(STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    process.stdin.write(chunk)
+            except BrokenPipeError:
+                pass  # ffmpeg ha terminato (formato non valido): l'errore è su stderr
+            except Exception as e:
+                feed_error.append(e)
+                process.kill()
+            finally:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+
+        feeder = threading.Thread(target=feed, name="stt-stream-feed", daemon=True)
+        feeder.start()
+        drainer = threading.Thread(target=drain_stderr, name="stt-stream-stderr", daemon=True)
+        drainer.start()
+
+        first_block = []
+        pending = []
+        block_bytes = self.block_size * 2
+
+        def read_block():
+            if pending:
+                return pending.pop()
+            data = process.stdout.read(block_bytes)
+            if data and not first_block:
+                first_block.append(datetime.now())
+            return data
+
+        try:
+            # Smart Trim: 2 byte per campione a framerate Hz
+            skip_bytes = cut_start_ms * framerate // 1000 * 2
+            while skip_bytes > 0:
+                skipped = read_block()
+                if not skipped:
+                    break
+                if len(skipped) > skip_bytes:
+                    # Il resto del blocco è audio da trascrivere
+                    pending.append(skipped[skip_bytes:])
+                    break
+                skip_bytes -= len(skipped)
+            full_text = self._recognize(read_block, framerate)
+        finally:
+            process.stdout.close()
+            feeder.join(timeout=FFMPEG_EXIT_TIMEOUT)
+            try:
+                returncode = process.wait(timeout=FFMPEG_EXIT_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                returncode = process.wait()
+            drainer.join(timeout=FFMPEG_EXIT_TIMEOUT)
+            process.stderr.close()
+            stderr = "\n".join(line for line in stderr_lines if line)
+
+        if feed_error:
+            return False, f"Errore lettura audio: {feed_error[0]}", None
+        if returncode != 0 and not full_text:
+            return False, f"Errore conversione audio: {stderr or 'ffmpeg code ' + str(returncode)}", None
+        return True, full_text, first_block[0] if first_block else None
+
     def handle_stt_request(self):
         """
         Handler per la richiesta Flask di STT
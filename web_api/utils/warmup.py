@@ -0,0 +1,168 @@
+"""
+File:	/web_api/utils/warmup.py
+-----
+Class WarmupManager - Inizializzazione in background dei componenti pesanti
+(LiteLLM, modello Vosk) con stato di prontezza per componente
+-----
+@author  Rino Andriano <andriano@colamonicochiarulli.edu.it>
+@copyright (C) 2024-2026 Rino Andriano, Vito Trifone Gargano
+Created Date: October 19th 2026 3:55:09 am
+-----
+Last Modified: 	October 19th 2026 4:55:58 am
+Modified By: 	Rino Andriano <andriano@colamonicochiarulli.edu.it>
+-----
+@license	https://www.gnu.org/licenses/agpl-3.0.html AGPL 3.0
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Additional Terms under Section 7(b):
+
+The following attribution requirements apply to this work:
+
+1. Copyright notices and author attribution in source code files
+   cannot be removed or altered.
+2. Any interactive user interface must preserve and display
+   author attribution (Copyright, authors, project name).
+3. System prompts containing author information cannot be modified
+4. Public demonstrations, publications and derivative works
+   must credit the original authors.
+
+For full Additional Terms see the LICENSE file.
+------------------------------------------------------------------------------
+"""
+
+import threading
+import time
+
+# Stati di un componente
+PENDING = "pending"
+RUNNING = "running"
+READY = "ready"
+FAILED = "failed"
+
+
+class _Step:
+    """Passo di warm-up di un componente"""
+
+    def __init__(self, name, fn):
+        self.name = name
+        self.fn = fn
+        self.status = PENDING
+        self.error = None
+        self.duration = None
+        self.done = threading.Event()
+
+
+class WarmupManager:
+    """
+    Esegue in background i passi di inizializzazione lenti (import di librerie,
+    caricamento modelli, connessioni) così che il server accetti connessioni
+    subito dopo l'avvio.
+
+    Ogni componente ha uno stato (pending, running, ready, failed) e il proprio
+    thread: le richieste che arrivano prima che il componente sia pronto
+    attendono con wait() solo quel componente, le altre non pagano alcun costo.
+    """
+
+    def __init__(self, logger=None):
+        """
+        Args:
+            logger: Istanza di ChatLogger (opzionale)
+        """
+        self.logger = logger
+        self._steps = {}
+        self._threads = []
+        self._started_at = None
+
+    def add(self, name, fn):
+        """
+        Registra un passo di warm-up
+        Args:
+            name: Nome del componente (es. 'llm', 'stt')
+            fn: Funzione senza argomenti; un'eccezione segna il componente come failed.
+                Se restituisce False il componente è failed senza eccezione
+        """
+        self._steps[name] = _Step(name, fn)
+
+    def start(self):
+        """Avvia un thread di warm-up per ogni componente, in parallelo"""
+        if self._threads:
+            return
+        self._started_at = time.monotonic()
+        for step in self._steps.values():
+            thread = threading.Thread(
+                target=self._run_step, args=(step,), name=f"warmup-{step.name}", daemon=True
+            )
+            self._threads.append(thread)
+            thread.start()
+
+    def run(self):
+        """Esegue il warm-up nel thread corrente, in ordine di registrazione (es. script e test)"""
+        self._started_at = time.monotonic()
+        for step in self._steps.values():
+            self._run_step(step)
+
+    def _run_step(self, step):
+        step.status = RUNNING
+        start = time.monotonic()
+        try:
+            ok = step.fn()
+            step.status = FAILED if ok is False else READY
+        except Exception as e:
+            step.status = FAILED
+            step.error = f"{e.__class__.__name__}: {e}"
+        step.duration = time.monotonic() - start
+        step.done.set()
+        self._log(step)
+
+    def _log(self, step):
+        if not self.logger:
+            return
+        message = f"[WARMUP] {step.name}: {step.status} in {step.duration:.2f}s"
+        if step.status == READY:
+            self.logger.log_info(message)
+        else:
+            self.logger.log_error(f"{message} ({step.error})" if step.error else message)
+
+    def wait(self, name, timeout=None):
+        """
+        Attende la fine del warm-up di un componente
+        Args:
+            name: Nome del componente
+            timeout: Attesa massima in secondi (None = senza limite)
+        Returns:
+            bool: True se il warm-up del componente è terminato (pronto o fallito)
+        """
+        step = self._steps.get(name)
+        return True if step is None else step.done.wait(timeout)
+
+    def is_ready(self, name=None):
+        """Verifica se un componente (o, senza nome, tutti) è pronto"""
+        steps = [self._steps[name]] if name else self._steps.values()
+        return all(step.status == READY for step in steps)
+
+    def get_status(self):
+        """
+        Restituisce lo stato di ogni componente
+        Returns:
+            dict: Nome -> {status, duration_s, error}
+        """
+        return {
+            name: {
+                "status": step.status,
+                "duration_s": round(step.duration, 3) if step.duration is not None else None,
+                "error": step.error,
+            }
+            for name, step in self._steps.items()
+        }